@@ -4,6 +4,7 @@
 
 from functools import partial
 from collections import namedtuple
+from weakref import WeakKeyDictionary
 from .exception import NoConnectorUnitError
 from .connector import is_module_installed
 
@@ -179,8 +180,17 @@ class Backend(object):
                  and this is exponential).
                  This mechanism should be used only in some well placed
                  circumstances for generic addons.
+
+    The classes returned by :py:meth:`~get_class` are cached per Odoo
+    registry, ``base_class``, model name and number of installed modules.
+    The cache of every backend is invalidated when a class is registered
+    on any backend (the parents' classes are part of the result) and a new
+    registry (after a reload) does not share the cache of the previous one.
     """
 
+    # incremented on each registration of a class on any backend
+    _registration_sequence = 0
+
     def __init__(self, service=None, version=None, parent=None, registry=None):
         if service is None and parent is None:
             raise ValueError('A service or a parent service is expected')
@@ -188,6 +198,9 @@ class Backend(object):
         self.version = version
         self.parent = parent
         self._class_entries = []
+        self._class_cache = WeakKeyDictionary()
+        self._class_cache_sequence = Backend._registration_sequence
+        self.class_cache_stats = {'hits': 0, 'misses': 0}
         if registry is None:
             registry = BACKENDS
         registry.register_backend(self)
@@ -245,6 +258,17 @@ class Backend(object):
         :param env: current env
         :type env: :py:class:`odoo.api.EnvironmentError`
         """
+        if self._class_cache_sequence != Backend._registration_sequence:
+            self.invalidate_class_cache()
+        registry = env.registry
+        key = (base_class, model_name, len(registry._init_modules))
+        classes = self._class_cache.get(registry)
+        if classes is None:
+            classes = self._class_cache[registry] = {}
+        elif key in classes:
+            self.class_cache_stats['hits'] += 1
+            return classes[key]
+        self.class_cache_stats['misses'] += 1
         matching_classes = self._get_classes(base_class, env,
                                              model_name)
         if not matching_classes:
@@ -256,7 +280,14 @@ class Backend(object):
             'Several classes found for %s '
             'with model name: %s. Found: %s' %
             (base_class, model_name, matching_classes))
-        return matching_classes.pop()
+        cls = classes[key] = matching_classes.pop()
+        return cls
+
+    def invalidate_class_cache(self):
+        """ Empty the cache of the classes returned by
+        :py:meth:`~get_class` """
+        self._class_cache = WeakKeyDictionary()
+        self._class_cache_sequence = Backend._registration_sequence
 
     def register_class(self, cls, replacing=None):
         """ Register a class in the backend.
@@ -289,6 +320,7 @@ class Backend(object):
             else:
                 register_replace(replacing)
         self._class_entries.append(entry)
+        Backend._registration_sequence += 1
 
     def __call__(self, cls=None, replacing=None):
         """ Backend decorator
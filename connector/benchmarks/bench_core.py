@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# Copyright 2017 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+"""
+Benchmarks of the hot paths of the connector framework.
+
+The benchmarks run on an existing database where ``connector`` is
+installed. Everything is done in a transaction which is rolled back at
+the end, so a test database can be reused. The ``Binder`` benchmark
+needs the ``test_connector`` addon, it is skipped otherwise.
+
+Usage::
+
+    python connector/benchmarks/bench_core.py -c odoo.conf -d testdb \\
+        --records 10000,100000 --output results.json
+
+The Odoo options (``-c``, ``-d``, ``--addons-path``, ...) are given
+after the benchmark options. The results are written as JSON: a ``meta``
+dict describing the run and a ``results`` list with, for each
+benchmark, its ``name``, the number of operations ``ops``, the best
+duration in ``seconds`` over the ``--repeat`` runs, ``ops_per_sec`` and
+``usec_per_op``.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from timeit import default_timer
+
+import odoo
+from odoo import api, SUPERUSER_ID
+
+# units and consumers must look like they belong to an installed addon
+BENCH_MODULE = 'odoo.addons.connector.benchmarks'
+
+
+class BenchBackendRecord(object):
+    """ Stands for a backend record, returns the benchmark backend """
+
+    _name = 'connector.bench.backend'
+    id = 1
+
+    def __init__(self, env, backend):
+        self.env = env
+        self._backend = backend
+
+    def get_backend(self):
+        return self._backend
+
+
+class Bench(object):
+
+    def __init__(self, env, repeat):
+        self.env = env
+        self.repeat = repeat
+        self.results = []
+
+    def measure(self, name, ops, func, **info):
+        """ Run ``func`` ``repeat`` times and keep the best duration """
+        timings = []
+        for __ in range(self.repeat):
+            start = default_timer()
+            func()
+            timings.append(default_timer() - start)
+        seconds = min(timings)
+        result = dict(info,
+                      name=name,
+                      ops=ops,
+                      seconds=round(seconds, 6),
+                      ops_per_sec=round(ops / seconds, 1) if seconds else None,
+                      usec_per_op=round(seconds * 1e6 / ops, 3))
+        self.results.append(result)
+        sys.stderr.write('%-45s %10d ops %10.3f usec/op\n' %
+                         (name, ops, result['usec_per_op']))
+        return result
+
+    def skip(self, name, reason):
+        self.results.append({'name': name, 'skipped': reason})
+        sys.stderr.write('%-45s skipped: %s\n' % (name, reason))
+
+    def bench_event(self, count):
+        """ Event.fire overhead on write() """
+        from odoo.addons.connector.event import on_record_write
+        partners = self.env['res.partner'].browse()
+        for i in range(100):
+            partners |= partners.create({'name': 'bench %d' % i})
+
+        def write():
+            for __ in range(count // 100):
+                partners.write({'comment': 'bench'})
+
+        def fire():
+            for __ in range(count):
+                on_record_write.fire(self.env, 'res.partner', 1, {})
+
+        ops = count // 100 * 100
+        self.measure('event.write.no_consumer', ops, write)
+        self.measure('event.fire.no_consumer', count, fire)
+
+        def consumer(env, model_name, record_id, vals):
+            pass
+        consumer.__module__ = BENCH_MODULE
+        on_record_write.subscribe(consumer, model_names='res.partner')
+        try:
+            self.measure('event.write.consumer', ops, write)
+            self.measure('event.fire.consumer', count, fire)
+        finally:
+            on_record_write.unsubscribe(consumer, model_names='res.partner')
+
+    def bench_get_class(self, count):
+        """ Backend.get_class resolution in a backend with 100 units """
+        from odoo.addons.connector.backend import Backend
+        from odoo.addons.connector.connector import ConnectorUnit
+
+        parent = Backend('connector_bench')
+        backend = Backend(parent=parent, version='1')
+
+        class BenchUnit(ConnectorUnit):
+            __module__ = BENCH_MODULE
+            _model_name = 'res.partner'
+
+        for i in range(100):
+            parent(type('BenchUnit%d' % i, (ConnectorUnit,),
+                        {'__module__': BENCH_MODULE,
+                         '_model_name': 'bench.model.%d' % i}))
+        backend(BenchUnit)
+
+        def resolve():
+            for __ in range(count):
+                backend.get_class(BenchUnit, self.env, 'res.partner')
+
+        def resolve_uncached():
+            for __ in range(count):
+                backend.invalidate_class_cache()
+                backend.get_class(BenchUnit, self.env, 'res.partner')
+
+        self.measure('backend.get_class', count, resolve)
+        self.measure('backend.get_class.uncached', count, resolve_uncached)
+
+    def bench_mapper(self, count):
+        """ Mapper throughput with direct, method and children mappings """
+        from odoo.addons.connector.backend import Backend
+        from odoo.addons.connector.connector import ConnectorEnvironment
+        from odoo.addons.connector.unit.mapper import ImportMapper, mapping
+
+        backend = Backend('connector_bench_mapper')
+
+        @backend
+        class ChildMapper(ImportMapper):
+            __module__ = BENCH_MODULE
+            _model_name = 'res.partner.bank'
+            direct = [('acc_number', 'acc_number')]
+
+        @backend
+        class BenchMapper(ImportMapper):
+            __module__ = BENCH_MODULE
+            _model_name = 'res.partner'
+            direct = [('name', 'name'),
+                      ('street', 'street'),
+                      ('city', 'city')]
+            children = [('banks', 'bank_ids', 'res.partner.bank')]
+
+            @mapping
+            def email(self, record):
+                return {'email': '%s@example.com' % record['name']}
+
+        backend_record = BenchBackendRecord(self.env, backend)
+        connector_env = ConnectorEnvironment(backend_record, 'res.partner')
+        mapper = connector_env.get_connector_unit(BenchMapper)
+        records = [{'name': 'partner %d' % i,
+                    'street': 'street %d' % i,
+                    'city': 'city',
+                    'banks': [{'acc_number': 'CH%d' % i}]}
+                   for i in range(count)]
+
+        def map_one_by_one():
+            for record in records:
+                mapper.map_record(record).values(for_create=True)
+
+        def map_records():
+            for __ in mapper.map_records(records, for_create=True):
+                pass
+
+        self.measure('mapper.map_record.%d' % count, count, map_one_by_one,
+                     records=count)
+        self.measure('mapper.map_records.%d' % count, count, map_records,
+                     records=count)
+
+    def bench_binder(self, count):
+        """ Binder.to_internal cost, one by one and in bulk """
+        if 'connector.test.binding' not in self.env.registry:
+            self.skip('binder.to_internal', 'test_connector not installed')
+            return
+        from odoo.addons.connector.connector import (ConnectorEnvironment,
+                                                     Binder)
+        backend_record = self.env['test.backend'].create(
+            {'version': '1', 'name': 'Bench'}
+        )
+        connector_env = ConnectorEnvironment(backend_record,
+                                             'connector.test.binding')
+        binder = connector_env.get_connector_unit(Binder)
+        pairs = []
+        for i in range(count):
+            record = self.env['connector.test.record'].create({})
+            binding = self.env['connector.test.binding'].create({
+                'backend_id': backend_record.id,
+                'odoo_id': record.id,
+            })
+            pairs.append((i + 1, binding))
+        binder.bind_many(pairs)
+        external_ids = [external_id for external_id, __ in pairs]
+
+        def to_internal():
+            for external_id in external_ids:
+                binder.to_internal(external_id)
+
+        def to_internal_many():
+            binder.to_internal_many(external_ids)
+
+        self.measure('binder.to_internal', count, to_internal)
+        self.measure('binder.to_internal_many', count, to_internal_many)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks of the connector framework')
+    parser.add_argument('--records', default='10000,100000',
+                        help='numbers of records mapped by the mapper '
+                             'benchmark, comma separated')
+    parser.add_argument('--count', type=int, default=10000,
+                        help='number of operations of the other benchmarks')
+    parser.add_argument('--bindings', type=int, default=1000,
+                        help='number of bindings of the binder benchmark')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of each benchmark, the best is kept')
+    parser.add_argument('--output', help='file for the JSON results, '
+                                         'standard output by default')
+    args, odoo_args = parser.parse_known_args(argv)
+
+    odoo.tools.config.parse_config(odoo_args)
+    odoo.modules.module.initialize_sys_path()
+    dbname = odoo.tools.config['db_name']
+    if not dbname:
+        parser.error('a database is required (-d)')
+    registry = odoo.registry(dbname)
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        bench = Bench(env, args.repeat)
+        try:
+            bench.bench_event(args.count)
+            bench.bench_get_class(args.count)
+            for records in args.records.split(','):
+                bench.bench_mapper(int(records))
+            bench.bench_binder(args.bindings)
+        finally:
+            cr.rollback()
+
+    output = {
+        'meta': {
+            'database': dbname,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'odoo': odoo.release.version,
+            'repeat': args.repeat,
+        },
+        'results': bench.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(output, out, indent=2, sort_keys=True)
+    else:
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
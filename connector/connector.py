@@ -5,6 +5,10 @@
 import hashlib
 import logging
 import struct
+import threading
+from collections import defaultdict
+from functools import partial
+from weakref import WeakKeyDictionary
 
 from odoo import models, fields, tools
 
@@ -96,6 +100,9 @@ class ConnectorUnit(object):
     __metaclass__ = MetaConnectorUnit
 
     _model_name = None  # to be defined in sub-classes
+    # when True, the instances are kept and reused by the environment,
+    # only units without state should be reused
+    _reusable = False
 
     def __init__(self, connector_env):
         """
@@ -215,6 +222,28 @@ class ConnectorUnit(object):
                                     seconds=retry_seconds,
                                     ignore_retry=True)
 
+    def advisory_locks_or_retry(self, locks, retry_seconds=1):
+        """ Acquire several Postgres transactional advisory locks
+        or retry job
+
+        The locks are all acquired or none of them is, in a single
+        query. When they cannot be acquired, it raises a
+        ``RetryableJobError`` so the job is retried after n
+        ``retry_seconds``.
+
+        See :meth:`advisory_lock_or_retry` and
+        :func:``odoo.addons.connector.connector.pg_try_advisory_locks``
+        for details.
+
+        :param locks: The lock names.
+        :param retry_seconds: number of seconds after which a job should
+           be retried when the locks cannot be acquired.
+        """
+        if not pg_try_advisory_locks(self.env, locks):
+            raise RetryableJobError('Could not acquire advisory locks',
+                                    seconds=retry_seconds,
+                                    ignore_retry=True)
+
 
 class ConnectorEnvironment(object):
     """ Environment used by the different units for the synchronization.
@@ -241,6 +270,14 @@ class ConnectorEnvironment(object):
         List of attributes that must be used by
         :py:meth:`connector.connector.ConnectorEnvironment.create_environment`
         when a new connector environment is instantiated.
+
+    An environment and the environments created from it with
+    :py:meth:`create_environment` share a pool: an environment for the
+    same backend record, model and propagated attributes is created once
+    and then reused. Each environment keeps the instances of the units
+    having ``_reusable`` set to True, which are thus instantiated once.
+    The pool lives as long as the environment created at the start of
+    the job, or until :py:meth:`clear_pool` is called.
     """
 
     _propagate_kwargs = []
@@ -259,11 +296,20 @@ class ConnectorEnvironment(object):
         backend = backend_record.get_backend()
         self.backend = backend
         self.model_name = model_name
+        self._units = {}
+        self._pool = {}
 
     @property
     def model(self):
         return self.env[self.model_name]
 
+    def clear_pool(self):
+        """ Forget the environments and the units kept by the pool """
+        for connector_env in self._pool.values():
+            connector_env._units.clear()
+        self._pool.clear()
+        self._units.clear()
+
     @property
     def env(self):
         return self.backend_record.env
@@ -278,8 +324,14 @@ class ConnectorEnvironment(object):
         :param base_class: ``ConnectorUnit`` to search (class or subclass)
         :type base_class: :py:class:`connector.connector.ConnectorUnit`
         """
-        return self.backend.get_class(base_class, self.env,
-                                      self.model_name)(self)
+        unit = self._units.get(base_class)
+        if unit is None:
+            cls = self.backend.get_class(base_class, self.env,
+                                         self.model_name)
+            unit = cls(self)
+            if cls._reusable:
+                self._units[base_class] = unit
+        return unit
 
     @classmethod
     def create_environment(cls, backend_record, model,
@@ -301,10 +353,36 @@ class ConnectorEnvironment(object):
         if connector_env:
             kwargs = {key: getattr(connector_env, key)
                       for key in connector_env._propagate_kwargs}
+        pool = key = None
+        if isinstance(connector_env, ConnectorEnvironment):
+            pool = connector_env._pool
+            key = (cls, backend_record._name, backend_record.id,
+                   id(backend_record.env), model,
+                   tuple(sorted(kwargs.iteritems())))
+            try:
+                new_env = pool.get(key)
+            except TypeError:  # unhashable propagated attribute
+                pool = None
+            else:
+                if new_env is not None:
+                    return new_env
         if kwargs:
-            return cls(backend_record, model, **kwargs)
+            new_env = cls(backend_record, model, **kwargs)
         else:
-            return cls(backend_record, model)
+            new_env = cls(backend_record, model)
+        if pool is not None:
+            new_env._pool = pool
+            pool[key] = new_env
+        return new_env
+
+
+# bindings found by the binders, per database cursor, emptied at the
+# end of each transaction
+_BINDER_CACHE = WeakKeyDictionary()
+
+
+def _clear_binder_cache(cr):
+    _BINDER_CACHE.pop(cr, None)
 
 
 class Binder(ConnectorUnit):
@@ -316,6 +394,15 @@ class Binder(ConnectorUnit):
 
     This implementation assumes that binding models are ``_inherits`` of
     the models they are binding.
+
+    When ``_cache_bindings`` is True, the bindings found or created by
+    the binder are kept in memory for the duration of the transaction
+    (the cache is attached to the database cursor and emptied on commit
+    and rollback), so a job looking for
+    the same external ids several times queries the database once.
+    Bindings deleted or modified by other means during the transaction
+    are not seen, so it must be activated only on binders used in such
+    conditions.
     """
 
     _model_name = None  # define in sub-classes
@@ -323,6 +410,27 @@ class Binder(ConnectorUnit):
     _backend_field = 'backend_id'  # override in sub-classes
     _odoo_field = 'odoo_id'  # override in sub-classes
     _sync_date_field = 'sync_date'  # override in sub-classes
+    _cache_bindings = False  # override in sub-classes
+
+    def _binding_cache(self):
+        """ Return the per-transaction cache of the bindings, a dict with
+        the keys ``internal`` (``{external id as unicode: binding id}``)
+        and ``external`` (``{binding id: external id}``), or None if the
+        cache is not activated.
+        """
+        if not self._cache_bindings:
+            return None
+        cr = self.env.cr
+        caches = _BINDER_CACHE.get(cr)
+        if caches is None:
+            caches = _BINDER_CACHE[cr] = {}
+            # the handlers of both events are dropped after a commit or
+            # a rollback, they are added again with the next cache
+            cr.after('commit', partial(_clear_binder_cache, cr))
+            cr.after('rollback', partial(_clear_binder_cache, cr))
+        key = (self.model._name, self._backend_field,
+               self.backend_record.id, self._external_field)
+        return caches.setdefault(key, {'internal': {}, 'external': {}})
 
     def to_internal(self, external_id, unwrap=False):
         """ Give the Odoo recordset for an external ID
@@ -335,6 +443,9 @@ class Binder(ConnectorUnit):
                  or an empty recordset if the external_id is not mapped
         :rtype: recordset
         """
+        if self._cache_bindings:
+            return self.to_internal_many([external_id],
+                                         unwrap=unwrap)[external_id]
         bindings = self.model.with_context(active_test=False).search(
             [(self._external_field, '=', tools.ustr(external_id)),
              (self._backend_field, '=', self.backend_record.id)]
@@ -348,6 +459,55 @@ class Binder(ConnectorUnit):
             bindings = bindings[self._odoo_field]
         return bindings
 
+    def to_internal_many(self, external_ids, unwrap=False):
+        """ Give the Odoo recordsets for a list of external IDs
+
+        The bindings are searched with a single query.
+
+        :param external_ids: external IDs for which we want
+                             the Odoo IDs
+        :param unwrap: if True, returns the normal records
+                       else return the binding records
+        :return: a dict ``{external_id: recordset}``, the recordset
+                 is empty when the external_id is not mapped
+        :rtype: dict
+        """
+        keys = {external_id: tools.ustr(external_id)
+                for external_id in external_ids}
+        cache = self._binding_cache()
+        found = {}
+        missing = set(keys.itervalues())
+        if cache is not None:
+            for key in list(missing):
+                if key in cache['internal']:
+                    found[key] = cache['internal'][key]
+                    missing.remove(key)
+        model = self.model.with_context(active_test=False)
+        if missing:
+            bindings = model.search(
+                [(self._external_field, 'in', list(missing)),
+                 (self._backend_field, '=', self.backend_record.id)]
+            )
+            for binding in bindings:
+                value = binding[self._external_field]
+                key = tools.ustr(value)
+                if key in found:
+                    raise ValueError("Expected singleton: %s" %
+                                     model.browse([found[key], binding.id]))
+                found[key] = binding.id
+                if cache is not None:
+                    cache['internal'][key] = binding.id
+                    cache['external'][binding.id] = value
+        bindings = model.browse(found.values())
+        records = {binding.id: binding for binding in bindings}
+        empty = model.browse()
+        if unwrap:
+            records = {binding_id: binding[self._odoo_field]
+                       for binding_id, binding in records.iteritems()}
+            empty = empty[self._odoo_field]
+        return {external_id: records.get(found.get(key), empty)
+                for external_id, key in keys.iteritems()}
+
     def to_external(self, binding, wrap=False):
         """ Give the external ID for an Odoo binding ID
 
@@ -373,6 +533,52 @@ class Binder(ConnectorUnit):
             return binding[self._external_field]
         return binding[self._external_field]
 
+    def to_external_many(self, bindings, wrap=False):
+        """ Give the external IDs for a list of Odoo bindings
+
+        The bindings are read with a single query.
+
+        :param bindings: Odoo bindings (recordset or list of ids) for which
+                         we want the external ids
+        :param wrap: if True, bindings are normal records, the method
+                     will search the corresponding bindings and return
+                     the external ids of the bindings
+        :return: a dict ``{id: external_id}`` where the keys are the ids
+                 of the records given in ``bindings``, the value is None
+                 when a normal record has no binding
+        :rtype: dict
+        """
+        if isinstance(bindings, models.BaseModel):
+            ids = bindings.ids
+        else:
+            ids = list(bindings)
+        model = self.model.with_context(active_test=False)
+        result = {}
+        if wrap:
+            found = model.search(
+                [(self._odoo_field, 'in', ids),
+                 (self._backend_field, '=', self.backend_record.id),
+                 ]
+            )
+            for binding in found:
+                record_id = binding[self._odoo_field].id
+                if record_id in result:
+                    raise ValueError("Expected singleton: %s" %
+                                     binding[self._odoo_field])
+                result[record_id] = binding[self._external_field]
+            for record_id in ids:
+                result.setdefault(record_id, None)
+            return result
+        cache = self._binding_cache()
+        if cache is not None:
+            result = {binding_id: cache['external'][binding_id]
+                      for binding_id in ids
+                      if binding_id in cache['external']}
+        for binding in model.browse([binding_id for binding_id in ids
+                                     if binding_id not in result]):
+            result[binding.id] = binding[self._external_field]
+        return result
+
     def bind(self, external_id, binding):
         """ Create the link between an external ID and an Odoo ID
 
@@ -395,6 +601,78 @@ class Binder(ConnectorUnit):
             {self._external_field: tools.ustr(external_id),
              self._sync_date_field: now_fmt,
              })
+        if self._cache_bindings:
+            self._cache_binding(binding.id, binding[self._external_field])
+
+    def _cache_binding(self, binding_id, external_id):
+        cache = self._binding_cache()
+        if cache is not None:
+            previous = cache['external'].get(binding_id)
+            if previous is not None:
+                cache['internal'].pop(tools.ustr(previous), None)
+            cache['internal'][tools.ustr(external_id)] = binding_id
+            cache['external'][binding_id] = external_id
+
+    def bind_many(self, pairs):
+        """ Create the links between external IDs and Odoo IDs
+
+        The bindings are updated with a single SQL statement when the
+        external id and sync date fields are columns of the binding
+        model, otherwise they are bound one by one with :meth:`bind`.
+        As for :meth:`bind`, the export of the bindings is not triggered.
+
+        :param pairs: list of ``(external_id, binding)``, binding being
+                      an Odoo record or id
+        """
+        values = {}
+        for external_id, binding in pairs:
+            # Prevent False, None, or "", but not 0
+            assert (external_id or external_id is 0) and binding, (
+                "external_id or binding missing, "
+                "got: %s, %s" % (external_id, binding)
+            )
+            if isinstance(binding, models.BaseModel):
+                binding.ensure_one()
+                binding = binding.id
+            values[binding] = external_id
+        if not values:
+            return
+        model = self.model
+        ext_field = model._fields[self._external_field]
+        date_field = model._fields[self._sync_date_field]
+        if not all(field.store and field.column_type and not field.inherited
+                   for field in (ext_field, date_field)):
+            for binding_id, external_id in values.iteritems():
+                self.bind(external_id, binding_id)
+            return
+        bindings = model.browse(values.keys())
+        rows = []
+        params = [fields.Datetime.now()]
+        for binding in bindings:
+            external_id = values[binding.id] = ext_field.convert_to_column(
+                tools.ustr(values[binding.id]), binding)
+            rows.append('(%s, %s)')
+            params += [binding.id, external_id]
+        assignments = ['"%s" = v.external_id' % self._external_field,
+                       '"%s" = %%s' % self._sync_date_field]
+        fnames = [self._external_field, self._sync_date_field]
+        if model._log_access:
+            assignments += ['write_uid = %s',
+                            "write_date = (now() at time zone 'UTC')"]
+            params.insert(1, self.env.uid)
+            fnames += ['write_uid', 'write_date']
+        query = ('UPDATE "%s" AS b SET %s '
+                 'FROM (VALUES %s) AS v(id, external_id) '
+                 'WHERE b.id = v.id' %
+                 (model._table, ', '.join(assignments), ', '.join(rows)))
+        self.env.cr.execute(query, params)
+        model.invalidate_cache(fnames, bindings.ids)
+        bindings.modified(fnames)
+        if self.env.recompute and self.env.context.get('recompute', True):
+            bindings.with_context(connector_no_export=True).recompute()
+        if self._cache_bindings:
+            for binding in bindings:
+                self._cache_binding(binding.id, values[binding.id])
 
     def unwrap_binding(self, binding):
         """ For a binding record, gives the normal record.
@@ -487,12 +765,86 @@ def pg_try_advisory_lock(env, lock):
        external id
     :return True/False whether lock was acquired.
     """
+    int_lock = _advisory_lock_key(lock)
+    env.cr.execute('SELECT pg_try_advisory_xact_lock(%s);', (int_lock,))
+    acquired = env.cr.fetchone()[0]
+    _count_advisory_lock(lock, acquired)
+    return acquired
+
+
+def pg_try_advisory_locks(env, locks):
+    """ Try to acquire several Postgres transactional advisory locks.
+
+    All the locks are tried in a single statement, in a deterministic
+    order. Either all the locks are acquired, either none of them is:
+    when one of the locks cannot be acquired, the other ones are released.
+
+    See :func:`pg_try_advisory_lock` for details.
+
+    :param env: the Odoo Environment
+    :param locks: The lock names, as for :func:`pg_try_advisory_lock`
+    :return True/False whether the locks were acquired.
+    """
+    keys = {}
+    for lock in locks:
+        keys[_advisory_lock_key(lock)] = lock
+    if not keys:
+        return True
+    # the locks acquired in a savepoint are released by its rollback
+    env.cr.execute('SAVEPOINT connector_advisory_locks')
+    env.cr.execute('SELECT k, pg_try_advisory_xact_lock(k) '
+                   'FROM unnest(%s::bigint[]) AS k',
+                   (sorted(keys),))
+    results = env.cr.fetchall()
+    acquired = all(result for __, result in results)
+    if acquired:
+        env.cr.execute('RELEASE SAVEPOINT connector_advisory_locks')
+    else:
+        env.cr.execute('ROLLBACK TO SAVEPOINT connector_advisory_locks')
+        env.cr.execute('RELEASE SAVEPOINT connector_advisory_locks')
+    for key, result in results:
+        # only the locks which could not be acquired are failures
+        if not acquired and result:
+            continue
+        _count_advisory_lock(keys[key], result)
+    return acquired
+
+
+def _advisory_lock_key(lock):
     hasher = hashlib.sha1()
     hasher.update('{}'.format(lock))
     # pg_lock accepts an int8 so we build an hash composed with
     # contextual information and we throw away some bits
-    int_lock = struct.unpack('q', hasher.digest()[:8])
+    return struct.unpack('q', hasher.digest()[:8])[0]
 
-    env.cr.execute('SELECT pg_try_advisory_xact_lock(%s);', (int_lock,))
-    acquired = env.cr.fetchone()[0]
-    return acquired
+
+# number of advisory locks acquired and failed per namespace
+_ADVISORY_LOCK_STATS = defaultdict(lambda: {'acquired': 0, 'failed': 0})
+_advisory_lock_stats_lock = threading.Lock()
+
+
+def _advisory_lock_namespace(lock):
+    """ Namespace of a lock: the part of its name before the first
+    parenthesis, ``import_record`` for ``import_record(...)`` """
+    return '{}'.format(lock).split('(', 1)[0].strip()
+
+
+def _count_advisory_lock(lock, acquired):
+    namespace = _advisory_lock_namespace(lock)
+    with _advisory_lock_stats_lock:
+        _ADVISORY_LOCK_STATS[namespace][
+            'acquired' if acquired else 'failed'] += 1
+    if not acquired:
+        _logger.debug('advisory lock %s could not be acquired', lock)
+
+
+def advisory_lock_stats():
+    """ Return the number of advisory locks acquired and not acquired
+    in the current process, per namespace of lock (the part of the lock
+    name before the first parenthesis)
+
+    :return: ``{namespace: {'acquired': int, 'failed': int}}``
+    """
+    with _advisory_lock_stats_lock:
+        return {namespace: dict(counters)
+                for namespace, counters in _ADVISORY_LOCK_STATS.iteritems()}
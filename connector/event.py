@@ -3,7 +3,8 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
 from collections import Callable
-from .connector import get_odoo_module, is_module_installed
+from weakref import WeakKeyDictionary
+from .connector import get_odoo_module
 
 
 class Event(object):
@@ -60,11 +61,31 @@ class Event(object):
         def print_bar(env, model_name, a, b):
             print 'bar'
 
+    The consumers to call for a model are computed once per Odoo registry,
+    model name and number of installed modules and kept in a dispatch
+    table, which is emptied when the subscriptions change. Firing an event
+    on a model without consumers costs a dictionary lookup.
+
     """
 
     def __init__(self):
         self._consumers = {None: set()}
 
+    @property
+    def _consumers(self):
+        return self.__consumers
+
+    @_consumers.setter
+    def _consumers(self, consumers):
+        self.__consumers = consumers
+        self._invalidate_dispatch()
+
+    def _invalidate_dispatch(self):
+        """ Empty the dispatch tables, called when the subscriptions
+        change """
+        self._dispatch = WeakKeyDictionary()
+        self._consumer_modules = {}
+
     def subscribe(self, consumer, model_names=None, replacing=None):
         """ Subscribe a consumer on the event
 
@@ -79,6 +100,7 @@ class Event(object):
             model_names = [model_names]
         for name in model_names:
             self._consumers.setdefault(name, set()).add(consumer)
+        self._invalidate_dispatch()
 
     def unsubscribe(self, consumer, model_names=None):
         """ Remove a consumer from the event
@@ -92,18 +114,41 @@ class Event(object):
         for name in model_names:
             if name in self._consumers:
                 self._consumers[name].discard(consumer)
+        self._invalidate_dispatch()
 
     def has_consumer_for(self, env, model_name):
         """ Return True if at least one consumer is registered
         for the model.
         """
-        if any(self._consumers_for(env, None)):
-            return True  # at least 1 global consumer exist
-        return any(self._consumers_for(env, model_name))
+        return bool(self._dispatch_for(env, model_name))
+
+    def _consumer_module(self, consumer):
+        module = self._consumer_modules.get(consumer)
+        if module is None:
+            module = self._consumer_modules[consumer] = (
+                get_odoo_module(consumer))
+        return module
 
     def _consumers_for(self, env, model_name):
-        return (cons for cons in self._consumers.get(model_name, ())
-                if is_module_installed(env, get_odoo_module(cons)))
+        installed = env.registry._init_modules
+        return tuple(cons for cons in self._consumers.get(model_name, ())
+                     if self._consumer_module(cons) in installed)
+
+    def _dispatch_for(self, env, model_name):
+        """ Return the tuple of the consumers to call for a model: the
+        global consumers followed by the consumers of the model, restricted
+        to the installed modules.
+        """
+        registry = env.registry
+        table = self._dispatch.get(registry)
+        if table is None:
+            table = self._dispatch[registry] = {}
+        key = (model_name, len(registry._init_modules))
+        consumers = table.get(key)
+        if consumers is None:
+            consumers = table[key] = (self._consumers_for(env, None) +
+                                      self._consumers_for(env, model_name))
+        return consumers
 
     def fire(self, env, model_name, *args, **kwargs):
         """ Call each consumer subscribed on the event with the given
@@ -124,10 +169,12 @@ class Event(object):
         assert isinstance(model_name, basestring), (
             "Second argument must be the model name as string, "
             "instead received: %s" % model_name)
+        consumers = self._dispatch_for(env, model_name)
+        if not consumers:
+            return
         args = tuple([env, model_name] + list(args))
-        for name in (None, model_name):
-            for consumer in self._consumers_for(env, name):
-                consumer(*args, **kwargs)
+        for consumer in consumers:
+            consumer(*args, **kwargs)
 
     def __call__(self, *args, **kwargs):
         """ Event decorator
@@ -161,6 +208,64 @@ class Event(object):
         return with_subscribe(**kwargs)
 
 
+class RecordsEvent(Event):
+    """ An event fired once for a recordset instead of once per record.
+
+    The consumers of a recordset event receive the list of the ids
+    instead of a single id::
+
+        @on_records_write(model_names='product.product')
+        def delay_export_all(env, model_name, record_ids, vals):
+            # enqueue one job for all the records
+
+    A recordset event can be bound to a legacy per-record event: when it
+    is fired, the consumers of the per-record event are then called once
+    for each id, so the existing consumers keep working unchanged::
+
+        on_records_write = RecordsEvent(on_record_write)
+        on_records_write.fire(env, 'res.partner', [1, 2, 3], vals)
+        # calls the consumers of on_records_write with [1, 2, 3]
+        # then the consumers of on_record_write with 1, 2 and 3
+
+    """
+
+    def __init__(self, record_event=None):
+        super(RecordsEvent, self).__init__()
+        self.record_event = record_event
+
+    def has_consumer_for(self, env, model_name):
+        """ Return True if at least one consumer is registered for the
+        model on this event or on the bound per-record event.
+        """
+        if super(RecordsEvent, self).has_consumer_for(env, model_name):
+            return True
+        return bool(self.record_event and
+                    self.record_event.has_consumer_for(env, model_name))
+
+    def fire(self, env, model_name, record_ids, *args, **kwargs):
+        """ Call each consumer with the ids of the records, then each
+        consumer of the bound per-record event once per id.
+
+        :param env: current env
+        :type env: :py:class:`odoo.api.Environment`
+        :param model_name: name of the model
+        :type model_name: str
+        :param record_ids: ids of the records
+        :type record_ids: list
+        :param args: arguments propagated to the consumers
+        :param kwargs: keyword arguments propagated to the consumers
+        """
+        if not record_ids:
+            return
+        super(RecordsEvent, self).fire(env, model_name, record_ids,
+                                       *args, **kwargs)
+        record_event = self.record_event
+        if record_event and record_event.has_consumer_for(env, model_name):
+            for record_id in record_ids:
+                record_event.fire(env, model_name, record_id,
+                                  *args, **kwargs)
+
+
 on_record_write = Event()
 """
 ``on_record_write`` is fired when one record has been updated.
@@ -198,3 +303,32 @@ Listeners should take the following arguments:
  * record_id: id of the record
 
 """
+
+on_records_write = RecordsEvent(on_record_write)
+"""
+``on_records_write`` is fired once when records have been updated
+by the same ``write()``. The consumers of ``on_record_write`` are then
+fired for each record.
+
+Listeners should take the following arguments:
+
+ * env: :py:class:`~odoo.api.Environment` object
+ * model_name: name of the model
+ * record_ids: list of the ids of the records
+ * vals:  field values updated, e.g {'field_name': field_value, ...}
+
+"""
+
+on_records_unlink = RecordsEvent(on_record_unlink)
+"""
+``on_records_unlink`` is fired once when records have been deleted
+by the same ``unlink()``. The consumers of ``on_record_unlink`` are then
+fired for each record.
+
+Listeners should take the following arguments:
+
+ * env: :py:class:`~odoo.api.Environment` object
+ * model_name: name of the model
+ * record_ids: list of the ids of the records
+
+"""
@@ -8,15 +8,17 @@ Producers of events.
 Fire the common events:
 
 -  ``on_record_create`` when a record is created
--  ``on_record_write`` when something is written on a record
--  ``on_record_unlink``  when a record is deleted
+-  ``on_records_write`` when something is written on records, which
+   fires ``on_record_write`` for each record
+-  ``on_records_unlink``  when records are deleted, which fires
+   ``on_record_unlink`` for each record
 
 """
 
 from odoo import api, models
 from .event import (on_record_create,
-                    on_record_write,
-                    on_record_unlink)
+                    on_records_write,
+                    on_records_unlink)
 from .connector import is_module_installed
 
 
@@ -36,17 +38,15 @@ class Base(models.AbstractModel):
     def write(self, vals):
         result = super(Base, self).write(vals)
         if is_module_installed(self.env, 'connector'):
-            if on_record_write.has_consumer_for(self.env, self._name):
-                for record_id in self.ids:
-                    on_record_write.fire(self.env, self._name,
-                                         record_id, vals)
+            if on_records_write.has_consumer_for(self.env, self._name):
+                on_records_write.fire(self.env, self._name, self.ids, vals)
         return result
 
     @api.multi
     def unlink(self):
+        record_ids = self.ids
         result = super(Base, self).unlink()
         if is_module_installed(self.env, 'connector'):
-            if on_record_unlink.has_consumer_for(self.env, self._name):
-                for record_id in self.ids:
-                    on_record_unlink.fire(self.env, self._name, record_id)
+            if on_records_unlink.has_consumer_for(self.env, self._name):
+                on_records_unlink.fire(self.env, self._name, record_ids)
         return result
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from . import test_backend
+from . import test_backend_adapter
 from . import test_connector
 from . import test_event
 from . import test_mapper
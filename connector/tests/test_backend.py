@@ -233,3 +233,37 @@ class test_backend_register(common.TransactionCase):
         with self.assertRaises(ValueError):
             self.backend.register_class(LambdaRecurseUnit,
                                         replacing=LambdaRecurseUnit)
+
+    def test_get_class_cache(self):
+        """ The class found is cached until a class is registered """
+        class LambdaUnit(ConnectorUnit):
+            _model_name = 'res.users'
+
+        @self.parent
+        class LambdaParentUnit(LambdaUnit):
+            _model_name = 'res.users'
+
+        matching_cls = self.backend.get_class(LambdaUnit,
+                                              self.env,
+                                              'res.users')
+        self.assertEqual(matching_cls, LambdaParentUnit)
+        self.assertEqual(self.backend.class_cache_stats,
+                         {'hits': 0, 'misses': 1})
+        matching_cls = self.backend.get_class(LambdaUnit,
+                                              self.env,
+                                              'res.users')
+        self.assertEqual(matching_cls, LambdaParentUnit)
+        self.assertEqual(self.backend.class_cache_stats,
+                         {'hits': 1, 'misses': 1})
+
+        # a class registered on the parent invalidates the child's cache
+        @self.parent(replacing=LambdaParentUnit)
+        class LambdaReplacingUnit(LambdaUnit):
+            _model_name = 'res.users'
+
+        matching_cls = self.backend.get_class(LambdaUnit,
+                                              self.env,
+                                              'res.users')
+        self.assertEqual(matching_cls, LambdaReplacingUnit)
+        self.assertEqual(self.backend.class_cache_stats,
+                         {'hits': 1, 'misses': 2})
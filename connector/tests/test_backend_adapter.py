@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright 2013-2017 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
+
+import mock
+
+import odoo.tests.common as common
+from odoo.addons.connector.unit.backend_adapter import CRUDAdapter
+
+
+class test_crud_adapter(common.TransactionCase):
+    """ Test the default implementation of CRUDAdapter """
+
+    def setUp(self):
+        super(test_crud_adapter, self).setUp()
+
+        class ListAdapter(CRUDAdapter):
+            _model_name = 'res.partner'
+            _page_size = 2
+
+            records = {i: {'id': i} for i in range(1, 6)}
+            calls = []
+
+            def search(self, filters=None):
+                self.calls.append(('search', filters))
+                return sorted(self.records)
+
+            def read(self, external_id):
+                self.calls.append(('read', external_id))
+                return self.records[external_id]
+
+            def create(self, data):
+                return data['id']
+
+            def write(self, external_id, data):
+                return True
+
+        self.adapter = ListAdapter(mock.MagicMock())
+
+    def test_iter_search_read(self):
+        records = self.adapter.iter_search_read(filters={'a': 1})
+        self.assertEqual(self.adapter.calls, [])
+        self.assertEqual([record['id'] for record in records],
+                         [1, 2, 3, 4, 5])
+        self.assertEqual(self.adapter.calls[0], ('search', {'a': 1}))
+        self.assertEqual(len(self.adapter.calls), 6)
+
+    def test_search_read_page(self):
+        records, cursor = self.adapter.search_read_page(limit=3)
+        self.assertEqual([record['id'] for record in records], [1, 2, 3])
+        records, cursor = self.adapter.search_read_page(cursor=cursor,
+                                                        limit=3)
+        self.assertEqual([record['id'] for record in records], [4, 5])
+        self.assertIsNone(cursor)
+
+    def test_create_write_many(self):
+        self.assertEqual(self.adapter.create_many([{'id': 7}, {'id': 8}]),
+                         [7, 8])
+        self.assertEqual(self.adapter.write_many([(7, {}), (8, {})]),
+                         [True, True])
@@ -16,6 +16,8 @@ from odoo.addons.connector.connector import (
     ConnectorEnvironment,
     ConnectorUnit,
     pg_try_advisory_lock,
+    pg_try_advisory_locks,
+    advisory_lock_stats,
 )
 
 
@@ -192,6 +194,35 @@ class TestConnectorEnvironment(unittest.TestCase):
         self.assertEqual(type(new_env), MyConnectorEnvironment)
         self.assertEqual(new_env.api, api)
 
+    def test_create_environment_pool(self):
+        """ The environments and reusable units are created once """
+        class ReusableUnit(ConnectorUnit):
+            _model_name = 'res.user'
+            _reusable = True
+
+        backend_record = mock.Mock(name='BackendRecord')
+        backend = mock.Mock(name='Backend')
+        backend.get_class.return_value = ReusableUnit
+        backend_record.get_backend.return_value = backend
+        backend_record.env = mock.MagicMock(name='Environment')
+        connector_env = ConnectorEnvironment(backend_record, 'res.partner')
+
+        new_env = connector_env.create_environment(
+            backend_record, 'res.user', connector_env=connector_env)
+        new_env2 = new_env.create_environment(
+            backend_record, 'res.user', connector_env=new_env)
+        self.assertIs(new_env, new_env2)
+        self.assertEqual(backend_record.get_backend.call_count, 2)
+        unit = new_env.get_connector_unit(ConnectorUnit)
+        self.assertIs(new_env.get_connector_unit(ConnectorUnit), unit)
+        self.assertEqual(backend.get_class.call_count, 1)
+
+        connector_env.clear_pool()
+        new_env3 = connector_env.create_environment(
+            backend_record, 'res.user', connector_env=connector_env)
+        self.assertIsNot(new_env3, new_env)
+        self.assertIsNot(new_env3.get_connector_unit(ConnectorUnit), unit)
+
 
 class TestAdvisoryLock(common.TransactionCase):
 
@@ -235,3 +266,21 @@ class TestAdvisoryLock(common.TransactionCase):
         with self.assertRaises(RetryableJobError) as cm:
             connector_unit2.advisory_lock_or_retry(lock, retry_seconds=3)
             self.assertEquals(cm.exception.seconds, 3)
+
+    def test_concurrent_locks(self):
+        """ Several locks are acquired all or none """
+        locks = ['import_record(backend.name, 1, res.partner, %s)' % ext_id
+                 for ext_id in ('999997', '999998', '999999')]
+        stats = advisory_lock_stats().get('import_record',
+                                          {'acquired': 0, 'failed': 0})
+        self.assertTrue(pg_try_advisory_lock(self.env, locks[1]))
+        # the 2nd lock is held by the 1st transaction
+        self.assertFalse(pg_try_advisory_locks(self.env2, locks))
+        # so the other locks have not been kept by the 2nd transaction
+        self.assertTrue(pg_try_advisory_locks(self.env, locks))
+        self.assertEqual(advisory_lock_stats()['import_record'],
+                         {'acquired': stats['acquired'] + 4,
+                          'failed': stats['failed'] + 1})
+        connector_unit2 = mock_connector_unit(self.env2)
+        with self.assertRaises(RetryableJobError):
+            connector_unit2.advisory_locks_or_retry(locks[:1])
@@ -151,3 +151,17 @@ class test_event(common.TransactionCase):
         func.side_effect = Exception('Should not be called')
         self.event(func)
         self.event.fire(self.env, 'res.users')
+
+    def test_has_consumer_for_subscribe_after_fire(self):
+        """The dispatch table is refreshed when a consumer subscribes"""
+        self.assertFalse(self.event.has_consumer_for(self.env,
+                                                     'res.partner'))
+
+        @self.event(model_names=['res.partner'])
+        def consumer1(env, model_name):
+            pass
+        self.assertTrue(self.event.has_consumer_for(self.env,
+                                                    'res.partner'))
+        self.event.unsubscribe(consumer1, model_names=['res.partner'])
+        self.assertFalse(self.event.has_consumer_for(self.env,
+                                                     'res.partner'))
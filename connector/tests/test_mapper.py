@@ -285,6 +285,58 @@ class test_mapper(unittest.TestCase):
                     'out_city': 'city'}
         self.assertEqual(map_record.values(for_create=True), expected)
 
+    def test_map_records(self):
+        """ Map several records with the same options """
+        class MyMapper(ImportMapper):
+
+            direct = [('name', 'out_name')]
+
+            @mapping
+            def street(self, record):
+                return {'out_street': record['street'].upper()}
+
+            @only_create
+            @mapping
+            def city(self, record):
+                return {'out_city': 'city'}
+
+        env = mock.MagicMock()
+        records = ({'name': name, 'street': 'street'}
+                   for name in ('Guewen', 'Joel'))
+        mapper = MyMapper(env)
+        values = mapper.map_records(records, for_create=True)
+        expected = [{'out_name': 'Guewen',
+                     'out_street': 'STREET',
+                     'out_city': 'city'},
+                    {'out_name': 'Joel',
+                     'out_street': 'STREET',
+                     'out_city': 'city'}]
+        self.assertEqual(list(values), expected)
+        values = mapper.map_records([{'name': 'Guewen', 'street': 'street'}],
+                                    fields=['street'])
+        self.assertEqual(list(values), [{'out_street': 'STREET'}])
+
+    def test_map_records_overridden_apply(self):
+        """ map_records uses _apply when a mapper overrides it """
+        class MyMapper(ImportMapper):
+
+            direct = [('name', 'out_name')]
+
+            def _apply(self, map_record, options=None):
+                values = super(MyMapper, self)._apply(map_record,
+                                                      options=options)
+                values['applied'] = True
+                return values
+
+        env = mock.MagicMock()
+        mapper = MyMapper(env)
+        values = mapper.map_records([{'name': 'Guewen'}])
+        self.assertEqual(list(values), [{'out_name': 'Guewen',
+                                         'applied': True}])
+        mapper.direct = [('name', 'other_name')]
+        values = mapper.map_record({'name': 'Guewen'}).values()
+        self.assertEqual(values, {'other_name': 'Guewen', 'applied': True})
+
     def test_mapping_update(self):
         """ Force values on a map record """
         class MyMapper(ImportMapper):
@@ -530,6 +582,10 @@ class test_mapper_recordsets(common.TransactionCase):
         expected = {'parent_name': 'Agrolait'}
         self.assertEqual(map_record.values(), expected)
         self.assertEqual(map_record.values(for_create=True), expected)
+        # the value of the related record is read again
+        partner.parent_id.name = 'Agrolait 2'
+        self.assertEqual(mapper.map_record(partner).values(),
+                         {'parent_name': 'Agrolait 2'})
 
 
 class test_mapper_binding(common.TransactionCase):
@@ -564,6 +620,45 @@ class test_mapper_binding(common.TransactionCase):
         self.country_binder.to_external.assert_called_once_with(
             partner.country_id.id, wrap=False)
 
+    def test_mapping_m2o_to_external_cache(self):
+        """ The external id of a relation is searched once per mapper """
+        class MyMapper(ImportMapper):
+            _model_name = 'res.partner'
+            direct = [(m2o_to_external('country_id'), 'country')]
+
+        partner = self.env.ref('base.main_partner')
+        partner.write({'country_id': self.env.ref('base.ch').id})
+        partner2 = partner.copy()
+        self.country_binder.to_external.return_value = 10
+
+        mapper = MyMapper(self.connector_env)
+        values = mapper.map_records([partner, partner2])
+        self.assertEqual(list(values), [{'country': 10}, {'country': 10}])
+        self.country_binder.to_external.assert_called_once_with(
+            partner.country_id.id, wrap=False)
+
+    def test_mapping_backend_to_m2o_prefetch(self):
+        """ Prefetch the relations of several records """
+        class MyMapper(ImportMapper):
+            _model_name = 'res.partner'
+            direct = [(external_to_m2o('country'), 'country_id')]
+
+        records = [{'country': 10}, {'country': 10}, {'country': 11}]
+        ch = self.env.ref('base.ch')
+        fr = self.env.ref('base.fr')
+        self.country_binder.to_internal_many.return_value = {10: ch,
+                                                             11: fr}
+        mapper = MyMapper(self.connector_env)
+        values = mapper.map_records(records, prefetch=True)
+        self.assertEqual(list(values), [{'country_id': ch.id},
+                                        {'country_id': ch.id},
+                                        {'country_id': fr.id}])
+        self.assertEqual(self.country_binder.to_internal_many.call_count, 1)
+        args, kwargs = self.country_binder.to_internal_many.call_args
+        self.assertEqual(sorted(args[0]), [10, 11])
+        self.assertEqual(kwargs, {'unwrap': False})
+        self.assertFalse(self.country_binder.to_internal.called)
+
     def test_mapping_backend_to_m2o(self):
         """ Map a direct record with the backend_to_m2o modifier function """
         class MyMapper(ImportMapper):
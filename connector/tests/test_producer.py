@@ -8,7 +8,8 @@ import odoo.tests.common as common
 from odoo.addons.connector.event import (
     on_record_create,
     on_record_write,
-    on_record_unlink
+    on_record_unlink,
+    on_records_write,
 )
 
 
@@ -53,6 +54,29 @@ class test_producers(common.TransactionCase):
         self.assertDictEqual(self.recipient.vals, vals)
         on_record_write.unsubscribe(event)
 
+    def test_on_records_write(self):
+        """
+        Write on several records, the recordset event is called once
+        and the per-record event for each record
+        """
+        self.recipient.batches = []
+        self.recipient.record_ids = []
+
+        @on_records_write(model_names='res.partner')
+        def batch_event(env, model_name, record_ids, vals=None):
+            self.recipient.batches.append(record_ids)
+
+        @on_record_write(model_names='res.partner')
+        def event(env, model_name, record_id, vals=None):
+            self.recipient.record_ids.append(record_id)
+
+        partners = self.partner | self.model.create({'name': 'Kif'})
+        partners.write({'city': 'Omicron Persei 8'})
+        self.assertEqual(self.recipient.batches, [partners.ids])
+        self.assertEqual(self.recipient.record_ids, partners.ids)
+        on_records_write.unsubscribe(batch_event, model_names='res.partner')
+        on_record_write.unsubscribe(event, model_names='res.partner')
+
     def test_on_record_unlink(self):
         """
         Unlink a record and check if the event is called
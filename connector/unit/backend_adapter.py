@@ -17,9 +17,17 @@ class CRUDAdapter(BackendAdapter):
 
     Subclasses can implement their own implementation for
     the methods.
+
+    The methods working on several records (:meth:`iter_search_read`,
+    :meth:`search_read_page`, :meth:`read_many`, :meth:`create_many`,
+    :meth:`write_many`) have a default implementation calling
+    :meth:`search`, :meth:`read`, :meth:`create` and :meth:`write`
+    for each record. Subclasses should override them when the external
+    system has paginated or bulk calls.
     """
 
     _model_name = None
+    _page_size = 100  # override in sub-classes
 
     def search(self, *args, **kwargs):
         """ Search records according to some criterias
@@ -46,3 +54,69 @@ class CRUDAdapter(BackendAdapter):
     def delete(self, *args, **kwargs):
         """ Delete a record on the external system """
         raise NotImplementedError
+
+    def read_many(self, ids):
+        """ Returns the information of several records """
+        return [self.read(external_id) for external_id in ids]
+
+    def search_read_page(self, filters=None, cursor=None, limit=None):
+        """ Search records according to some criterias and returns the
+        information of a page of them.
+
+        The default implementation searches all the ids on the first
+        page, the cursor is the position in this list of ids. An
+        implementation using the pagination of the external system can
+        use anything as cursor (an offset, a token returned by the
+        external system, the last id read, ...).
+
+        :param filters: criterias of the search
+        :param cursor: cursor returned with the previous page,
+                       None for the first page
+        :param limit: number of records by page
+        :return: tuple ``(records, cursor)`` where cursor is the cursor
+                 of the next page, or None if this is the last page
+        """
+        limit = limit or self._page_size
+        if cursor is None:
+            cursor = (0, self.search(filters))
+        offset, ids = cursor
+        records = self.read_many(ids[offset:offset + limit])
+        offset += limit
+        if offset >= len(ids):
+            return records, None
+        return records, (offset, ids)
+
+    def iter_search_read(self, filters=None, page_size=None):
+        """ Search records according to some criterias and yield their
+        information, reading them page by page with
+        :meth:`search_read_page`, so only one page of records is in
+        memory at a time.
+
+        :param filters: criterias of the search
+        :param page_size: number of records read by page
+        """
+        cursor = None
+        while True:
+            records, cursor = self.search_read_page(filters, cursor=cursor,
+                                                    limit=page_size)
+            for record in records:
+                yield record
+            if cursor is None:
+                break
+
+    def create_many(self, records):
+        """ Create several records on the external system
+
+        :param records: list of the values of the records
+        :return: list of the results of :meth:`create`
+        """
+        return [self.create(data) for data in records]
+
+    def write_many(self, records):
+        """ Update several records on the external system
+
+        :param records: list of ``(external_id, values)``
+        :return: list of the results of :meth:`write`
+        """
+        return [self.write(external_id, data)
+                for external_id, data in records]
@@ -17,6 +17,7 @@ from collections import namedtuple
 from contextlib import contextmanager
 
 from odoo import models
+from odoo.tools.lru import LRU
 from ..connector import ConnectorUnit, MetaConnectorUnit, ConnectorEnvironment
 from ..exception import MappingError, NoConnectorUnitError
 
@@ -162,17 +163,17 @@ def m2o_to_external(field, binding=None):
             binding_model = column.comodel_name
         else:
             binding_model = binding
-        binder = self.binder_for(binding_model)
         # if a relation is not a binding, we wrap the record in the
         # binding, we'll return the id of the binding
         wrap = bool(binding)
-        value = binder.to_external(rel_id, wrap=wrap)
+        value = self._relation_to_external(binding_model, rel_id, wrap)
         if not value:
             raise MappingError("Can not find an external id for record "
                                "%s in model %s %s wrapping" %
                                (rel_id, binding_model,
                                 'with' if wrap else 'without'))
         return value
+    modifier.relation = ('to_external', field, binding)
     return modifier
 
 
@@ -207,11 +208,10 @@ def external_to_m2o(field, binding=None):
             binding_model = column.comodel_name
         else:
             binding_model = binding
-        binder = self.binder_for(binding_model)
         # if we want the normal record, not a binding,
         # we ask to the binder to unwrap the binding
         unwrap = bool(binding)
-        record = binder.to_internal(rel_id, unwrap=unwrap)
+        record = self._relation_to_internal(binding_model, rel_id, unwrap)
         if not record:
             raise MappingError("Can not find an existing %s for external "
                                "record %s %s unwrapping" %
@@ -225,6 +225,7 @@ def external_to_m2o(field, binding=None):
                 'returning a record should be preferred.', binding_model
             )
             return record
+    modifier.relation = ('to_internal', field, binding)
     return modifier
 
 
@@ -241,12 +242,28 @@ def follow_m2o_relations(field):
 
     :param field: field "path", using dots for relations as usual in Odoo
     """
+    attrs = field.split('.')
+
     def modifier(self, record, to_attr):
-        attrs = field.split('.')
+        # only the id of the last related record is cached, its field
+        # is read each time so the value is never outdated
+        cache = getattr(self, '_relation_cache', None)
+        key = None
+        if (cache is not None and isinstance(record, models.BaseModel) and
+                len(record) == 1):
+            key = ('follow', field, record._name, record.id)
+            related = cache.get(key)
+            if related is not None:
+                model_name, related_id = related
+                related = record.env[model_name].browse(related_id)
+                return getattr(related, attrs[-1])
         value = record
-        for attr in attrs:
+        for attr in attrs[:-1]:
             value = getattr(value, attr)
-        return value
+        if (key is not None and isinstance(value, models.BaseModel) and
+                len(value) <= 1):
+            cache[key] = (value._name, value.id or [])
+        return getattr(value, attrs[-1])
     return modifier
 
 
@@ -254,6 +271,11 @@ MappingDefinition = namedtuple('MappingDefinition',
                                ['changed_by',
                                 'only_create'])
 
+MappingPlan = namedtuple('MappingPlan',
+                         ['direct',
+                          'methods',
+                          'children'])
+
 
 class MetaMapper(MetaConnectorUnit):
     """ Metaclass for Mapper
@@ -321,6 +343,8 @@ class MetaMapper(MetaConnectorUnit):
             if hasattr(base, '_changed_by_fields') and base._changed_by_fields:
                 changed_by_fields |= base._changed_by_fields
         cls._changed_by_fields = changed_by_fields
+        # compiled mapping plans of the class per (for_create, fields)
+        cls._mapping_plans = LRU(cls._mapping_plans_size)
         super(MetaMapper, cls).__init__(name, bases, attrs)
 
     @staticmethod
@@ -396,6 +420,15 @@ class MapChild(ConnectorUnit):
     def _child_mapper(self):
         raise NotImplementedError
 
+    @property
+    def child_mapper(self):
+        """ The :py:class:`Mapper` converting the items, found once
+        and shared by all the items """
+        mapper = getattr(self, '_child_mapper_unit', None)
+        if mapper is None:
+            mapper = self._child_mapper_unit = self._child_mapper()
+        return mapper
+
     def skip_item(self, map_record):
         """ Hook to implement in sub-classes when some child
         records should be skipped.
@@ -421,7 +454,7 @@ class MapChild(ConnectorUnit):
         :return: formatted output values for the item
 
         """
-        mapper = self._child_mapper()
+        mapper = self.child_mapper
         mapped = []
         for item in items:
             map_record = mapper.map_record(item, parent=parent)
@@ -614,6 +647,11 @@ class Mapper(ConnectorUnit):
 
     _map_child_class = None
 
+    # number of relations kept in the cache of the modifiers
+    _relation_cache_size = 1024
+    # number of mapping plans kept per class, see _mapping_plan()
+    _mapping_plans_size = 64
+
     def __init__(self, connector_env):
         """
 
@@ -622,6 +660,9 @@ class Mapper(ConnectorUnit):
         """
         super(Mapper, self).__init__(connector_env)
         self._options = None
+        self._map_child_units = {}
+        self._binders = {}
+        self._relation_cache = LRU(self._relation_cache_size)
 
     def _map_direct(self, record, from_attr, to_attr):
         """ Apply the ``direct`` mappings.
@@ -640,7 +681,96 @@ class Mapper(ConnectorUnit):
         for meth, definition in self._map_methods.iteritems():
             yield getattr(self, meth), definition
 
+    def binder_for(self, model=None):
+        """ Returns the ``Binder`` for a model, shared by all the
+        records converted by this mapper """
+        binder = self._binders.get(model)
+        if binder is None:
+            binder = self._binders[model] = super(Mapper, self).binder_for(
+                model=model)
+        return binder
+
+    def _relation_to_external(self, binding_model, rel_id, wrap):
+        """ External id of a relation, used by :func:`m2o_to_external`.
+
+        The external ids found are kept in the relation cache of the
+        mapper, so they are searched once for all the records converted
+        by the mapper.
+        """
+        key = ('to_external', binding_model, rel_id, wrap)
+        value = self._relation_cache.get(key)
+        if value is None:
+            binder = self.binder_for(binding_model)
+            value = binder.to_external(rel_id, wrap=wrap)
+            if value:
+                self._relation_cache[key] = value
+        return value
+
+    def _relation_to_internal(self, binding_model, external_id, unwrap):
+        """ Odoo record of a relation, used by :func:`external_to_m2o`.
+
+        The records found are kept in the relation cache of the mapper,
+        so they are searched once for all the records converted by the
+        mapper.
+        """
+        key = ('to_internal', binding_model, external_id, unwrap)
+        record = self._relation_cache.get(key)
+        if record is None:
+            binder = self.binder_for(binding_model)
+            record = binder.to_internal(external_id, unwrap=unwrap)
+            if record:
+                self._relation_cache[key] = record
+        return record
+
+    def prefetch_relations(self, records):
+        """ Fill the relation cache for a list of records to convert.
+
+        The relations of the ``direct`` mappings using
+        :func:`m2o_to_external` or :func:`external_to_m2o` are searched
+        with one query per mapping using the bulk methods of the
+        :py:class:`~connector.connector.Binder`, instead of one query per
+        record when they are converted.
+
+        :param records: records to convert
+        :type records: list
+        """
+        cache = self._relation_cache
+        for from_attr, to_attr in self.direct:
+            relation = getattr(from_attr, 'relation', None)
+            if relation is None:
+                continue
+            kind, field, binding = relation
+            if kind == 'to_external':
+                column = self.model._fields[field]
+                rel_ids = set(record[field].id for record in records
+                              if record[field])
+            else:
+                column = self.model._fields[to_attr]
+                rel_ids = set(record[field] for record in records
+                              if record[field])
+            binding_model = binding or column.comodel_name
+            option = bool(binding)
+            rel_ids = [rel_id for rel_id in rel_ids
+                       if (kind, binding_model, rel_id, option) not in cache]
+            if not rel_ids:
+                continue
+            binder = self.binder_for(binding_model)
+            if kind == 'to_external':
+                found = binder.to_external_many(rel_ids, wrap=option)
+            else:
+                found = binder.to_internal_many(rel_ids, unwrap=option)
+            for rel_id, value in found.iteritems():
+                if value:
+                    cache[(kind, binding_model, rel_id, option)] = value
+
     def _get_map_child_unit(self, model_name):
+        mapper_child = self._map_child_units.get(model_name)
+        if mapper_child is None:
+            mapper_child = self._map_child_units[model_name] = (
+                self._find_map_child_unit(model_name))
+        return mapper_child
+
+    def _find_map_child_unit(self, model_name):
         try:
             mapper_child = self.unit_for(self._map_child_class,
                                          model=model_name)
@@ -693,6 +823,100 @@ class Mapper(ConnectorUnit):
         """
         return MapRecord(self, record, parent=parent)
 
+    def map_records(self, records, parent=None, prefetch=False, **options):
+        """ Convert several records with the same options.
+
+        The mappings to apply are computed once for all the records and
+        the child mappers and binders are shared between the records.
+        The records are converted one at a time when the returned
+        generator is consumed, so ``records`` can be a generator too.
+
+        Usage::
+
+            mapper = SomeMapper(env)
+            for values in mapper.map_records(records, for_create=True):
+                ...
+
+        :param records: iterable of records to transform
+        :param parent: optional parent record, for items
+        :param prefetch: if True, the relations of all the records are
+                         searched before the conversion with
+                         :py:meth:`prefetch_relations`
+        :param **options: options of the mapping, as for
+                          :py:meth:`MapRecord.values`
+        :return: generator of the mapped values of each record
+        """
+        options = MapOptions(**options)
+        if prefetch:
+            records = list(records)
+            self.prefetch_relations(records)
+        if self._overrides_apply():
+            for record in records:
+                map_record = self.map_record(record, parent=parent)
+                yield self._apply(map_record, options=options)
+            return
+        plan = self._mapping_plan(options)
+        for record in records:
+            map_record = self.map_record(record, parent=parent)
+            with self._mapping_options(options):
+                values = self._apply_plan(map_record, plan)
+            yield values
+
+    def _overrides_apply(self):
+        """ Return True when the class of the mapper overrides
+        ``_apply`` or ``_apply_with_options``, the records must then be
+        converted with them instead of a mapping plan """
+        cls = type(self)
+        return (cls._apply.im_func is not Mapper._apply.im_func or
+                cls._apply_with_options.im_func is not
+                Mapper._apply_with_options.im_func)
+
+    def _mapping_plan(self, options):
+        """ Return the mappings to apply for the options: the ``direct``
+        mappings, the mapping methods and the ``children`` filtered on
+        ``fields`` and ``for_create``.
+
+        The plan is computed once per class of mapper and options and
+        kept in the ``_mapping_plans`` LRU of the class, unless the
+        instance has its own ``direct`` or ``children``.
+
+        :param options: options of the mapping
+        :type options: :py:class:`MapOptions`
+        :rtype: :py:class:`MappingPlan`
+        """
+        fields = frozenset(options.fields) if options.fields else None
+        for_create = bool(options.for_create)
+        cls = type(self)
+        cacheable = ('direct' not in self.__dict__ and
+                     'children' not in self.__dict__)
+        key = (for_create, fields)
+        if cacheable:
+            plan = cls._mapping_plans.get(key)
+            if plan is not None:
+                return plan
+        direct = []
+        for from_attr, to_attr in self.direct:
+            if callable(from_attr):
+                attr_name = MetaMapper._direct_source_field_name(from_attr)
+            else:
+                attr_name = from_attr
+            if not fields or attr_name in fields:
+                direct.append((from_attr, to_attr))
+        methods = []
+        for meth, definition in self._map_methods.iteritems():
+            mapping_changed_by = definition.changed_by
+            if (not fields or not mapping_changed_by or
+                    mapping_changed_by.intersection(fields)):
+                if definition.only_create and not for_create:
+                    continue
+                methods.append((meth, getattr(cls, meth)))
+        children = [child for child in self.children
+                    if not fields or child[0] in fields]
+        plan = MappingPlan(tuple(direct), tuple(methods), tuple(children))
+        if cacheable:
+            cls._mapping_plans[key] = plan
+        return plan
+
     def _apply(self, map_record, options=None):
         """ Apply the mappings on a :py:class:`MapRecord`
 
@@ -720,39 +944,37 @@ class Mapper(ConnectorUnit):
         _logger.debug('converting record %s to model %s',
                       map_record.source, self.model)
 
-        fields = self.options.fields
-        for_create = self.options.for_create
-        result = {}
-        for from_attr, to_attr in self.direct:
-            if callable(from_attr):
-                attr_name = MetaMapper._direct_source_field_name(from_attr)
-            else:
-                attr_name = from_attr
+        plan = self._mapping_plan(self.options)
+        return self._apply_plan(map_record, plan)
 
-            if (not fields or attr_name in fields):
-                value = self._map_direct(map_record.source,
-                                         from_attr,
-                                         to_attr)
-                result[to_attr] = value
+    def _apply_plan(self, map_record, plan):
+        """ Apply the mappings of a :py:class:`MappingPlan` on a
+        :py:class:`MapRecord`, the options must be set.
 
-        for meth, definition in self.map_methods:
-            mapping_changed_by = definition.changed_by
-            if (not fields or not mapping_changed_by or
-                    mapping_changed_by.intersection(fields)):
-                if definition.only_create and not for_create:
-                    continue
-                values = meth(map_record.source)
-                if not values:
-                    continue
-                if not isinstance(values, dict):
-                    raise ValueError('%s: invalid return value for the '
-                                     'mapping method %s' % (values, meth))
-                result.update(values)
-
-        for from_attr, to_attr, model_name in self.children:
-            if (not fields or from_attr in fields):
-                result[to_attr] = self._map_child(map_record, from_attr,
-                                                  to_attr, model_name)
+        :param map_record: source record to convert
+        :type map_record: :py:class:`MapRecord`
+        :param plan: mappings to apply
+        :type plan: :py:class:`MappingPlan`
+
+        """
+        source = map_record.source
+        result = {}
+        for from_attr, to_attr in plan.direct:
+            result[to_attr] = self._map_direct(source, from_attr, to_attr)
+
+        for meth, func in plan.methods:
+            values = func(self, source)
+            if not values:
+                continue
+            if not isinstance(values, dict):
+                raise ValueError('%s: invalid return value for the '
+                                 'mapping method %s' %
+                                 (values, getattr(self, meth)))
+            result.update(values)
+
+        for from_attr, to_attr, model_name in plan.children:
+            result[to_attr] = self._map_child(map_record, from_attr,
+                                              to_attr, model_name)
 
         return self.finalize(map_record, result)
 
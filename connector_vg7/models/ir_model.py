@@ -124,7 +124,7 @@ CACHE
 Data stored in cache:
 - 'vg7:shipping': sub-model res.partner.shipping
 - 'vg7:billing': sub-model res.partner.invoice
-- '_QUEUE_SYNC': queue records
+- QUEUE_SYNC: records in progress, per import scope
 - '__{{model}}': full data of model to write the created record (read above)
 
 
@@ -145,15 +145,20 @@ Return code:
    -12: Internal error
   -100: if return code < -100 means error on child records
 """
+import collections
 import logging
 import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import itertools
 import time
-import csv
+import uuid
 
 import requests
 from odoo import api, fields, models, _
 from odoo import release
+from .synchro_channel import (CounterpartPageReader, CounterpartPrefetcher,
+                              odoo_read_value)
 
 _logger = logging.getLogger(__name__)
 try:
@@ -281,12 +286,31 @@ WORKFLOW = {
     77: {'model': 'mail.message'},
 }
 
+# Numeric log levels; message is logged if its level >= current level
+LOGLEVEL2NUM = {
+    'error': '4',
+    'info': '3',
+    'warning': '2',
+    'debug': '1',
+    'any': '0',
+    'trace': '!',
+}
+# Channel trace level (see synchro.channel.tracelevel) -> log level
+TRACELEVEL2NUM = {
+    '0': '3',
+    '1': '1',
+    '2': '1',
+    '3': '0',
+    '4': '0',
+}
+
 
 class IrModelSynchro(models.Model):
     _name = 'ir.model.synchro'
     _inherit = 'ir.model'
 
     LOGLEVEL = 'debug'
+    BATCH_SIZE = 500
     DEF_INCL_FLDS = [
         'action', 'category_id', 'code', 'company_ids', 'country_id',
         'description', 'default_code', 'journal_id', 'location_id',
@@ -332,49 +356,99 @@ class IrModelSynchro(models.Model):
             text = res
         return text
 
-    def logmsg(self, loglevel, msg, rec=None, model=None, ctx=None):
-        # cache = self.env['ir.model.synchro.cache']
-        ctx = ctx or {}
-        ctx['model'] = ctx.get('model', model or '')
-        ctx['id'] = ctx.get('id', rec and rec.id or False)
+    def get_loglevel(self, channel_id=None):
+        """Return current numeric log level: channel trace level if set,
+        otherwise LOGLEVEL"""
+        if channel_id:
+            loglevel = self.env['ir.model.synchro.cache'].get_attr(
+                channel_id, 'LOGLEVEL')
+            if loglevel:
+                return TRACELEVEL2NUM.get(
+                    loglevel, LOGLEVEL2NUM.get(loglevel, loglevel))
+        return LOGLEVEL2NUM.get(self.LOGLEVEL, self.LOGLEVEL)
+
+    def logmsg(self, loglevel, msg, rec=None, model=None, ctx=None,
+               channel_id=None):
+        """Log message if loglevel is enabled; message is formatted just
+        when it is logged. Errors and traces are stored in synchro log too.
+        If channel_id is supplied, channel trace level is applied and
+        logged messages are stored in the channel trace (see cache)"""
+        curloglevel = self.get_loglevel(channel_id=channel_id)
         if isinstance(loglevel, basestring):
             reqloglevel = loglevel
-            curloglevel = self.LOGLEVEL
+            if not reqloglevel.isdigit():
+                reqloglevel = LOGLEVEL2NUM.get(reqloglevel, '2')
         else:
-            curloglevel = reqloglevel = self.LOGLEVEL
-        loglevel2num = {
-            'error': '4',
-            'info': '3',
-            'warning': '2',
-            'debug': '1',
-            'any': '0',
-            'trace': '!',
-        }
-        if not reqloglevel.isdigit():
-            reqloglevel = loglevel2num.get(reqloglevel, '2')
-        if not curloglevel.isdigit():
-            curloglevel = loglevel2num.get(curloglevel, '3')
+            reqloglevel = curloglevel
+        to_store = reqloglevel in ('!', '4')
+        if reqloglevel < curloglevel and not to_store:
+            return
+        ctx = ctx or {}
+        ctx['model'] = ctx.get('model', model or '')
+        ctx['id'] = ctx.get('id', rec and rec.id or False)
         try:
             full_msg = os0.u(msg % ctx)
         except:
             full_msg = os0.u(msg)
         if reqloglevel >= curloglevel:
             _logger.info(full_msg)
-        if reqloglevel in ('!', '4'):
+            if channel_id:
+                self.env['ir.model.synchro.cache'].trace_event(
+                    channel_id, reqloglevel, ctx['model'], ctx['id'],
+                    full_msg)
+        if to_store:
             self.env['ir.model.synchro.log'].logger(
                 model, rec, full_msg)
 
+    def sync_commit(self):
+        """Commit current transaction unless a batch pull owns it;
+        in batch mode commit is issued once per chunk"""
+        if not self.env.context.get('synchro_batch'):
+            self.env.cr.commit()  # pylint: disable=invalid-commit
+
+    @contextmanager
+    def sync_savepoint(self):
+        """In batch mode run the inner operation in its own savepoint, so
+        its failure does not discard the other operations of the record;
+        otherwise the transaction is committed by the operation itself.
+        External ids indexed by a rolled back operation are forgotten"""
+        if self.env.context.get('synchro_batch'):
+            cache = self.env['ir.model.synchro.cache']
+            mark = cache.mark_ext_id_index()
+            try:
+                with self.env.cr.savepoint():
+                    yield
+            except BaseException:
+                cache.undo_ext_id_index(mark)
+                raise
+            cache.release_ext_id_index(mark)
+        else:
+            yield
+
+    def sync_rollback(self):
+        """Rollback current transaction after a failed operation; in batch
+        mode the operation savepoint (see sync_savepoint) has already
+        been rolled back with the ids it indexed, just the cache is
+        cleared"""
+        if self.env.context.get('synchro_batch'):
+            self.env.invalidate_all()
+        else:
+            self.env.cr.rollback()  # pylint: disable=invalid-commit
+            # Records created by rolled back transaction may be in index
+            self.env['ir.model.synchro.cache'].clean_ext_id_index()
+
     @api.model
     def create_n_commit(self, vals, context=None):
         try:
-            if context:
-                rec = self.with_context(context).create(vals)
-            else:
-                rec = self.create(vals)
-            # commit to avoid lost data in recursive write
-            self.env.cr.commit()  # pylint: disable=invalid-commit
+            with self.sync_savepoint():
+                if context:
+                    rec = self.with_context(context).create(vals)
+                else:
+                    rec = self.create(vals)
+                # commit to avoid lost data in recursive write
+                self.sync_commit()
         except BaseException as e:
-            self.env.cr.rollback()  # pylint: disable=invalid-commit
+            self.sync_rollback()
             rec = None
             self.logmsg('error',
                 '>>> %s.create()  # %s' % (self.__name__, e))
@@ -536,18 +610,20 @@ class IrModelSynchro(models.Model):
                     return vals, -4
                 elif rec.state == 'open':
                     try:
-                        rec.action_invoice_cancel()
-                        rec.action_invoice_draft()
+                        with self.sync_savepoint():
+                            rec.action_invoice_cancel()
+                            rec.action_invoice_draft()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error',
                             'Error %(e) in %(model)s.set_state_to_draft()',
                             model=model, ctx={'e': e})
                 elif rec.state == 'cancel':
                     try:
-                        rec.action_invoice_draft()
+                        with self.sync_savepoint():
+                            rec.action_invoice_draft()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error',
                             'Error %(e) in %(model)s.set_state_to_draft()',
                             model=model, ctx={'e': e})
@@ -562,18 +638,20 @@ class IrModelSynchro(models.Model):
                     return vals, -4
                 elif rec.state == 'sale':
                     try:
-                        rec.action_cancel()
-                        rec.action_draft()
+                        with self.sync_savepoint():
+                            rec.action_cancel()
+                            rec.action_draft()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error',
                             'Error %(e) in %(model)s.set_state_to_draft()',
                             model=model, ctx={'e': e})
                 elif rec.state == 'cancel':
                     try:
-                        rec.action_draft()
+                        with self.sync_savepoint():
+                            rec.action_draft()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error',
                             'Error %(e) in %(model)s.set_state_to_draft()',
                             model=model, ctx={'e': e})
@@ -589,37 +667,43 @@ class IrModelSynchro(models.Model):
                     return vals, -4
                 elif rec.state == 'purchase':
                     try:
-                        rec.button_cancel()
-                        rec.button_draft()
+                        with self.sync_savepoint():
+                            rec.button_cancel()
+                            rec.button_draft()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error',
                             'Error %(e) in %(model)s.set_state_to_draft()',
                             model=model, ctx={'e': e})
                 elif rec.state == 'cancel':
                     try:
-                        rec.button_draft()
+                        with self.sync_savepoint():
+                            rec.button_draft()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error',
                             'Error %(e) in %(model)s.set_state_to_draft()',
                             model=model, ctx={'e': e})
         elif model == 'stock.picking.package.preparation':
             if rec:
                 try:
-                    rec.unlink()
-                    self.logmsg('debug', '>>> %(model)s[%(id)s].unlink()',
-                        model=model, rec=rec)
+                    with self.sync_savepoint():
+                        self.env['ir.model.synchro.cache'].del_ext_id_index(
+                            model, rec.ids)
+                        rec.unlink()
+                        self.logmsg('debug', '>>> %(model)s[%(id)s].unlink()',
+                            model=model, rec=rec)
                 except IOError:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     errc = -3
         elif model == 'account.move':
             if rec:
                 if rec.state == 'posted':
                     try:
-                        rec.button_cancel()
+                        with self.sync_savepoint():
+                            rec.button_cancel()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error',
                             'Error %(e) in %(model)s.set_state_to_draft()',
                             model=model, ctx={'e': e})
@@ -644,9 +728,10 @@ class IrModelSynchro(models.Model):
                 return -4
             elif rec.original_state in ('open', 'paid'):
                 try:
-                    rec.action_invoice_open()
+                    with self.sync_savepoint():
+                        rec.action_invoice_open()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('error',
                         'Error %(e) in %(model)s.set_actual_state()',
                         model=model, ctx={'e': e})
@@ -655,9 +740,10 @@ class IrModelSynchro(models.Model):
                     rec.write({'name': rec.number})
             elif rec.original_state == 'cancel':
                 try:
-                    rec.action_invoice_cancel()
+                    with self.sync_savepoint():
+                        rec.action_invoice_cancel()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('error',
                         'Error %(e) in %(model)s.set_actual_state()',
                         model=model, ctx={'e': e})
@@ -677,18 +763,20 @@ class IrModelSynchro(models.Model):
                 if cache.get_struct_model_attr('sale.order.line', 'agents'):
                     rec._compute_commission_total()
                 try:
-                    rec.action_confirm()
+                    with self.sync_savepoint():
+                        rec.action_confirm()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('error',
                         'Error %(e) in %(model)s.set_actual_state()',
                         model=model, ctx={'e': e})
                     return -10
             elif rec.original_state == 'cancel':
                 try:
-                    rec.action_cancel()
+                    with self.sync_savepoint():
+                        rec.action_cancel()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('error',
                         'Error %(e) in %(model)s.set_actual_state()',
                         model=model, ctx={'e': e})
@@ -706,27 +794,30 @@ class IrModelSynchro(models.Model):
             elif rec.original_state == 'purchase':
                 rec._amount_all()
                 try:
-                    rec.button_confirm()
+                    with self.sync_savepoint():
+                        rec.button_confirm()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('error',
                         'Error %(e) in %(model)s.set_actual_state()',
                         model=model, ctx={'e': e})
                     return -10
             elif rec.original_state == 'cancel':
                 try:
-                    rec.button_cancel()
+                    with self.sync_savepoint():
+                        rec.button_cancel()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('error',
                         'Error %(e) in %(model)s.set_actual_state()',
                         model=model, ctx={'e': e})
                     return -10
         elif model == 'stock.picking.package.preparation':
             try:
-                rec.set_done()
+                with self.sync_savepoint():
+                    rec.set_done()
             except BaseException as e:
-                self.env.cr.rollback()  # pylint: disable=invalid-commit
+                self.sync_rollback()
                 self.logmsg('error',
                     'Error %(e) in %(model)s.set_actual_state()',
                     model=model, ctx={'e': e})
@@ -741,9 +832,10 @@ class IrModelSynchro(models.Model):
                 return -4
             elif rec.original_state == 'posted':
                 try:
-                    rec.post()
+                    with self.sync_savepoint():
+                        rec.post()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('error',
                         'Error %(e) in %(model)s.set_actual_state()',
                         model=model, ctx={'e': e})
@@ -849,20 +941,39 @@ class IrModelSynchro(models.Model):
         cls = self.env[actual_model]
         maybe_dif = False
         has_sequence = cache.get_struct_model_attr(actual_model, 'sequence')
-        if (len(req_domain) == 1 and
-                not cache.get_struct_model_attr(
-                    actual_model, req_domain[0][0])):
+        is_struct_field = cache.get_struct_model_attr(
+            actual_model, req_domain[0][0]) if req_domain else False
+        if (len(req_domain) == 1 and req_domain[0][1] == '=' and
+                req_domain[0][0] != 'id' and
+                (only_id or not is_struct_field)):
+            # Search by external id: look up in memory index
+            res_id = cache.get_ext_id_index(
+                actual_model, req_domain[0][0], req_domain[0][2])
+            if res_id:
+                if is_struct_field:
+                    return cls.browse(res_id), maybe_dif
+                return cls.with_context(
+                    {'lang': self.env.user.lang}).browse(res_id), maybe_dif
+        if len(req_domain) == 1 and not is_struct_field:
             domain = [('model', '=', actual_model),
                       ('ext_id_name', '=', req_domain[0][0]),
                       ('ext_id', req_domain[0][1], req_domain[0][2])]
             rec = self.env['ir.model.synchro.data'].search(domain)
             if rec:
+                if req_domain[0][1] == '=':
+                    cache.set_ext_id_index(actual_model, req_domain[0][0],
+                        req_domain[0][2], rec.res_id)
                 # return cls.browse(rec.res_id), maybe_dif
                 return cls.with_context(
                     {'lang': self.env.user.lang}).browse(rec.res_id), maybe_dif
             return rec, maybe_dif
         if only_id:
-            return exec_search(cls, req_domain, has_sequence), maybe_dif
+            rec = exec_search(cls, req_domain, has_sequence)
+            if (len(rec) == 1 and len(req_domain) == 1 and
+                    req_domain[0][1] == '=' and req_domain[0][0] != 'id'):
+                cache.set_ext_id_index(actual_model, req_domain[0][0],
+                    req_domain[0][2], rec.id)
+            return rec, maybe_dif
         domain = [x for x in req_domain]
         partner_domain = False
         if actual_model == 'res.partner' and spec in ('delivery', 'invoice'):
@@ -1179,6 +1290,79 @@ class IrModelSynchro(models.Model):
             default='')
         return default, apply4, spec
 
+    def get_mapping_plan(self, channel_id, xmodel, ext_refs):
+        """Return mapping plan of map_to_internal() for the set of field
+        names ext_refs: fields in priority order with resolved local names,
+        defaults and apply functions. Plans are stored in cache"""
+        cache = self.env['ir.model.synchro.cache']
+        key = (channel_id, xmodel, frozenset(ext_refs))
+        plan = cache.get_mapping_plan(key)
+        if plan:
+            return plan
+        ir_apply = self.env['ir.model.synchro.apply']
+        actual_model = self.get_actual_model(xmodel, only_name=True)
+        loc_ext_id = self.get_loc_ext_id_name(channel_id, xmodel, force=True)
+        child_ids = cache.get_struct_model_attr(
+            actual_model, 'CHILD_IDS', default=False)
+        list_1 = []
+        list_2 = []
+        list_3 = []
+        list_6 = []
+        list_8 = []
+        list_9 = []
+        only_internal = True
+        for ext_ref in ext_refs:
+            ext_name, loc_name, is_foreign = self.name_from_ref(
+                channel_id, xmodel, ext_ref)
+            if loc_name != ext_name:
+                only_internal = False
+            if loc_name in (loc_ext_id, 'id'):
+                list_1.append(ext_ref)
+            elif loc_name in ('country_id', 'company_id'):
+                list_2.append(ext_ref)
+            elif loc_name in ('partner_id', 'street'):
+                list_3.insert(0, ext_ref)
+            elif loc_name in ('is_company',
+                              'product_uom',
+                              'partner_invoice_id',
+                              'partner_shipping_id',
+                              'electronic_invoice_subjected'):
+                list_8.append(ext_ref)
+            elif loc_name == child_ids:
+                list_9.append(ext_ref)
+            else:
+                list_6.append(ext_ref)
+        steps = []
+        for ext_ref in list_1 + list_2 + list_3 + list_6 + list_8 + list_9:
+            step = {'ext_ref': ext_ref, 'is_struct': cache.is_struct(ext_ref)}
+            steps.append(step)
+            if not step['is_struct']:
+                continue
+            ext_name, loc_name, is_foreign = self.name_from_ref(
+                channel_id, xmodel, ext_ref)
+            default, apply4, spec = self.get_default_n_apply(
+                channel_id, xmodel, loc_name, ext_name, is_foreign,
+                ttype=cache.get_struct_model_field_attr(
+                    actual_model, ext_name, 'ttype'))
+            step.update({
+                'ext_name': ext_name,
+                'loc_name': loc_name,
+                'is_foreign': is_foreign,
+                'default': default,
+                'has_apply': bool(apply4),
+                'apply4': [x for x in apply4.split(',')
+                           if x == 'apply_odoo_migrate' or
+                           hasattr(ir_apply, x)],
+                'spec': spec,
+                'loc_exists': bool(loc_name and cache.get_struct_model_attr(
+                    actual_model, loc_name)),
+                'ttype': cache.get_struct_model_field_attr(
+                    actual_model, loc_name, 'ttype') if loc_name else False,
+            })
+        plan = {'steps': steps, 'only_internal': only_internal}
+        cache.set_mapping_plan(key, plan)
+        return plan
+
     def map_to_internal(self, channel_id, xmodel, vals, no_deep_fields=None):
 
         def rm_ext_value(vals, loc_name, ext_name, ext_ref, is_foreign):
@@ -1195,7 +1379,7 @@ class IrModelSynchro(models.Model):
                      apply4, default, xmodel, ctx=None):
             ir_apply = self.env['ir.model.synchro.apply']
             src = ext_ref
-            for fct in apply4.split(','):
+            for fct in apply4:
                 if fct == 'apply_odoo_migrate':
                     ext_odoo_ver = self.get_ext_odoo_ver(ext_ref.split(':')[0])
                     tnldict = self.get_tnldict(channel_id)
@@ -1211,7 +1395,8 @@ class IrModelSynchro(models.Model):
                         model=xmodel,
                         ctx={'loc': vals.get(loc_name), 'fct': fct,
                              'name': loc_name, 'src': src,
-                             'xid': loc_ext_id_name, 'd': default})
+                             'xid': loc_ext_id_name, 'd': default},
+                        channel_id=channel_id)
                     src = loc_name
                 elif hasattr(ir_apply, fct):
                     vals = getattr(ir_apply, fct)(channel_id,
@@ -1225,7 +1410,8 @@ class IrModelSynchro(models.Model):
                         model=xmodel,
                         ctx={'loc': vals.get(loc_name), 'fct': fct,
                              'name': loc_name, 'src': src,
-                             'xid': loc_ext_id_name, 'd': default})
+                             'xid': loc_ext_id_name, 'd': default},
+                        channel_id=channel_id)
                     src = loc_name
             return vals
 
@@ -1238,42 +1424,6 @@ class IrModelSynchro(models.Model):
             vals = rm_ext_value(vals, loc_name, ext_name, ext_ref, is_foreign)
             return vals
 
-        def priority_fields(channel_id, vals, loc_ext_id, xmodel):
-            cache = self.env['ir.model.synchro.cache']
-            child_ids = cache.get_struct_model_attr(
-                actual_model, 'CHILD_IDS', default=False)
-            fields = vals.keys()
-            list_1 = []
-            list_2 = []
-            list_3 = []
-            list_6 = []
-            list_8 = []
-            list_9 = []
-            only_internal = True
-            for ext_ref in fields:
-                ext_name, loc_name, is_foreign = self.name_from_ref(
-                    channel_id, xmodel, ext_ref)
-                if loc_name != ext_name:
-                    only_internal = False
-                if loc_name in (loc_ext_id, 'id'):
-                    list_1.append(ext_ref)
-                elif loc_name in ('country_id', 'company_id'):
-                    list_2.append(ext_ref)
-                elif loc_name in ('partner_id', 'street'):
-                    list_3.insert(0, ext_ref)
-                elif loc_name in ('is_company',
-                                  'product_uom',
-                                  'partner_invoice_id',
-                                  'partner_shipping_id',
-                                  'electronic_invoice_subjected'):
-                    list_8.append(ext_ref)
-                elif loc_name == child_ids:
-                    list_9.append(ext_ref)
-                else:
-                    list_6.append(ext_ref)
-            return (list_1 + list_2 + list_3 + list_6 + list_8 + list_9,
-                    only_internal)
-
         def check_4_double_field_id(vals):
             for nm, nm_id in (('vg7:country', 'vg7:country_id'),
                               ('vg7:region', 'vg7:region_id'),
@@ -1284,11 +1434,13 @@ class IrModelSynchro(models.Model):
                     vals[nm_id] = vals[nm]
                     self.logmsg('warning',
                         '### Field <%(nm)s> renamed to <%(new)s>',
-                        ctx={'nm': nm, 'new': nm_id})
+                        ctx={'nm': nm, 'new': nm_id},
+                        channel_id=channel_id)
                 elif (vals.get(nm_id) and vals.get(nm)):
                     self.logmsg('warning',
                         '### Field <%(nm)s> overtaken by <%(new)s>',
-                        ctx={'nm': nm, 'new': nm_id})
+                        ctx={'nm': nm, 'new': nm_id},
+                        channel_id=channel_id)
                     del vals[nm]
             return vals
 
@@ -1296,7 +1448,8 @@ class IrModelSynchro(models.Model):
             self.logmsg('warning',
                 '### Found %(model)s[%(id)s] in queue!',
                 model=xmodel,
-                ctx={'id': vals[ext_ref]})
+                ctx={'id': vals[ext_ref]},
+                channel_id=channel_id)
             return True
 
         def store_in_queue(channel_id, cache, loc_name, xmodel, vals):
@@ -1305,7 +1458,8 @@ class IrModelSynchro(models.Model):
             self.logmsg('debug',
                 'Push %(model)s[%(id)s] in queue!',
                 model=xmodel,
-                ctx={'id': vals[loc_name]})
+                ctx={'id': vals[loc_name]},
+                channel_id=channel_id)
 
         cache = self.env['ir.model.synchro.cache']
         actual_model = self.get_actual_model(xmodel, only_name=True)
@@ -1322,36 +1476,40 @@ class IrModelSynchro(models.Model):
             'xid=%(d)s/%(x)s->%(h)s',
             model=xmodel, ctx={
                 'a': actual_model, 'c': model_child, 'h': child_ids,
-                'd': def_loc_ext_id_name, 'x': loc_ext_id_name})
+                'd': def_loc_ext_id_name, 'x': loc_ext_id_name},
+                channel_id=channel_id)
         parent_child_mode = 'A' if child_ids and model_child else ''
         vals = check_4_double_field_id(vals)
-        field_list, only_internal = priority_fields(
-            channel_id, vals, def_loc_ext_id_name, xmodel)
+        plan = self.get_mapping_plan(channel_id, xmodel, vals.keys())
+        only_internal = plan['only_internal']
         ctx = cache.get_attr(channel_id, 'CTX')
         ctx['ext_key_id'] = ext_id_name
         ref_in_queue = False
-        for ext_ref in field_list:
+        for step in plan['steps']:
+            ext_ref = step['ext_ref']
             self.logmsg('debug',
                 '>>>   for "%(model)s.%(name)s"/"%(v)s" in field_list:',
-                model=xmodel, ctx={'name': ext_ref, 'v': vals.get(ext_ref)})
-            if not cache.is_struct(ext_ref):
+                model=xmodel, ctx={'name': ext_ref, 'v': vals.get(ext_ref)},
+                channel_id=channel_id)
+            if not step['is_struct']:
                 continue
-            ext_name, loc_name, is_foreign = self.name_from_ref(
-                channel_id, xmodel, ext_ref)
-            default, apply4, spec = self.get_default_n_apply(
-                channel_id, xmodel, loc_name, ext_name, is_foreign,
-                ttype=cache.get_struct_model_field_attr(
-                    actual_model, ext_name, 'ttype'))
+            ext_name = step['ext_name']
+            loc_name = step['loc_name']
+            is_foreign = step['is_foreign']
+            default = step['default']
+            apply4 = step['apply4']
+            spec = step['spec']
+            ttype = step['ttype']
             self.logmsg('any',
                 '###       /%(x)s -> loc:%(l)s==%(i)s is_f:%(f)s '
                 'def:%(d)s apply:%(a)s/',
                 model=xmodel,
                 ctx={'x': ext_ref, 'l': loc_name, 'f': is_foreign,
-                     'd': default, 'a': apply4, 'i': loc_ext_id_name})
+                     'd': default, 'a': apply4, 'i': loc_ext_id_name},
+                channel_id=channel_id)
 
-            if not loc_name or not cache.get_struct_model_attr(
-                    actual_model, loc_name):
-                if is_foreign and apply4:
+            if not loc_name or not step['loc_exists']:
+                if is_foreign and step['has_apply']:
                     vals = do_apply(
                         channel_id, vals, loc_name, ext_ref, loc_ext_id_name,
                         apply4, default, xmodel, ctx=ctx)
@@ -1359,7 +1517,8 @@ class IrModelSynchro(models.Model):
                     self.logmsg('warning',
                         '### Field <%(x)s> does not exist in model %(model)s',
                         model=xmodel,
-                        ctx={'x': ext_ref})
+                        ctx={'x': ext_ref},
+                        channel_id=channel_id)
                 if loc_name == def_loc_ext_id_name:
                     if xmodel == actual_model:
                         if cache.id_is_in_cache(
@@ -1375,7 +1534,7 @@ class IrModelSynchro(models.Model):
                     is_foreign)
                 continue
             elif ext_ref not in vals:
-                if is_foreign and apply4:
+                if is_foreign and step['has_apply']:
                     vals = do_apply_n_clean(
                         channel_id, vals,
                         loc_name, ext_name, ext_ref, loc_ext_id_name,
@@ -1386,36 +1545,32 @@ class IrModelSynchro(models.Model):
             elif (isinstance(vals[ext_ref], basestring) and
                   not vals[ext_ref].strip()):
                 vals[ext_ref] = vals[ext_ref].strip()
-                if is_foreign and apply4:
+                if is_foreign and step['has_apply']:
                     vals = do_apply_n_clean(
                         channel_id, vals,
                         loc_name, ext_name, ext_ref, loc_ext_id_name,
                         apply4, default, is_foreign, xmodel, ctx=ctx)
                 continue
             elif not vals[ext_ref]:
-                if is_foreign and apply4:
+                if is_foreign and step['has_apply']:
                     vals = do_apply_n_clean(
                         channel_id, vals,
                         loc_name, ext_name, ext_ref, loc_ext_id_name,
                         apply4, default, is_foreign, xmodel, ctx=ctx)
                 continue
-            if (cache.get_struct_model_field_attr(
-                    actual_model, loc_name, 'ttype') in ('many2one',
-                                                         'one2many',
-                                                         'many2many',
-                                                         'integer') and
+            if (ttype in ('many2one', 'one2many', 'many2many', 'integer') and
                     isinstance(vals[ext_ref], basestring) and (
                             vals[ext_ref].isdigit() or vals[ext_ref] == '-1')):
                 vals[ext_ref] = int(vals[ext_ref])
-            elif (cache.get_struct_model_field_attr(
-                    actual_model, loc_name, 'ttype') == 'boolean' and
+            elif (ttype == 'boolean' and
                   isinstance(vals[ext_ref], basestring)):
                 vals[ext_ref] = os0.str2bool(vals[ext_ref], True)
             if loc_name == child_ids:
                 self.logmsg('any',
                     '$$$>>> if loc_name == child_ids:  # %(c)s',
                     model=xmodel,
-                    ctx={'c': child_ids})
+                    ctx={'c': child_ids},
+                    channel_id=channel_id)
                 if isinstance(vals[ext_ref], (list, tuple)):
                     if only_internal:
                         parent_child_mode = 'C'
@@ -1434,7 +1589,8 @@ class IrModelSynchro(models.Model):
                     self.logmsg('any',
                         '$$$>>> if loc_name == def_loc_ext_id_name:  # %(x)s',
                         model=xmodel,
-                        ctx={'x': def_loc_ext_id_name})
+                        ctx={'x': def_loc_ext_id_name},
+                        channel_id=channel_id)
                     vals[ext_ref] = self.get_loc_ext_id_value(
                         channel_id, xmodel, vals[ext_ref])
                     if xmodel == actual_model:
@@ -1458,7 +1614,8 @@ class IrModelSynchro(models.Model):
             elif ext_ref == 'id':
                 self.logmsg('any',
                     '$$$>>> elif ext_ref == "id":',
-                    model=xmodel)
+                    model=xmodel,
+                    channel_id=channel_id)
                 if xmodel == actual_model:
                     if cache.id_is_in_cache(
                             channel_id, xmodel, actual_model,
@@ -1470,12 +1627,11 @@ class IrModelSynchro(models.Model):
                         store_in_queue(
                             channel_id, cache, ext_ref, xmodel, vals)
                 continue
-            if cache.get_struct_model_field_attr(
-                    actual_model, loc_name, 'ttype') in (
-                    'many2one', 'one2many', 'many2many'):
+            if ttype in ('many2one', 'one2many', 'many2many'):
                 self.logmsg('any',
                     '$$$>>> if ~.ttype in (many2one, one2many, many2many):',
-                    model=xmodel)
+                    model=xmodel,
+                    channel_id=channel_id)
                 if (isinstance(no_deep_fields, (list, tuple)) and
                         len(no_deep_fields) and
                         '*' in no_deep_fields):
@@ -1495,15 +1651,15 @@ class IrModelSynchro(models.Model):
                     del vals[ext_ref]
                     self.logmsg('any',
                         '$$$>>>     del vals[ext_ref]',
-                        model=xmodel)
+                        model=xmodel,
+                        channel_id=channel_id)
                 else:
                     vals = do_apply(channel_id, vals, ext_ref, ext_ref,
                         loc_ext_id_name, apply4, default, xmodel, ctx=ctx)
                     loc_id = self.get_foreign_value(
                         channel_id, xmodel, vals[ext_ref], loc_name, is_foreign,
                         ctx=ctx,
-                        ttype=cache.get_struct_model_field_attr(
-                            actual_model, loc_name, 'ttype'),
+                        ttype=ttype,
                         spec=spec, fmt='cmd')
                     if loc_id:
                         if isinstance(loc_id, (tuple, list)):
@@ -1517,7 +1673,8 @@ class IrModelSynchro(models.Model):
                     self.logmsg('any',
                         '$$$>>>     vals[loc_name]=%(x)s',
                         model=xmodel,
-                        ctx={'x': vals.get(loc_name)})
+                        ctx={'x': vals.get(loc_name)},
+                        channel_id=channel_id)
                     vals = rm_ext_value(vals, loc_name, ext_name, ext_ref,
                         is_foreign)
             else:
@@ -1527,8 +1684,7 @@ class IrModelSynchro(models.Model):
                     apply4, default, is_foreign, xmodel, ctx=ctx)
             if (loc_name in vals and
                     vals[loc_name] is False and
-                    cache.get_struct_model_field_attr(
-                        actual_model, loc_name, 'ttype') != 'boolean'):
+                    ttype != 'boolean'):
                 del vals[loc_name]
             if loc_name in ctx and vals.get(loc_name):
                 ctx[loc_name] = vals[loc_name]
@@ -1651,32 +1807,28 @@ class IrModelSynchro(models.Model):
             parent_id_name = cache.get_struct_model_attr(
                 actual_model, 'PARENT_ID')
             found_valid_key = True if parent_id_name else False
+            unbound = bool(
+                loc_ext_id_name and loc_ext_id_name in vals and use_sync)
             for keys in cache.get_struct_model_attr(actual_model, 'SKEYS'):
-                domain = []
-                if isinstance(keys, basestring):
-                    keys = [keys]
-                for key in keys:
-                    if not vals.get(key):
-                        if (key == 'dim_name' and vals.get('name')):
-                            domain.append(('dim_name',
-                                           '=',
-                                           self.dim_text(vals['name'])))
-                        elif key in ctx:
-                            domain.append((key, '=', ctx[key]))
-                        else:
-                            domain = []
-                            break
-                    else:
-                        domain.append((key, '=', os0.b(vals[key])))
+                domain = self.get_skeys_domain(keys, vals, ctx)
                 if domain:
                     found_valid_key = True
+                    match_key = cache.skeys_match_key(spec, unbound, domain)
                     domain = add_constraints(domain, constraints)
-                    if loc_ext_id_name and loc_ext_id_name in vals and use_sync:
+                    if unbound:
                         domain.append('|')
                         domain.append((loc_ext_id_name, '=', False))
                         domain.append((loc_ext_id_name, '=', 0))
-                    rec, maybe_dif = self.do_search(
-                        actual_model, domain, spec=spec)
+                    match = False
+                    if len(domain) == len(match_key[2]) + (3 if unbound else 0):
+                        match = cache.get_skeys_match(actual_model, match_key)
+                    if match:
+                        # Candidate precomputed by bulk_match_skeys()
+                        rec = self.env[actual_model].browse(match[0])
+                        maybe_dif = match[1]
+                    else:
+                        rec, maybe_dif = self.do_search(
+                            actual_model, domain, spec=spec)
                     if rec:
                         break
                     if maybe_dif and not candidate:
@@ -1698,6 +1850,122 @@ class IrModelSynchro(models.Model):
             return -9, None
         return -7, None
 
+    def get_skeys_domain(self, keys, vals, ctx):
+        """Return domain to search record by keys, empty if any key value
+        is missed"""
+        domain = []
+        if isinstance(keys, basestring):
+            keys = [keys]
+        for key in keys:
+            if not vals.get(key):
+                if (key == 'dim_name' and vals.get('name')):
+                    domain.append(('dim_name',
+                                   '=',
+                                   self.dim_text(vals['name'])))
+                elif key in ctx:
+                    domain.append((key, '=', ctx[key]))
+                else:
+                    return []
+            else:
+                domain.append((key, '=', os0.b(vals[key])))
+        return domain
+
+    def bulk_match_skeys(self, channel_id, xmodel, vals_list, ctx=None):
+        """Search candidates of a page of unbound records with one query per
+        key set of SKEYS, emulating do_search() rules; results are stored in
+        cache and consumed by bind_record().
+        vals_list contains local values (just key values are required)
+        """
+        cache = self.env['ir.model.synchro.cache']
+        actual_model = self.get_actual_model(xmodel, only_name=True)
+        cls = self.env[actual_model]
+        spec = self.get_spec_from_xmodel(xmodel)
+        spec = spec if spec != 'supplier' else ''
+        ctx = dict(ctx or {})
+        if actual_model == 'res.partner' and spec in ('delivery', 'invoice'):
+            ctx['type'] = spec
+        loc_ext_id_name = self.get_loc_ext_id_name(channel_id, xmodel)
+        unbound = bool(loc_ext_id_name and cache.get_struct_model_attr(
+            actual_model, loc_ext_id_name))
+        has_active = cache.get_struct_model_attr(actual_model, 'active')
+        has_sequence = cache.get_struct_model_attr(actual_model, 'sequence')
+        extra = []
+        if actual_model == 'res.partner' and spec in ('delivery', 'invoice'):
+            extra = [('type', spec)]
+        elif actual_model == 'account.tax':
+            extra = [('type_tax_use', 'sale')]
+        matches = {}
+        for keys in cache.get_struct_model_attr(actual_model, 'SKEYS') or []:
+            if isinstance(keys, basestring):
+                keys = [keys]
+            sql_keys = [x for x in keys if x != 'company_id']
+            if not sql_keys or [x for x in keys if (
+                    x not in cls._fields or
+                    not cls._fields[x].store or
+                    cls._fields[x].translate or
+                    cls._fields[x].type in ('one2many', 'many2many'))]:
+                continue
+            domains = {}
+            for vals in vals_list:
+                domain = self.get_skeys_domain(keys, vals, ctx)
+                if domain:
+                    domains[cache.skeys_match_key(
+                        spec, unbound, domain)] = domain
+            if not domains:
+                continue
+            values = set()
+            for domain in domains.values():
+                values.add(tuple([x[2] for x in domain if x[0] in sql_keys]))
+            query = 'SELECT id FROM %s WHERE (%s) IN %%s' % (
+                cls._table, ','.join(sql_keys))
+            if unbound:
+                query += ' AND (%s IS NULL OR %s=0)' % (
+                    loc_ext_id_name, loc_ext_id_name)
+            self._cr.execute(query, (tuple(values), ))  # pylint: disable=E8103
+            ids = [x[0] for x in self._cr.fetchall()]
+            # Record rules, order and active/extra fields are applied by ORM
+            recs = cls.with_context(active_test=False).search(
+                [('id', 'in', ids)],
+                order='sequence,id' if has_sequence else None) if ids else []
+            rows = []
+            for rec in recs:
+                row = {'id': rec.id,
+                       'active': rec.active if has_active else True}
+                for key in set(keys) | set([x[0] for x in extra]):
+                    row[key] = cache.skeys_value(rec[key])
+                rows.append(row)
+            for match_key, domain in domains.items():
+                matches[match_key] = self.emulate_do_search(
+                    actual_model, domain, rows, extra, has_active)
+        cache.set_skeys_match(actual_model, matches)
+        return matches
+
+    def emulate_do_search(self, actual_model, domain, rows, extra, has_active):
+        """Apply do_search() rules to rows read by bulk_match_skeys();
+        return (ids, maybe_dif) where the first id is the one do_search()
+        would return"""
+
+        def select(conds, active=None):
+            return [row for row in rows if (
+                (active is None or row['active'] == active) and
+                not [x for x in conds if row[x[0]] != x[1]])]
+
+        cache = self.env['ir.model.synchro.cache']
+        conds = [(x[0], cache.skeys_value(x[2])) for x in domain]
+        found = select(conds + extra, active=True if has_active else None)
+        if not found and has_active:
+            found = select(conds + extra, active=False)
+        if not found and extra:
+            found = select(conds, active=True if has_active else None)
+        if not found and actual_model in ('res.partner',
+                                          'product.product',
+                                          'product.template'):
+            no_company = [x for x in conds if x[0] != 'company_id']
+            if no_company and len(no_company) != len(conds):
+                found = select(no_company,
+                               active=True if has_active else None)
+        return [x['id'] for x in found], len(found) > 1
+
     def get_xmlrpc_response(
             self, channel_id, xmodel, ext_id=False, select=None, mode=None):
 
@@ -1785,52 +2053,55 @@ class IrModelSynchro(models.Model):
                     ctx={'db': db, 'login': login, 'pwd': passwd})
             return cnx, session, tnldict
 
-        def expand_many(rec, ext_field, vals):
+        def get_read_fields(cache, actual_model, tnldict):
+            # Fields are translated once per channel and model
+            read_fields = cache.get_model_attr(
+                channel_id, actual_model, 'XMLRPC_FIELDS')
+            if read_fields is not None:
+                return read_fields
             try:
-                vals[ext_field] = [x.id for x in rec[ext_field]]
+                ext_fields = cnx.execute(actual_model, 'fields_get')
             except BaseException:
-                if ext_field in vals:
-                    del vals[ext_field]
-            return vals
+                # Not cached: a transient error must not hide the fields
+                ext_fields = None
+            prefix = cache.get_attr(channel_id, 'PREFIX')
+            ext_odoo_ver = self.get_ext_odoo_ver(prefix)
+            read_fields = []
+            for field in cache.get_struct_attr(actual_model):
+                if ext_odoo_ver:
+                    ext_field = transodoo.translate_from_to(
+                        tnldict, actual_model, field,
+                        release.major_version, ext_odoo_ver)
+                else:
+                    ext_field = field
+                if field == 'id' or (
+                        ext_fields and ext_field in ext_fields and (
+                            field == 'state' or (
+                                cache.is_struct(field) and
+                                not cache.get_struct_model_field_attr(
+                                    actual_model, field, 'readonly')))):
+                    read_fields.append((
+                        ext_field,
+                        cache.get_struct_model_field_attr(
+                            actual_model, field, 'ttype')))
+            if ext_fields is not None:
+                cache.set_model_attr(
+                    channel_id, actual_model, 'XMLRPC_FIELDS', read_fields)
+            return read_fields
 
         def browse_rec(cache, actual_model, ext_id, tnldict):
+            read_fields = get_read_fields(cache, actual_model, tnldict)
             try:
-                rec = cnx.browse(actual_model, ext_id)
-            except:
-                rec = False
-            prefix = cache.get_attr(channel_id, 'PREFIX')
-            ext_odoo_ver = self.get_ext_odoo_ver(prefix)
+                recs = cnx.execute(actual_model, 'read', [ext_id],
+                                   [x[0] for x in read_fields])
+            except BaseException:
+                recs = []
             vals = {}
-            if rec:
-                for field in cache.get_struct_attr(actual_model):
-                    if ext_odoo_ver:
-                        ext_field = transodoo.translate_from_to(
-                            tnldict, actual_model, field,
-                            release.major_version, ext_odoo_ver)
-                    else:
-                        ext_field = field
-                    if (field in ('id', 'state') or (
-                            hasattr(rec, ext_field) and
-                            cache.is_struct(field) and
-                            not cache.get_struct_model_field_attr(
-                                actual_model, field, 'readonly'))):
-                        if isinstance(rec[ext_field], (bool, int, long)):
-                            vals[ext_field] = rec[ext_field]
-                        elif cache.get_struct_model_field_attr(
-                                actual_model, field, 'ttype') == 'many2one':
-                            try:
-                                vals[ext_field] = rec[ext_field].id
-                            except BaseException:
-                                vals[ext_field] = rec[ext_field]
-                        elif cache.get_struct_model_field_attr(
-                                actual_model, field, 'ttype') in (
-                                'one2many', 'many2many'):
-                            vals = expand_many(rec, ext_field, vals)
-                        elif isinstance(rec[ext_field], basestring):
-                            vals[ext_field] = rec[ext_field].encode(
-                                'utf-8').decode('utf-8')
-                        else:
-                            vals[ext_field] = rec[ext_field]
+            if recs:
+                for ext_field, ttype in read_fields:
+                    if ext_field in recs[0]:
+                        vals[ext_field] = odoo_read_value(
+                            recs[0][ext_field], ttype)
                 if vals:
                     vals['id'] = ext_id
             return vals
@@ -1936,67 +2207,12 @@ class IrModelSynchro(models.Model):
         self.logmsg('info',
             '>>> %(model)s.csv_requests(%(csv)s)',
             model=xmodel, ctx={'csv': file_csv})
-        res = []
         if not os.path.isfile(file_csv):
-            return res
-        with open(file_csv, 'rb') as fd:
-            hdr = False
-            reader = csv.DictReader(fd,
-                fieldnames=[],
-                restkey='undef_name')
-            for line in reader:
-                row = line['undef_name']
-                if not hdr:
-                    row_id = 0
-                    hdr = row
-                    continue
-                row_id += 1
-                row_res = {ext_id_name: row_id}
-                row_billing = {}
-                row_shipping = {}
-                row_contact = {}
-                for ix, value in enumerate(row):
-                    if (isinstance(value, basestring) and
-                            value.isdigit() and
-                            not value.startswith('0')):
-                        value = int(value)
-                    elif (isinstance(value, basestring) and
-                          value.startswith('[') and
-                          value.endswith(']')):
-                        value = eval(value)
-                    if hdr[ix] == ext_id_name:
-                        if not value:
-                            continue
-                        row_id = value
-                    if hdr[ix].startswith('billing_'):
-                        row_billing[hdr[ix]] = value
-                    elif hdr[ix].startswith('shipping_'):
-                        row_shipping[hdr[ix]] = value
-                    elif hdr[ix].startswith('contact_'):
-                        row_contact[hdr[ix]] = value
-                    else:
-                        row_res[hdr[ix]] = value
-                if row_billing:
-                    if xmodel == 'res.partner.invoice':
-                        row_res = row_billing
-                    else:
-                        row_res['billing'] = row_billing
-                if row_shipping:
-                    if xmodel == 'res.partner.shipping':
-                        for nm in ('customer_shipping_id', 'customer_id'):
-                            row_shipping[nm] = row_res[nm]
-                        row_res = row_shipping
-                    else:
-                        row_res['shipping'] = row_shipping
-                if row_contact:
-                    row_res['contact'] = row_contact
-                if ext_id and row_res[ext_id_name] != ext_id:
-                    continue
-                if ext_id:
-                    res = row_res
-                    break
-                res.append(row_res)
-        return res
+            return []
+        if ext_id:
+            res = cache.get_csv_row(file_csv, ext_id_name, xmodel, ext_id)
+            return [] if res is None else res
+        return list(cache.iter_csv_rows(file_csv, ext_id_name, xmodel))
 
     def get_counterpart_response(
             self, channel_id, xmodel, ext_id=False, mode=None):
@@ -2027,6 +2243,8 @@ class IrModelSynchro(models.Model):
             'ext_id': ext_id,
             'res_id': loc_id,
         })
+        self.env['ir.model.synchro.cache'].set_ext_id_index(
+            actual_model, ext_id_name, ext_id, loc_id)
 
     def assign_channel(self, vals, model=None, ext_model=None):
         cache = self.env['ir.model.synchro.cache']
@@ -2121,19 +2339,21 @@ class IrModelSynchro(models.Model):
                 vals = item
                 vals[':%s' % parent_id_name] = parent_id
             try:
-                id = self.generic_synchro(cls,
-                    vals,
-                    channel_id=channel_id,
-                    jacket=True,
-                    only_minimal=only_minimal)
-                if id < 0:
-                    self.logmsg('info', 'Error pulling from %(model)s.%(id)s',
-                        model=model_child, ctx={'id': item})
-                    return id
-                # commit every table to avoid too big transaction
-                self.env.cr.commit()  # pylint: disable=invalid-commit
+                with self.sync_savepoint():
+                    id = self.generic_synchro(cls,
+                        vals,
+                        channel_id=channel_id,
+                        jacket=True,
+                        only_minimal=only_minimal)
+                    if id < 0:
+                        self.logmsg('info',
+                            'Error pulling from %(model)s.%(id)s',
+                            model=model_child, ctx={'id': item})
+                        return id
+                    # commit every table to avoid too big transaction
+                    self.sync_commit()
             except BaseException as e:
-                self.env.cr.rollback()  # pylint: disable=invalid-commit
+                self.sync_rollback()
                 self.logmsg('warning',
                     'Error %(e) pulling from %(model)s.%(id)s',
                     model=model_child, ctx={'e': e, 'id': item})
@@ -2349,31 +2569,33 @@ class IrModelSynchro(models.Model):
                 if actual_model == 'account.payment.term':
                     vals[child_ids] = {'sequence': 1, 'value': 'balance'}
                 try:
-                    if actual_model.startswith('account.move'):
-                        rec = actual_cls.with_context(
-                            check_move_validity=False).create(min_vals)
-                    else:
-                        rec = actual_cls.create(min_vals)
-                    loc_id = rec.id
-                    # commit to avoid lost data in recursive write
-                    self.env.cr.commit()  # pylint: disable=invalid-commit
+                    with self.sync_savepoint():
+                        if actual_model.startswith('account.move'):
+                            rec = actual_cls.with_context(
+                                check_move_validity=False).create(min_vals)
+                        else:
+                            rec = actual_cls.create(min_vals)
+                        loc_id = rec.id
+                        # commit to avoid lost data in recursive write
+                        self.sync_commit()
                 except BaseException as e:
-                    self.env.cr.rollback()  # pylint: disable=invalid-commit
+                    self.sync_rollback()
                     self.logmsg('warning',
                         '>>> %s.min_create()  # %s' % (
                             actual_model, e))
                 if loc_id < 1 and min_vals != vals:
                     try:
-                        min_vals = vals
-                        if actual_model.startswith('account.move'):
-                            rec = actual_cls.with_context(
-                                check_move_validity=False).create(vals)
-                        else:
-                            rec = actual_cls.create(vals)
-                        # commit to avoid lost data in recursive write
-                        self.env.cr.commit()  # pylint: disable=invalid-commit
+                        with self.sync_savepoint():
+                            min_vals = vals
+                            if actual_model.startswith('account.move'):
+                                rec = actual_cls.with_context(
+                                    check_move_validity=False).create(vals)
+                            else:
+                                rec = actual_cls.create(vals)
+                            # commit to avoid lost data in recursive write
+                            self.sync_commit()
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error', '!-1! %(e)s\nvalues=%(val)s',
                             model=xmodel, ctx={'e': e, 'val': saved_vals})
                         pop_ref(channel_id, xmodel, actual_model, loc_id, ext_id)
@@ -2381,6 +2603,9 @@ class IrModelSynchro(models.Model):
                 if not ext_id_name:
                     self.create_ext_id(
                         channel_id, actual_model, loc_id, ext_id)
+                elif ext_id and loc_id > 0 and ext_id_name == def_ext_id_name:
+                    cache.set_ext_id_index(
+                        actual_model, ext_id_name, ext_id, loc_id)
                 if only_minimal:
                     do_write = False
                 if not do_write and min_vals != vals:
@@ -2394,10 +2619,11 @@ class IrModelSynchro(models.Model):
             if def_ext_id_name in vals and def_ext_id_name != ext_id_name:
                 del vals[def_ext_id_name]
             try:
-                rec = actual_cls.with_context(
-                    {'lang': self.env.user.lang}).browse(loc_id)
+                with self.sync_savepoint():
+                    rec = actual_cls.with_context(
+                        {'lang': self.env.user.lang}).browse(loc_id)
             except BaseException as e:
-                self.env.cr.rollback()  # pylint: disable=invalid-commit
+                self.sync_rollback()
                 self.logmsg('error', '!-3! %(e)s\nvalues=%(val)s',
                     model=xmodel, ctx={'e': e, 'val': saved_vals})
                 rec = None
@@ -2409,17 +2635,19 @@ class IrModelSynchro(models.Model):
                     vals = actual_cls.assure_values(vals, rec)
                 if vals:
                     try:
-                        if actual_model.startswith('account.move'):
-                            rec.with_context(
-                                check_move_validity=False).write(vals)
-                        else:
-                            rec.write(vals)
-                        self.logmsg('info',
-                            '>>> synchro: %s.write(%s)' % (
-                                actual_model, vals))
-                        self.logmsg('trace', '', model=actual_model, rec=rec)
+                        with self.sync_savepoint():
+                            if actual_model.startswith('account.move'):
+                                rec.with_context(
+                                    check_move_validity=False).write(vals)
+                            else:
+                                rec.write(vals)
+                            self.logmsg('info',
+                                '>>> synchro: %s.write(%s)' % (
+                                    actual_model, vals))
+                            self.logmsg('trace', '',
+                                        model=actual_model, rec=rec)
                     except BaseException as e:
-                        self.env.cr.rollback()  # pylint: disable=invalid-commit
+                        self.sync_rollback()
                         self.logmsg('error', '!-2! %(e)s\nvalues=%(val)s',
                             model=xmodel, ctx={'e': e, 'val': saved_vals})
                         pop_ref(
@@ -2447,19 +2675,20 @@ class IrModelSynchro(models.Model):
                             child_vals['sequence'] = seq
                         if child_vals:
                             try:
-                                line.write(child_vals)
-                                self.logmsg('debug',
-                                            '>>> line.write(%(vals))',
-                                            ctx={'vals': child_vals})
+                                with self.sync_savepoint():
+                                    line.write(child_vals)
+                                    self.logmsg('debug',
+                                                '>>> line.write(%(vals))',
+                                                ctx={'vals': child_vals})
                             except BaseException:
-                                self.env.cr.rollback()  # pylint: disable=invalid-commit
+                                self.sync_rollback()
                                 self.logmsg('error',
                                     '!-2! %(e)s\nvalues=%(val)s',
                                     model=xmodel,
                                     ctx={'e': e, 'val': child_vals})
 
         # commit to avoid lost data in recursive write
-        self.env.cr.commit()  # pylint: disable=invalid-commit
+        self.sync_commit()
         done_post = False
         if loc_id > 0 and not disable_post and xmodel == actual_model:
             if actual_model == 'res.lang':
@@ -2520,6 +2749,7 @@ class IrModelSynchro(models.Model):
             cls = self.get_actual_model(model_child)
             for rec in cls.search([(parent_id, '=', loc_id),
                                    ('to_delete', '=', True)]):
+                cache.del_ext_id_index(cls._name, rec.ids)
                 rec.unlink()
         loc_id = self.set_actual_state(xmodel, rec_2_commit)
         if loc_id < 0:
@@ -2774,7 +3004,7 @@ class IrModelSynchro(models.Model):
                             self.generic_synchro(cls, vals,
                                 jacket=True,
                                 channel_id=channel_id)
-                            self.env.cr.commit()  # pylint: disable=invalid-commit
+                            self.sync_commit()
                         ext_id, ext_ix = get_ext_id(ext_ix, datas)
                     elif ((ext_id > 0 and 0 < loc_id < ext_id) or
                           loc_id > 0 and ext_id < 0):
@@ -2785,15 +3015,17 @@ class IrModelSynchro(models.Model):
                         if loc_ext_id_name:
                             rec.write({loc_ext_id_name: False})
                         try:
-                            id = rec.id
-                            rec.unlink()
-                            ctr += 1
-                            self.env.cr.commit()  # pylint: disable=invalid-commit
-                            self.logmsg('warning',
-                                '### Deleted record %s[%d] ext=%d' % (
-                                    xmodel, id, loc_id))
+                            with self.sync_savepoint():
+                                id = rec.id
+                                cache.del_ext_id_index(cls._name, [id])
+                                rec.unlink()
+                                ctr += 1
+                                self.sync_commit()
+                                self.logmsg('warning',
+                                    '### Deleted record %s[%d] ext=%d' % (
+                                        xmodel, id, loc_id))
                         except BaseException as e:
-                            self.env.cr.rollback()  # pylint: disable=invalid-commit
+                            self.sync_rollback()
                             self.logmsg('error', '!-3! %(e)s',
                                 model=xmodel, ctx={'e': e})
 
@@ -2810,10 +3042,30 @@ class IrModelSynchro(models.Model):
     def pull_full_records(self, force=None, only_model=None,
                           only_complete=None, select=None,
                           only_minimal=None, no_deep_fields=None,
-                          remote_ids=None):
+                          remote_ids=None, batch_size=None):
         """Called by import wizard
         @only_complete: import only records which name starting with 'Unknown'
+        @batch_size: if set, records are pulled in chunks of batch_size items;
+                     every record runs in its own savepoint and transaction
+                     is committed once per chunk
         """
+        if not self.env.context.get('synchro_queue'):
+            # Every import has its own recursion queue, so it never
+            # clears the queue of another import running in this worker
+            scope = 'pull_full_records.%s' % uuid.uuid4().hex
+            try:
+                return self.with_context(
+                    synchro_queue=scope).pull_full_records(
+                    force=force, only_model=only_model,
+                    only_complete=only_complete, select=select,
+                    only_minimal=only_minimal, no_deep_fields=no_deep_fields,
+                    remote_ids=remote_ids, batch_size=batch_size)
+            finally:
+                cache = self.env['ir.model.synchro.cache']
+                cache.close_queue(scope=scope)
+                cache.clean_ext_id_index(scope=scope)
+                cache.clean_skeys_match(scope=scope)
+
         def evaluate_remote_ids(rec_ids):
             remote_ids = rec_ids
             if isinstance(rec_ids, basestring):
@@ -2867,6 +3119,7 @@ class IrModelSynchro(models.Model):
         cache = self.env['ir.model.synchro.cache']
         cache.open(model=only_model)
         cache.setup_channels(all=True)
+        cache.open_queue()
         local_ids = []
         for channel_id in cache.get_channel_list().copy():
             if (not cache.get_attr(channel_id, 'COUNTERPART_URL') and
@@ -2932,6 +3185,11 @@ class IrModelSynchro(models.Model):
                 cls = self.env[xmodel]
                 if remote_ids:
                     datas = evaluate_remote_ids(remote_ids)
+                elif cache.get_attr(channel_id, 'METHOD') == 'CSV':
+                    # Rows are streamed from parsed file
+                    datas = self.get_channel_model(
+                        channel_id,
+                        xmodel).iter_csv_response()
                 else:
                     datas = self.get_channel_model(
                         channel_id,
@@ -2939,53 +3197,112 @@ class IrModelSynchro(models.Model):
                 self.logmsg('info',
                     '### Pulling %(model)s(%(d)s)', model=xmodel,
                     ctx={'d': datas})
-                if not datas:
-                    continue
-                if not isinstance(datas, (list, tuple)):
-                    datas = [datas]
-                if len(datas) and isinstance(datas[0], (int, long)):
-                    datas.sort()
+                if isinstance(datas, collections.Iterator):
+                    first_item = next(datas, None)
+                    if first_item is None:
+                        continue
+                    datas = itertools.chain([first_item], datas)
+                else:
+                    if not datas:
+                        continue
+                    if not isinstance(datas, (list, tuple)):
+                        datas = [datas]
+                    if len(datas) and isinstance(datas[0], (int, long)):
+                        datas.sort()
+                    first_item = datas[0]
                 ext_id_name = cache.get_model_attr(
                     channel_id, xmodel, '', default='id')
                 ext_id_name = self.get_loc_ext_id_name(channel_id,
                     xmodel)
-                for item in datas:
-                    if not item:
-                        continue
-                    ext_id, vals = self.vals_or_id(item, ext_id_name)
-                    if ext_id:
-                        if ((select == 'new' and ext_id_name and
-                             cls.search([(ext_id_name, '=', ext_id)])) or
-                                (select == 'upd' and ext_id_name and
-                                 not cls.search([(ext_id_name, '=', ext_id)]))):
+                chunk_size = batch_size or self.BATCH_SIZE
+                model_ctr = model_err = 0
+                start_time = time.time()
+                prefetcher = None
+                if isinstance(first_item, (int, long)):
+                    prefetcher = self.start_prefetch(channel_id, xmodel)
+                try:
+                    datas = iter(datas)
+                    while True:
+                        chunk = list(itertools.islice(datas, chunk_size))
+                        if not chunk:
+                            break
+                        if ext_id_name and select in ('new', 'upd'):
+                            ext_id_map = self.get_ext_id_map(
+                                cls, ext_id_name,
+                                [self.vals_or_id(x, ext_id_name)[0]
+                                 for x in chunk if x])
+                        else:
+                            ext_id_map = {}
+                        if batch_size:
+                            self.prefetch_skeys_match(
+                                channel_id, xmodel, chunk)
+                        if prefetcher:
+                            prefetcher.schedule([
+                                x for x in chunk if x and
+                                not (ext_id_name and select == 'new' and
+                                     x in ext_id_map) and
+                                not (ext_id_name and select == 'upd' and
+                                     x not in ext_id_map) and
+                                not (use_workflow and x <= rec_counter)])
+                        for item in chunk:
+                            if not item:
+                                continue
+                            ext_id, vals = self.vals_or_id(item, ext_id_name)
+                            if ext_id:
+                                if ((select == 'new' and ext_id_name and
+                                     ext_id in ext_id_map) or
+                                        (select == 'upd' and ext_id_name and
+                                         ext_id not in ext_id_map)):
+                                    rec_counter = update_rec_counter(
+                                        cur_channel, ext_id, rec_counter,
+                                        use_workflow, model=xmodel)
+                                    continue
+                                if use_workflow and ext_id <= rec_counter:
+                                    continue
+                                rec_counter = update_rec_counter(
+                                    cur_channel, ext_id, rec_counter,
+                                    use_workflow, model=xmodel)
+                            if batch_size:
+                                loc_id = self.pull_1_batch_record(
+                                    channel_id, xmodel, vals or ext_id,
+                                    only_minimal=only_minimal,
+                                    no_deep_fields=no_deep_fields)
+                            else:
+                                loc_id = self.pull_1_record(
+                                    channel_id, xmodel, vals or ext_id,
+                                    only_minimal=only_minimal,
+                                    no_deep_fields=no_deep_fields)
+                            self.logmsg('debug',
+                                'WORKFLOW>>> self.pull_1_record('
+                                'ch=%s,%s,%s,min=%s,nodeep=%s)' % (
+                                    channel_id, xmodel, vals or ext_id,
+                                    only_minimal, no_deep_fields
+                                ))
                             rec_counter = update_rec_counter(
-                                cur_channel, ext_id, rec_counter, use_workflow,
-                                model=xmodel)
-                            continue
-                        if use_workflow and ext_id <= rec_counter:
-                            continue
-                        rec_counter = update_rec_counter(
-                            cur_channel, ext_id, rec_counter, use_workflow,
-                            model=xmodel)
-                    loc_id = self.pull_1_record(
-                        channel_id, xmodel, vals or ext_id,
-                        only_minimal=only_minimal,
-                        no_deep_fields=no_deep_fields)
-                    self.logmsg('debug',
-                        'WORKFLOW>>> self.pull_1_record('
-                        'ch=%s,%s,%s,min=%s,nodeep=%s)' % (
-                            channel_id, xmodel, vals or ext_id,
-                            only_minimal, no_deep_fields
-                        ))
-                    rec_counter = update_rec_counter(
-                        cur_channel, ext_id, rec_counter, use_workflow)
-                    if loc_id < 0:
-                        continue
-                    ctr += 1
-                    if loc_id not in local_ids:
-                        local_ids.append(loc_id)
+                                cur_channel, ext_id, rec_counter, use_workflow)
+                            if not loc_id or loc_id < 0:
+                                model_err += 1
+                                continue
+                            ctr += 1
+                            model_ctr += 1
+                            if loc_id not in local_ids:
+                                local_ids.append(loc_id)
+                        if batch_size:
+                            cache.clean_skeys_match(
+                                model=self.get_actual_model(xmodel,
+                                                            only_name=True))
+                            # commit every chunk to avoid too big transaction
+                            # pylint: disable=invalid-commit
+                            self.env.cr.commit()
+                            self.log_throughput(
+                                xmodel, model_ctr, model_err, start_time)
+                finally:
+                    if prefetcher:
+                        self.stop_prefetch(channel_id, prefetcher)
+                self.log_throughput(xmodel, model_ctr, model_err, start_time)
             _logger.info('%s record successfully pulled from channel %s' % (
                 ctr, channel_id))
+        _logger.info('Queue stats: %s' % cache.queue_stats())
         if use_workflow:
             wkf = {'rec_counter': rec_counter, 'workflow_model': ''}
             if not local_ids or WORKFLOW[workflow].get('remote_ids'):
@@ -2997,6 +3314,131 @@ class IrModelSynchro(models.Model):
                      'c': wkf['rec_counter']})
         return local_ids
 
+    @api.model
+    def get_ext_id_map(self, cls, ext_id_name, ext_ids):
+        """Return map ext_id -> local id of already pulled records,
+        reading all ids of page by a unique query"""
+        ext_ids = [x for x in ext_ids if x]
+        if not ext_ids:
+            return {}
+        return dict((rec[ext_id_name], rec.id) for rec in cls.search(
+            [(ext_id_name, 'in', ext_ids)]))
+
+    @api.model
+    def start_prefetch(self, channel_id, xmodel):
+        """Start background fetching of counterpart records (and their
+        children) of xmodel or reading them by pages; return None if channel
+        does not support it"""
+        cache = self.env['ir.model.synchro.cache']
+        channel = self.env['synchro.channel'].browse(channel_id)
+        if cache.get_attr(channel_id, 'PREFETCH'):
+            self.stop_prefetch(channel_id,
+                               cache.get_attr(channel_id, 'PREFETCH'))
+        channel_model = self.get_channel_model(channel_id, xmodel)
+        if not channel_model:
+            return None
+        fetch = channel_model.get_counterpart_fetcher()
+        if not fetch:
+            # Records may be read by pages, without threads
+            read_page = channel_model.get_counterpart_page_reader()
+            if not read_page:
+                return None
+            prefetcher = CounterpartPageReader(xmodel, read_page)
+            cache.set_attr(channel_id, 'PREFETCH', prefetcher)
+            return prefetcher
+        if channel.prefetch_workers <= 0:
+            return None
+        actual_model = self.get_actual_model(xmodel, only_name=True)
+        model_child = cache.get_struct_model_attr(actual_model, 'MODEL_CHILD')
+        parent_id_name = fetch_child = None
+        if model_child:
+            cache.open(model=model_child)
+            parent_id_name = cache.get_struct_model_attr(
+                model_child, 'PARENT_ID')
+            if parent_id_name:
+                fetch_child = self.get_channel_model(
+                    channel_id, model_child).get_counterpart_fetcher()
+        prefetcher = CounterpartPrefetcher(
+            xmodel, fetch, channel.prefetch_workers,
+            model_child=model_child, parent_id_name=parent_id_name,
+            fetch_child=fetch_child)
+        cache.set_attr(channel_id, 'PREFETCH', prefetcher)
+        return prefetcher
+
+    @api.model
+    def stop_prefetch(self, channel_id, prefetcher):
+        cache = self.env['ir.model.synchro.cache']
+        if cache.get_attr(channel_id, 'PREFETCH') is prefetcher:
+            cache.set_attr(channel_id, 'PREFETCH', None)
+        _logger.info('%s prefetch stats: %s' % (
+            prefetcher.xmodel, prefetcher.close()))
+
+    @api.model
+    def prefetch_skeys_match(self, channel_id, xmodel, items):
+        """Evaluate search keys of counterpart records of page and search
+        all their local candidates in bulk (see bulk_match_skeys())"""
+        cache = self.env['ir.model.synchro.cache']
+        actual_model = self.get_actual_model(xmodel, only_name=True)
+        skeys = cache.get_struct_model_attr(actual_model, 'SKEYS') or []
+        key_names = set(['name'])
+        for keys in skeys:
+            key_names |= set([keys] if isinstance(keys, basestring) else keys)
+        loc_ext_id_name = self.get_loc_ext_id_name(channel_id, xmodel)
+        if loc_ext_id_name:
+            key_names.add(loc_ext_id_name)
+        prefix = cache.get_attr(channel_id, 'PREFIX')
+        vals_list = []
+        for item in items:
+            if not item or isinstance(item, (int, long)):
+                continue
+            if isinstance(item, (list, tuple)):
+                item = item[0]
+            vals = {}
+            for ext_ref, value in self.jacket_vals(prefix, item).items():
+                ext_name, loc_name, is_foreign = self.name_from_ref(
+                    channel_id, xmodel, ext_ref)
+                if (loc_name in key_names and
+                        not isinstance(value, (list, tuple, dict))):
+                    vals[loc_name] = value
+            if vals:
+                vals_list.append(vals)
+        if vals_list:
+            self.bulk_match_skeys(channel_id, xmodel, vals_list)
+
+    @api.model
+    def pull_1_batch_record(self, channel_id, xmodel, item,
+                            only_minimal=None, no_deep_fields=None):
+        """Pull 1 record in batch mode: record is written inside a savepoint,
+        intermediate commits are suppressed; on error only current record is
+        rolled back while other records of chunk are preserved"""
+        cache = self.env['ir.model.synchro.cache']
+        mark = cache.mark_ext_id_index()
+        self.env.cr.execute('SAVEPOINT synchro_rec')
+        try:
+            loc_id = self.with_context(synchro_batch=True).pull_1_record(
+                channel_id, xmodel, item,
+                only_minimal=only_minimal, no_deep_fields=no_deep_fields)
+        except BaseException as e:
+            loc_id = -12
+            self.logmsg('warning',
+                'Error %(e)s pulling from %(model)s.%(id)s',
+                model=xmodel, ctx={'e': e, 'id': item})
+        if not loc_id or loc_id < 0:
+            self.env.cr.execute('ROLLBACK TO SAVEPOINT synchro_rec')
+            self.env.invalidate_all()
+            cache.clear_queue()
+            cache.undo_ext_id_index(mark)
+        else:
+            cache.release_ext_id_index(mark)
+        self.env.cr.execute('RELEASE SAVEPOINT synchro_rec')
+        return loc_id
+
+    def log_throughput(self, xmodel, ctr, errors, start_time):
+        elapsed = (time.time() - start_time) or 0.001
+        _logger.info(
+            '%s: %d record pulled, %d errors in %.1f secs (%.1f rec/sec)' % (
+                xmodel, ctr, errors, elapsed, (ctr + errors) / elapsed))
+
     @api.model
     def pull_1_record(self, channel_id, xmodel, item, disable_post=None,
                       only_minimal=None, no_deep_fields=None):
@@ -3029,7 +3471,7 @@ class IrModelSynchro(models.Model):
                 (ext_id, xmodel))
             return id
         # commit every table to avoid too big transaction
-        self.env.cr.commit()  # pylint: disable=invalid-commit
+        self.sync_commit()
         return id
 
     @api.multi
@@ -3209,12 +3651,21 @@ class IrModelSynchroLog(models.Model):
         now = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
         errmsg = errmsg or _('No Error')
         res_id = rec and rec.id or False
-        self.create({
+        vals = {
             'timestamp': now,
             'model': xmodel or '',
             'res_id': res_id,
             'errmsg': errmsg,
-        })
+        }
+        if self.env.context.get('synchro_batch'):
+            # Batch pull owns the transaction: record savepoint may be
+            # rolled back, so log is written by a private cursor
+            with self.pool.cursor() as cr:
+                self.with_env(self.env(cr=cr)).create(vals)
+            if rec and hasattr(rec, 'timestamp') and hasattr(rec, 'errmsg'):
+                rec.write({'timestamp': now, 'errmsg': errmsg})
+            return
+        self.create(vals)
         if rec and hasattr(rec, 'timestamp') and hasattr(rec, 'errmsg'):
             rec.write({'timestamp': now, 'errmsg': errmsg})
         self.env.cr.commit()  # pylint: disable=invalid-commit
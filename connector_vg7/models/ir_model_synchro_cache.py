@@ -10,6 +10,11 @@
 import logging
 from datetime import datetime, timedelta
 import itertools
+import os
+import csv
+import ast
+import copy
+from collections import OrderedDict, deque
 
 from odoo import api, models
 from odoo import release
@@ -127,6 +132,26 @@ class IrModelSynchroCache(models.Model):
         'workflow',
     ]
     SYSTEM_UNMANAGED = []
+    # External id index: (dbname, scope, model, ext_id_name) ->
+    #                    {'ext': {}, 'loc': {}}
+    EXT_ID_INDEX = {}
+    # Ids indexed while a batch record is pulled: (dbname, scope) ->
+    #                                             [(index key, res_id), ...]
+    EXT_ID_JOURNAL = {}
+    # Bulk search key matches: (dbname, scope, model) ->
+    #                          {'match': {}, 'ids': {}, 'no_company': {}}
+    SKEYS_MATCH = {}
+    # Records in progress: (dbname, scope) -> {'loc': {}, 'ext': {}, ...}
+    QUEUE_SYNC = {}
+    # Parsed CSV files: (file, ext_id_name, xmodel) -> {'rows': [], ...}
+    CSV_DATA = OrderedDict()
+    MAX_CSV_FILES = 8
+    # Mapping plans: (dbname, channel_id, xmodel, field names) -> plan
+    MAPPING_PLAN = OrderedDict()
+    MAX_MAPPING_PLANS = 512
+    # Channel trace: (dbname, channel_id) -> deque of events
+    TRACE = {}
+    TRACE_SIZE = 1000
     TABLE_DEF = {
         'base': {
             # 'company_id': {'required': True},
@@ -232,60 +257,556 @@ class IrModelSynchroCache(models.Model):
     # -----------------------
     # Record cache management
     # -----------------------
+    #
+    # Records in progress are queued to avoid infinite recursion when
+    # a record refers to another record which refers to the 1st one.
+    # Queue is per worker and per import scope (context key 'synchro_queue',
+    # default is 'main'; every pull_full_records() call has its own scope);
+    # local ids are stored by model and external ids by (channel, xmodel),
+    # so every check is O(1).
+    # Queue of an import scope expires after cache lifetime from last push.
+    #
+    @api.model_cr_context
+    def get_queue(self, scope=None):
+        key = (self._cr.dbname,
+               scope or self.env.context.get('synchro_queue') or 'main')
+        if key not in self.QUEUE_SYNC:
+            self.QUEUE_SYNC[key] = {
+                'loc': {},
+                'ext': {},
+                'xpire': False,
+                'stats': {'depth': 0, 'max_depth': 0, 'pushed': 0,
+                          'lookups': 0, 'hits': 0},
+            }
+        return self.QUEUE_SYNC[key]
+
+    @api.model_cr_context
+    def open_queue(self, scope=None):
+        """Start a new import scope, discarding previous queue contents"""
+        self.close_queue(scope=scope)
+        return self.get_queue(scope=scope)
+
     @api.model_cr_context
-    def expired_cache(self, channel_id, xmodel, model):
-        cache_model = '_QUEUE_SYNC'
-        if self.get_struct_model_attr(cache_model, 'XPIRE'):
-            self.set_struct_model(cache_model)
-            self.CACHE.set_struct_cache(self._cr.dbname, cache_model)
-        if self.get_model_attr(channel_id, cache_model, 'XPIRE'):
-            self.set_attr(channel_id, cache_model, {})
-            self.CACHE.set_model_cache(
-                self._cr.dbname, channel_id, cache_model)
+    def close_queue(self, scope=None):
+        """Close import scope and return its stats"""
+        queue = self.QUEUE_SYNC.pop(
+            (self._cr.dbname,
+             scope or self.env.context.get('synchro_queue') or 'main'), None)
+        return queue['stats'] if queue else {}
+
+    @api.model_cr_context
+    def clear_queue(self, scope=None):
+        """Empty queue of import scope, i.e. after an aborted record,
+        keeping stats"""
+        queue = self.get_queue(scope=scope)
+        queue['loc'] = {}
+        queue['ext'] = {}
+        queue['stats']['depth'] = 0
+
+    @api.model_cr_context
+    def queue_stats(self, scope=None):
+        """Return stats of import scope: current depth (records in progress),
+        max depth, total pushed records, lookups and hits (i.e. detected
+        recursions)"""
+        queue = self.get_queue(scope=scope)
+        return dict(queue['stats'],
+                    size=(sum([len(x) for x in queue['loc'].values()]) +
+                          sum([len(x) for x in queue['ext'].values()])))
 
     @api.model_cr_context
     def push_id(self, channel_id, xmodel, model, loc_id=None, ext_id=None):
-        self.expired_cache(channel_id, xmodel, model)
-        cache_model = '_QUEUE_SYNC'
+        queue = self.get_queue()
+        if queue['xpire'] and queue['xpire'] < datetime.now():
+            queue = self.open_queue()
+        queue['xpire'] = datetime.now() + timedelta(seconds=self.lifetime(0))
+        stats = queue['stats']
         if loc_id:
-            rec_list = self.get_struct_model_attr(
-                cache_model, model, default=[])
-            if loc_id not in rec_list:
-                rec_list.append(loc_id)
-                self.set_struct_model_attr(cache_model, model, rec_list)
+            rec_set = queue['loc'].setdefault(model, set())
+            if loc_id not in rec_set:
+                rec_set.add(loc_id)
+                stats['depth'] += 1
+                stats['pushed'] += 1
         if ext_id:
-            rec_list = self.get_model_attr(
-                channel_id, cache_model, xmodel, default=[])
-            if ext_id not in rec_list:
-                rec_list.append(ext_id)
-                self.set_model_attr(channel_id, cache_model, xmodel, rec_list)
+            rec_set = queue['ext'].setdefault((channel_id, xmodel), set())
+            if ext_id not in rec_set:
+                rec_set.add(ext_id)
+                stats['depth'] += 1
+                stats['pushed'] += 1
+        if stats['depth'] > stats['max_depth']:
+            stats['max_depth'] = stats['depth']
 
     @api.model_cr_context
     def pop_id(self, channel_id, xmodel, model, loc_id=None, ext_id=None):
-        self.expired_cache(channel_id, xmodel, model)
-        cache_model = '_QUEUE_SYNC'
-        if loc_id:
-            rec_list = self.get_struct_model_attr(
-                cache_model, model, default=[])
-            if loc_id in rec_list:
-                rec_list.pop(rec_list.index(loc_id))
-                self.set_struct_model_attr(cache_model, model, rec_list)
-        if ext_id:
-            rec_list = self.get_model_attr(
-                channel_id, cache_model, xmodel, default=[])
-            if ext_id in rec_list:
-                rec_list.pop(rec_list.index(ext_id))
-                self.set_model_attr(channel_id, cache_model, xmodel, rec_list)
+        queue = self.get_queue()
+        if loc_id and loc_id in queue['loc'].get(model, ()):
+            queue['loc'][model].discard(loc_id)
+            queue['stats']['depth'] -= 1
+        if ext_id and ext_id in queue['ext'].get((channel_id, xmodel), ()):
+            queue['ext'][(channel_id, xmodel)].discard(ext_id)
+            queue['stats']['depth'] -= 1
 
     @api.model_cr_context
     def id_is_in_cache(
             self, channel_id, xmodel, model, loc_id=None, ext_id=None):
-        self.expired_cache(channel_id, xmodel, model)
-        cache_model = '_QUEUE_SYNC'
-        return ((loc_id and loc_id in self.get_struct_model_attr(
-            cache_model, model, default=[])) or
-            (ext_id and ext_id in self.get_model_attr(
-                channel_id, cache_model, xmodel, default=[])))
+        queue = self.get_queue()
+        queue['stats']['lookups'] += 1
+        found = bool(
+            (loc_id and loc_id in queue['loc'].get(model, ())) or
+            (ext_id and ext_id in queue['ext'].get((channel_id, xmodel), ())))
+        if found:
+            queue['stats']['hits'] += 1
+        return found
+
+    # ------------------------------
+    # External id index management
+    # ------------------------------
+    #
+    # Every model bound to a channel has an external id field, i.e. <vg7_id>,
+    # or its external ids are stored in ir.model.synchro.data.
+    # Index is bidirectional (ext_id <-> res_id), per worker, per import
+    # scope (context key 'synchro_queue', see pull_full_records) and per
+    # (model, ext_id_name); ext_id_name carries the channel prefix so the
+    # index is per channel too. Index is warmed by a unique query when first
+    # required; missing keys are searched by ORM and then stored.
+    # Index lives only while its import scope is open, so it is never shared
+    # with pull_record() or pushes and it never outlives the import that
+    # warmed it; outside an import scope the index is disabled.
+    # Records unlinked by the import are removed by del_ext_id_index().
+    # While a batch record is pulled, indexed ids are journaled, so when a
+    # savepoint is rolled back just the ids indexed inside it are removed
+    # (see mark_ext_id_index and undo_ext_id_index).
+    #
+    def ext_id_index_key(self, model, ext_id_name):
+        scope = self.env.context.get('synchro_queue')
+        if not scope:
+            return False
+        return (self._cr.dbname, scope, model, ext_id_name)
+
+    @api.model_cr_context
+    def warm_ext_id_index(self, model, ext_id_name):
+        index = {'ext': {}, 'loc': {}}
+        if self.get_struct_model_attr(model, ext_id_name):
+            query = 'SELECT %s, id FROM %s WHERE %s IS NOT NULL AND %s<>0' % (
+                ext_id_name, self.env[model]._table, ext_id_name, ext_id_name)
+            if self.get_struct_model_attr(model, 'active'):
+                query += ' AND active'
+            self._cr.execute(query)  # pylint: disable=E8103
+        else:
+            self._cr.execute(
+                'SELECT ext_id, res_id FROM ir_model_synchro_data '
+                'WHERE model=%s AND ext_id_name=%s', (model, ext_id_name))
+        for ext_id, res_id in self._cr.fetchall():
+            index['ext'][ext_id] = res_id
+            index['loc'][res_id] = ext_id
+        key = self.ext_id_index_key(model, ext_id_name)
+        self.EXT_ID_INDEX[key] = index
+        # Index may contain uncommitted records: drop it on undo
+        self.journal_ext_id_index(key, None)
+        return index
+
+    @api.model_cr_context
+    def get_ext_id_index_map(self, model, ext_id_name):
+        """Return index of model or False if no import scope is open"""
+        key = self.ext_id_index_key(model, ext_id_name)
+        if not key:
+            return False
+        return (self.EXT_ID_INDEX.get(key) or
+                self.warm_ext_id_index(model, ext_id_name))
+
+    @api.model_cr_context
+    def get_ext_id_index(self, model, ext_id_name, ext_id):
+        """Return local id of external id or False if not (yet) indexed"""
+        try:
+            ext_id = int(ext_id)
+        except (TypeError, ValueError):
+            return False
+        index = self.get_ext_id_index_map(model, ext_id_name)
+        if not index:
+            return False
+        return index['ext'].get(ext_id, False)
+
+    @api.model_cr_context
+    def get_loc_id_index(self, model, ext_id_name, res_id):
+        """Return external id of local id or False if not (yet) indexed"""
+        index = self.get_ext_id_index_map(model, ext_id_name)
+        if not index:
+            return False
+        return index['loc'].get(res_id, False)
+
+    @api.model_cr_context
+    def set_ext_id_index(self, model, ext_id_name, ext_id, res_id):
+        if not ext_id or not res_id:
+            return
+        try:
+            ext_id = int(ext_id)
+        except (TypeError, ValueError):
+            return
+        index = self.get_ext_id_index_map(model, ext_id_name)
+        if not index:
+            return
+        if index['loc'].get(res_id):
+            index['ext'].pop(index['loc'][res_id], None)
+        index['ext'][ext_id] = res_id
+        index['loc'][res_id] = ext_id
+        self.journal_ext_id_index(
+            self.ext_id_index_key(model, ext_id_name), res_id)
+
+    @api.model_cr_context
+    def del_ext_id_index(self, model, res_ids):
+        """Forget local ids of current import scope, i.e. after unlink"""
+        scope = self.env.context.get('synchro_queue')
+        for key, index in self.EXT_ID_INDEX.items():
+            if (key[0] != self._cr.dbname or key[1] != scope or
+                    key[2] != model):
+                continue
+            for res_id in res_ids:
+                if res_id in index['loc']:
+                    index['ext'].pop(index['loc'].pop(res_id), None)
+
+    def journal_ext_id_index(self, key, res_id):
+        journal = self.EXT_ID_JOURNAL.get(
+            (self._cr.dbname, self.env.context.get('synchro_queue')))
+        if journal is not None:
+            journal.append((key, res_id))
+
+    @api.model_cr_context
+    def mark_ext_id_index(self):
+        """Start journaling ids indexed by current import scope, if not yet
+        started; return the mark to pass to undo/release_ext_id_index"""
+        scope = self.env.context.get('synchro_queue')
+        if not scope:
+            return None
+        return len(self.EXT_ID_JOURNAL.setdefault(
+            (self._cr.dbname, scope), []))
+
+    @api.model_cr_context
+    def undo_ext_id_index(self, mark):
+        """Remove ids indexed after mark, i.e. after a savepoint rollback"""
+        if mark is None:
+            return
+        journal = self.EXT_ID_JOURNAL.get(
+            (self._cr.dbname, self.env.context.get('synchro_queue')))
+        if not journal:
+            return
+        for key, res_id in reversed(journal[mark:]):
+            if res_id is None:
+                self.EXT_ID_INDEX.pop(key, None)
+                continue
+            index = self.EXT_ID_INDEX.get(key)
+            if index and res_id in index['loc']:
+                ext_id = index['loc'].pop(res_id)
+                if index['ext'].get(ext_id) == res_id:
+                    del index['ext'][ext_id]
+        del journal[mark:]
+        self.release_ext_id_index(mark)
+
+    @api.model_cr_context
+    def release_ext_id_index(self, mark):
+        """Stop journaling when the first mark is released"""
+        if mark == 0:
+            self.EXT_ID_JOURNAL.pop(
+                (self._cr.dbname, self.env.context.get('synchro_queue')),
+                None)
+
+    @api.model_cr_context
+    def clean_ext_id_index(self, model=None, scope=None, all_scopes=None):
+        """Drop index of import scope, default is current scope;
+        if all_scopes, index of every import is dropped"""
+        scope = scope or self.env.context.get('synchro_queue')
+        for key in self.EXT_ID_INDEX.keys():
+            if (key[0] == self._cr.dbname and
+                    (all_scopes or key[1] == scope) and
+                    (not model or key[2] == model)):
+                del self.EXT_ID_INDEX[key]
+
+    # ------------------------------
+    # Bulk search key match management
+    # ------------------------------
+    #
+    # Matches are computed by ir.model.synchro.bulk_match_skeys() for a page
+    # of unbound records and consumed by bind_record(); every match is keyed
+    # by the domain of search keys. Matches are per import scope (context
+    # key 'synchro_queue', see pull_full_records), like the external id
+    # index, so they are never used by pull_record(), pushes or other
+    # imports; outside an import scope no match is stored or returned.
+    # When a record is created, written or unlinked, matches which could
+    # return it are discarded in every scope.
+    #
+    @api.model
+    def skeys_value(self, value):
+        if isinstance(value, models.BaseModel):
+            return value.id
+        elif isinstance(value, str):
+            return value.decode('utf-8')
+        return value
+
+    @api.model
+    def skeys_match_key(self, spec, unbound, domain):
+        return (spec or '', unbound,
+                tuple([(x[0], self.skeys_value(x[2])) for x in domain]))
+
+    def skeys_match_store_key(self, model):
+        scope = self.env.context.get('synchro_queue')
+        if not scope:
+            return False
+        return (self._cr.dbname, scope, model)
+
+    @api.model_cr_context
+    def set_skeys_match(self, model, matches):
+        """Store matches {match_key: (ids, maybe_dif)} of model"""
+        key = self.skeys_match_store_key(model)
+        if not key:
+            return
+        store = {'match': {}, 'ids': {}, 'no_company': {}}
+        for match_key, match in matches.items():
+            store['match'].setdefault(match_key[2], {})[match_key[:2]] = match
+            for res_id in match[0]:
+                store['ids'].setdefault(res_id, set()).add(match_key[2])
+            store['no_company'].setdefault(
+                tuple([x for x in match_key[2] if x[0] != 'company_id']),
+                set()).add(match_key[2])
+        self.SKEYS_MATCH[key] = store
+
+    @api.model_cr_context
+    def get_skeys_match(self, model, match_key):
+        """Return precomputed (res_id, maybe_dif) or None if not computed"""
+        store = self.SKEYS_MATCH.get(self.skeys_match_store_key(model))
+        if not store:
+            return None
+        match = store['match'].get(match_key[2], {}).get(match_key[:2])
+        if match is None:
+            return None
+        return (match[0][0] if match[0] else False), match[1]
+
+    @api.model_cr_context
+    def is_skeys_matched(self, model):
+        for key in self.SKEYS_MATCH:
+            if key[0] == self._cr.dbname and key[2] == model:
+                return True
+        return False
+
+    @api.model_cr_context
+    def del_skeys_match(self, recs):
+        """Discard matches which could return records"""
+        for key, store in self.SKEYS_MATCH.items():
+            if key[0] == self._cr.dbname and key[2] == recs._name:
+                self.del_skeys_match_store(store, recs)
+
+    @api.model_cr_context
+    def del_skeys_match_store(self, store, recs):
+        to_delete = set()
+        for res_id in recs.ids:
+            to_delete |= store['ids'].pop(res_id, set())
+        skeys = self.get_struct_model_attr(recs._name, 'SKEYS') or []
+        for rec in recs.exists():
+            for keys in skeys:
+                if isinstance(keys, basestring):
+                    keys = [keys]
+                to_delete |= store['no_company'].pop(tuple(
+                    [(x, self.skeys_value(rec[x])) for x in keys
+                     if x != 'company_id' and x in rec._fields]), set())
+        for domain in to_delete:
+            store['match'].pop(domain, None)
+
+    @api.model_cr_context
+    def clean_skeys_match(self, model=None, scope=None, all_scopes=None):
+        """Discard matches of import scope, default is current scope;
+        if all_scopes, matches of every import are discarded"""
+        scope = scope or self.env.context.get('synchro_queue')
+        for key in self.SKEYS_MATCH.keys():
+            if (key[0] == self._cr.dbname and
+                    (all_scopes or key[1] == scope) and
+                    (not model or key[2] == model)):
+                del self.SKEYS_MATCH[key]
+
+    # -------------
+    # Mapping plans
+    # -------------
+    #
+    # Plans are compiled by ir.model.synchro.get_mapping_plan(); least
+    # recently used plans are evicted when they are more than
+    # MAX_MAPPING_PLANS; plans expire like other cache data, because
+    # configuration may be changed by other workers.
+    #
+    @api.model_cr_context
+    def get_mapping_plan(self, key):
+        key = (self._cr.dbname, ) + key
+        plan = self.MAPPING_PLAN.pop(key, None)
+        if plan and plan['xpire'] >= datetime.now():
+            self.MAPPING_PLAN[key] = plan
+            return plan
+        return None
+
+    @api.model_cr_context
+    def set_mapping_plan(self, key, plan):
+        plan['xpire'] = datetime.now() + timedelta(seconds=self.lifetime(0))
+        self.MAPPING_PLAN[(self._cr.dbname, ) + key] = plan
+        while len(self.MAPPING_PLAN) > self.MAX_MAPPING_PLANS:
+            self.MAPPING_PLAN.popitem(last=False)
+
+    @api.model_cr_context
+    def clean_mapping_plan(self, channel_id=None, model=None):
+        for key in self.MAPPING_PLAN.keys():
+            if (key[0] == self._cr.dbname and
+                    (not channel_id or key[1] == channel_id) and
+                    (not model or key[2] == model)):
+                del self.MAPPING_PLAN[key]
+
+    # ---------------------
+    # CSV exchange file data
+    # ---------------------
+    #
+    # Rows of CSV file are parsed one at a time by iter_csv_file().
+    # To look up rows by ext_id, the parsed file is kept while its mtime,
+    # size and inode are unchanged; last MAX_CSV_FILES files are kept.
+    # Parsed data contains rows in file order and the index ext_id -> row
+    # position (1st occurrence). Rows are shared, so callers get copies.
+    # Iterating the whole file never keeps the parsed file: rows are
+    # streamed, sorted by id (last occurrence) if required, as
+    # get_counterpart_response() returns them.
+    #
+    @api.model
+    def csv_value(self, value):
+        if (isinstance(value, basestring) and
+                value.isdigit() and
+                not value.startswith('0')):
+            value = int(value)
+        elif (isinstance(value, basestring) and
+              value.startswith('[') and
+              value.endswith(']')):
+            try:
+                value = ast.literal_eval(value)
+            except (SyntaxError, ValueError):
+                _logger.error('Invalid list value %s in CSV file' % value)
+        return value
+
+    @api.model
+    def iter_csv_file(self, file_csv, ext_id_name, xmodel):
+        """Yield rows of CSV file, in file order, parsed one at a time"""
+        with open(file_csv, 'rb') as fd:
+            hdr = False
+            reader = csv.DictReader(fd,
+                                    fieldnames=[],
+                                    restkey='undef_name')
+            for line in reader:
+                row = line['undef_name']
+                if not hdr:
+                    row_id = 0
+                    hdr = row
+                    continue
+                row_id += 1
+                row_res = {ext_id_name: row_id}
+                row_billing = {}
+                row_shipping = {}
+                row_contact = {}
+                for ix, value in enumerate(row):
+                    value = self.csv_value(value)
+                    if hdr[ix] == ext_id_name:
+                        if not value:
+                            continue
+                        row_id = value
+                    if hdr[ix].startswith('billing_'):
+                        row_billing[hdr[ix]] = value
+                    elif hdr[ix].startswith('shipping_'):
+                        row_shipping[hdr[ix]] = value
+                    elif hdr[ix].startswith('contact_'):
+                        row_contact[hdr[ix]] = value
+                    else:
+                        row_res[hdr[ix]] = value
+                if row_billing:
+                    if xmodel == 'res.partner.invoice':
+                        row_res = row_billing
+                    else:
+                        row_res['billing'] = row_billing
+                if row_shipping:
+                    if xmodel == 'res.partner.shipping':
+                        for nm in ('customer_shipping_id', 'customer_id'):
+                            row_shipping[nm] = row_res[nm]
+                        row_res = row_shipping
+                    else:
+                        row_res['shipping'] = row_shipping
+                if row_contact:
+                    row_res['contact'] = row_contact
+                yield row_res
+
+    @api.model
+    def parse_csv_file(self, file_csv, ext_id_name, xmodel):
+        rows = list(self.iter_csv_file(file_csv, ext_id_name, xmodel))
+        index = {}
+        for pos, row in enumerate(rows):
+            if row.get(ext_id_name) not in index:
+                index[row.get(ext_id_name)] = pos
+        return {'rows': rows, 'index': index}
+
+    @api.model
+    def get_csv_data(self, file_csv, ext_id_name, xmodel):
+        """Return parsed data of CSV file or None if file does not exist"""
+        try:
+            stat = os.stat(file_csv)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime, stat.st_size, stat.st_ino)
+        key = (file_csv, ext_id_name, xmodel)
+        data = self.CSV_DATA.pop(key, None)
+        if not data or data['stamp'] != stamp:
+            data = self.parse_csv_file(file_csv, ext_id_name, xmodel)
+            data['stamp'] = stamp
+        self.CSV_DATA[key] = data
+        while len(self.CSV_DATA) > self.MAX_CSV_FILES:
+            self.CSV_DATA.popitem(last=False)
+        return data
+
+    @api.model
+    def clean_csv_data(self):
+        self.CSV_DATA.clear()
+
+    @api.model
+    def get_csv_row(self, file_csv, ext_id_name, xmodel, ext_id):
+        """Return copy of row with ext_id, None if not found"""
+        data = self.get_csv_data(file_csv, ext_id_name, xmodel)
+        if not data or ext_id not in data['index']:
+            return None
+        return copy.deepcopy(data['rows'][data['index'][ext_id]])
+
+    @api.model
+    def get_csv_order(self, file_csv, ext_id_name, xmodel):
+        """Return row positions sorted by id (last occurrence of every id),
+        None if some row has no integer id"""
+        ixs = {}
+        for pos, row in enumerate(
+                self.iter_csv_file(file_csv, ext_id_name, xmodel)):
+            try:
+                ixs[int(row['id'])] = pos
+            except (KeyError, TypeError, ValueError):
+                return None
+        return [ixs[x] for x in sorted(ixs.keys())]
+
+    @api.model
+    def iter_csv_rows(self, file_csv, ext_id_name, xmodel, sort=None):
+        """Yield rows of CSV file; if sort, rows are sorted by id.
+        Rows are parsed while iterated; when sorting, just rows read before
+        their turn are kept, i.e. nothing if file is sorted"""
+        if not os.path.isfile(file_csv):
+            return
+        order = None
+        if sort:
+            order = self.get_csv_order(file_csv, ext_id_name, xmodel)
+        if order is None:
+            for row in self.iter_csv_file(file_csv, ext_id_name, xmodel):
+                yield row
+            return
+        positions = set(order)
+        order = iter(order)
+        next_pos = next(order, None)
+        pending = {}
+        for pos, row in enumerate(
+                self.iter_csv_file(file_csv, ext_id_name, xmodel)):
+            if pos not in positions:
+                continue
+            pending[pos] = row
+            while next_pos in pending:
+                yield pending.pop(next_pos)
+                next_pos = next(order, None)
 
     # -------------------------
     # General purpose functions
@@ -311,8 +832,14 @@ class IrModelSynchroCache(models.Model):
         cache = self.CACHE
         if lifetime:
             self.lifetime(lifetime)
+        self.clean_ext_id_index(model=model, all_scopes=True)
+        self.clean_skeys_match(model=model, all_scopes=True)
+        self.clean_csv_data()
+        # Model structure may be changed, so plans of any model are invalid
+        self.clean_mapping_plan(channel_id=channel_id)
         for chn_id in self.get_channel_list():
             if not channel_id or chn_id == channel_id:
+                self.close_connection(chn_id)
                 cache.init_channel(self._cr.dbname, chn_id)
         if model:
             cache.init_struct_model(self._cr.dbname, model)
@@ -320,6 +847,43 @@ class IrModelSynchroCache(models.Model):
             cache.init_struct(self._cr.dbname)
         return self.lifetime(0)
 
+    @api.model_cr_context
+    def close_connection(self, channel_id):
+        """Release pooled connections owned by channel cache"""
+        cnx = self.get_attr(channel_id, 'CNX')
+        if cnx and hasattr(cnx, 'close'):
+            try:
+                cnx.close()
+            except BaseException as e:  # pragma: no cover
+                _logger.error('%s closing channel %s' % (e, channel_id))
+
+    @api.model_cr_context
+    def trace_event(self, channel_id, loglevel, model, res_id, msg):
+        """Store logged message in channel trace; last TRACE_SIZE events
+        are kept"""
+        key = (self._cr.dbname, channel_id)
+        if key not in self.TRACE:
+            self.TRACE[key] = deque(maxlen=self.TRACE_SIZE)
+        self.TRACE[key].append({
+            'time': datetime.now(),
+            'level': loglevel,
+            'model': model,
+            'id': res_id,
+            'msg': msg,
+        })
+
+    @api.model_cr_context
+    def get_trace(self, channel_id, model=None):
+        return [x for x in self.TRACE.get((self._cr.dbname, channel_id), [])
+                if not model or x['model'] == model]
+
+    @api.model_cr_context
+    def clean_trace(self, channel_id=None):
+        for key in self.TRACE.keys():
+            if key[0] == self._cr.dbname and (
+                    not channel_id or key[1] == channel_id):
+                del self.TRACE[key]
+
     @api.model_cr_context
     def set_loglevel(self, loglevel):
         self.setup_channels(all=True)
@@ -775,8 +1339,6 @@ class IrModelSynchroCache(models.Model):
             channel.id, 'OUT_QUEUE', default=[]))
         self.set_attr(channel.id, 'IN_QUEUE', self.get_attr(
             channel.id, 'IN_QUEUE', default=[]))
-        self.set_attr(channel.id, '_QUEUE_SYNC', self.get_attr(
-            channel.id, '_QUEUE_SYNC', default={}))
         self.set_attr(channel.id, 'PREFIX', channel.prefix)
         self.set_attr(channel.id, 'ODOO_FVER', {
             'oe6': '6.1',
@@ -985,7 +1547,6 @@ class IrModelSynchroCache(models.Model):
             self.setup_model_structure(model, actual_model)
         self.setup_model_in_channels(
             channel=channel, model=model, ext_model=ext_model)
-        self.set_struct_model('_QUEUE_SYNC')
         if cls is not None:
             if cls.__class__.__name__ != model:
                 raise RuntimeError('Class %s not of declared model %s' % (
@@ -999,3 +1560,34 @@ class IrModelSynchroCache(models.Model):
             if hasattr(cls, 'PARENT_ID'):
                 self.set_struct_model_attr(actual_model, 'PARENT_ID',
                                            getattr(cls, 'PARENT_ID'))
+
+
+class Base(models.AbstractModel):
+    _inherit = 'base'
+
+    @api.model
+    @api.returns('self', lambda value: value.id)
+    def create(self, vals):
+        rec = super(Base, self).create(vals)
+        if IrModelSynchroCache.SKEYS_MATCH:
+            cache = self.env['ir.model.synchro.cache']
+            if cache.is_skeys_matched(self._name):
+                cache.del_skeys_match(rec)
+        return rec
+
+    @api.multi
+    def write(self, vals):
+        res = super(Base, self).write(vals)
+        if IrModelSynchroCache.SKEYS_MATCH:
+            cache = self.env['ir.model.synchro.cache']
+            if cache.is_skeys_matched(self._name):
+                cache.del_skeys_match(self)
+        return res
+
+    @api.multi
+    def unlink(self):
+        if IrModelSynchroCache.SKEYS_MATCH:
+            cache = self.env['ir.model.synchro.cache']
+            if cache.is_skeys_matched(self._name):
+                cache.del_skeys_match(self)
+        return super(Base, self).unlink()
@@ -8,9 +8,10 @@
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 #
 import os
-import csv
 import requests
 import logging
+from collections import deque
+from multiprocessing.pool import ThreadPool
 from odoo import api, fields, models
 from odoo import release
 
@@ -27,6 +28,200 @@ try:
     import odoorpc
 except ImportError as err:
     _logger.error(err)
+try:
+    from requests.adapters import HTTPAdapter
+    from requests.packages.urllib3.util.retry import Retry
+except ImportError as err:
+    _logger.error(err)
+
+
+def vg7_json_get(cnx, endpoint, ext_model, ext_id=False, mode=None,
+                 timeout=None):
+    """Read data from VG7 counterpart; cnx is the http session or the
+    headers dictionary. Does not use ORM, so it can run in any thread"""
+    if (ext_id and mode) or not ext_id:
+        url = os.path.join(endpoint, ext_model)
+    else:
+        url = os.path.join(endpoint, ext_model, str(ext_id))
+    response = None
+    try:
+        if isinstance(cnx, requests.Session):
+            response = cnx.get(url, timeout=timeout)
+        else:
+            response = requests.get(
+                url, headers=cnx, verify=False, timeout=timeout)
+    except BaseException:
+        return getattr(response, 'status_code', 'N/A')
+    if response:
+        return response.json()
+    return False
+
+
+def odoo_read_value(value, ttype):
+    """Convert value returned by Odoo read() as browse() returns it:
+    many2one -> id, x2many -> list of ids, string -> unicode"""
+    if ttype == 'many2one' and isinstance(value, (list, tuple)):
+        return value[0] if value else False
+    elif ttype in ('one2many', 'many2many'):
+        return list(value or [])
+    elif isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+class CounterpartPageReader(object):
+    """Read counterpart records by pages, by a unique request for every
+    page; records are consumed in the same way of CounterpartPrefetcher
+    but reading runs in the caller thread"""
+
+    def __init__(self, xmodel, read_page, page_size=None):
+        self.xmodel = xmodel
+        self.read_page = read_page
+        self.page_size = page_size or 100
+        self.pending = deque()
+        self.scheduled = set()
+        self.results = {}
+        self.stats = {'fetched': 0, 'hits': 0, 'pages': 0}
+
+    def schedule(self, ext_ids):
+        for ext_id in ext_ids:
+            if ext_id not in self.scheduled:
+                self.scheduled.add(ext_id)
+                self.pending.append(ext_id)
+
+    def pop(self, xmodel, ext_id, mode=None):
+        """Return read data or None if record is not scheduled"""
+        if xmodel != self.xmodel or mode:
+            return None
+        if ext_id not in self.results and ext_id in self.scheduled:
+            # Records before current one have been skipped
+            while self.pending[0] != ext_id:
+                self.scheduled.discard(self.pending.popleft())
+            page = []
+            while self.pending and len(page) < self.page_size:
+                page.append(self.pending.popleft())
+            self.scheduled.difference_update(page)
+            self.results = self.read_page(page)
+            self.stats['pages'] += 1
+            self.stats['fetched'] += len(self.results)
+        data = self.results.pop(ext_id, None)
+        if data is not None:
+            self.stats['hits'] += 1
+        return data
+
+    def close(self):
+        self.pending = deque()
+        self.scheduled = set()
+        self.results = {}
+        return self.stats
+
+
+class CounterpartPrefetcher(object):
+    """Fetch counterpart records in background threads while previous
+    records are written.
+    Threads just run network requests (fetch functions never use ORM);
+    results are consumed by SynchroChannelModel.get_counterpart_response()
+    Every parent task fetches the record and, if model has children, the
+    list of child records and every child record.
+    No more than <window> parent records are fetched in advance.
+    """
+
+    def __init__(self, xmodel, fetch, workers, model_child=None,
+                 parent_id_name=None, fetch_child=None, window=None):
+        self.xmodel = xmodel
+        self.fetch = fetch
+        self.model_child = model_child
+        self.parent_id_name = parent_id_name
+        self.fetch_child = fetch_child if model_child else None
+        self.window = window or (workers * 2)
+        self.pool = ThreadPool(processes=workers)
+        self.pending = deque()
+        self.scheduled = set()
+        self.submitted = deque()
+        self.tasks = {}
+        self.results = {}
+        self.result_keys = {}
+        self.current = None
+        self.stats = {'fetched': 0, 'hits': 0, 'errors': 0}
+
+    def schedule(self, ext_ids):
+        for ext_id in ext_ids:
+            if ext_id not in self.scheduled:
+                self.scheduled.add(ext_id)
+                self.pending.append(ext_id)
+        self.fill()
+
+    def fill(self):
+        while self.pending and len(self.tasks) < self.window:
+            ext_id = self.pending.popleft()
+            self.submitted.append(ext_id)
+            self.result_keys[ext_id] = []
+            self.tasks[ext_id] = self.pool.apply_async(
+                self.fetch_record, (ext_id, ))
+
+    def store(self, ext_id, key, data):
+        keys = self.result_keys.get(ext_id)
+        if keys is None:
+            # Record already released
+            return
+        self.results[key] = data
+        keys.append(key)
+
+    def fetch_record(self, ext_id):
+        try:
+            self.store(ext_id, (self.xmodel, ext_id, None),
+                       self.fetch(ext_id))
+            self.stats['fetched'] += 1
+            if self.fetch_child:
+                child_ids = self.fetch_child(
+                    ext_id, mode=self.parent_id_name)
+                self.store(ext_id,
+                           (self.model_child, ext_id, self.parent_id_name),
+                           child_ids)
+                if isinstance(child_ids, (list, tuple)):
+                    for item in child_ids:
+                        if isinstance(item, (int, long)):
+                            self.store(ext_id, (self.model_child, item, None),
+                                       self.fetch_child(item))
+                            self.stats['fetched'] += 1
+        except BaseException as e:  # pragma: no cover
+            self.stats['errors'] += 1
+            _logger.error('%s prefetching %s.%s' % (e, self.xmodel, ext_id))
+
+    def release(self, ext_id):
+        """Drop task and data not consumed of a record already pulled"""
+        self.tasks.pop(ext_id, None)
+        for key in self.result_keys.pop(ext_id, []):
+            self.results.pop(key, None)
+
+    def pop(self, xmodel, ext_id, mode=None):
+        """Return prefetched data or None if not prefetched"""
+        key = (xmodel, ext_id, mode)
+        if xmodel == self.xmodel and not mode and ext_id in self.tasks:
+            # Records before current one are done or have been skipped
+            while self.submitted and self.submitted[0] != ext_id:
+                self.release(self.submitted.popleft())
+            self.current = ext_id
+            self.fill()
+        task = self.tasks.get(self.current)
+        if key not in self.results and task:
+            task.wait()
+        data = self.results.pop(key, None)
+        if data is not None:
+            self.stats['hits'] += 1
+        return data
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        self.pending = deque()
+        self.scheduled = set()
+        self.submitted = deque()
+        self.tasks = {}
+        self.results = {}
+        self.result_keys = {}
+        return self.stats
+
 
 class SynchroChannel(models.Model):
     _name = 'synchro.channel'
@@ -117,6 +312,20 @@ class SynchroChannel(models.Model):
         help='Last imported record number')
     workflow_model = fields.Char('Current Workflow Model',
         readonly=True)
+    pool_size = fields.Integer('Connection pool size',
+        default=10,
+        help='Max number of keep-alive connections to counterpart')
+    max_retries = fields.Integer('Max retries',
+        default=3,
+        help='Number of retries on connection errors, timeouts and 5xx '
+             'responses; retries are delayed by exponential backoff')
+    timeout = fields.Integer('Timeout',
+        default=60,
+        help='Seconds to wait for counterpart response (0 = no timeout)')
+    prefetch_workers = fields.Integer('Prefetch workers',
+        default=4,
+        help='Max concurrent requests to counterpart while pulling records '
+             '(0 = no prefetch); should not exceed connection pool size')
 
     def get_channel_model(self, channel_id, model):
         return self.search([('synchro_channel_id', '=', channel_id),
@@ -127,9 +336,24 @@ class SynchroChannel(models.Model):
         return False, endpoint
 
     def vg7_json_session(self, endpoint):
-        """In JSON: headers -> cnx, endpoint -> session"""
-        headers = {'Authorization': 'access_token %s' % self.client_key}
-        return headers, endpoint
+        """In JSON: http session -> cnx, endpoint -> session
+        Http session is stored in channel cache and keeps connections alive,
+        so all requests to counterpart reuse the connection pool"""
+        http_session = requests.Session()
+        http_session.headers.update({
+            'Authorization': 'access_token %s' % self.client_key,
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        http_session.verify = False
+        retry = Retry(total=self.max_retries,
+                      backoff_factor=0.5,
+                      status_forcelist=(500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.pool_size or 10,
+                              max_retries=retry)
+        http_session.mount('http://', adapter)
+        http_session.mount('https://', adapter)
+        return http_session, endpoint
 
     def odoo_rpc_session(self, endpoint):
 
@@ -251,136 +475,120 @@ class SynchroChannelModel(models.Model):
             self.synchro_channel_id.id, model, 'KEY_ID', default='id')
         if not os.path.isfile(file_csv):
             return {} if ext_id else []
-        vals = []
-        with open(file_csv, 'rb') as fd:
-            hdr = False
-            reader = csv.DictReader(fd,
-                                    fieldnames=[],
-                                    restkey='undef_name')
-            for line in reader:
-                row = line['undef_name']
-                if not hdr:
-                    row_id = 0
-                    hdr = row
-                    continue
-                row_id += 1
-                row_res = {ext_id_name: row_id}
-                row_billing = {}
-                row_shipping = {}
-                row_contact = {}
-                for ix, value in enumerate(row):
-                    if (isinstance(value, basestring) and
-                            value.isdigit() and
-                            not value.startswith('0')):
-                        value = int(value)
-                    elif (isinstance(value, basestring) and
-                          value.startswith('[') and
-                          value.endswith(']')):
-                        value = eval(value)
-                    if hdr[ix] == ext_id_name:
-                        if not value:
-                            continue
-                        row_id = value
-                    if hdr[ix].startswith('billing_'):
-                        row_billing[hdr[ix]] = value
-                    elif hdr[ix].startswith('shipping_'):
-                        row_shipping[hdr[ix]] = value
-                    elif hdr[ix].startswith('contact_'):
-                        row_contact[hdr[ix]] = value
-                    else:
-                        row_res[hdr[ix]] = value
-                if row_billing:
-                    if model == 'res.partner.invoice':
-                        row_res = row_billing
-                    else:
-                        row_res['billing'] = row_billing
-                if row_shipping:
-                    if model == 'res.partner.shipping':
-                        for nm in ('customer_shipping_id', 'customer_id'):
-                            row_shipping[nm] = row_res[nm]
-                        row_res = row_shipping
-                    else:
-                        row_res['shipping'] = row_shipping
-                if row_contact:
-                    row_res['contact'] = row_contact
-                if (ext_id and not mode) and row_res[ext_id_name] != ext_id:
-                    continue
-                if ext_id:
-                    vals = row_res
-                    break
-                vals.append(row_res)
+        if ext_id and not mode:
+            vals = cache.get_csv_row(file_csv, ext_id_name, model, ext_id)
+            if vals is None:
+                vals = []
+        elif ext_id:
+            vals = next(
+                cache.iter_csv_rows(file_csv, ext_id_name, model), [])
+        else:
+            vals = list(cache.iter_csv_rows(file_csv, ext_id_name, model))
         return self.select_by_domain(vals, domain)
 
+    def iter_csv_response(self):
+        """Yield all records of CSV file, sorted by id, without building
+        the whole list"""
+        cache = self.env['ir.model.synchro.cache']
+        cache.open(channel=self.synchro_channel_id, model=self.name)
+        endpoint = self.get_counterpart_endpoint()
+        if not self.counterpart_name or not endpoint:
+            return (row for row in ())
+        file_csv = os.path.expanduser(
+            os.path.join(endpoint, self.counterpart_name + '.csv'))
+        ext_id_name = cache.get_model_attr(
+            self.synchro_channel_id.id, self.name, 'KEY_ID', default='id')
+        return cache.iter_csv_rows(file_csv, ext_id_name, self.name,
+                                   sort=True)
+
     def get_vg7_json_response(
             self, cnx, session, ext_id=False, domain=None, mode=None):
-        """In JSON cnx contains the headers and session is the endpoint"""
+        """In JSON cnx contains the http session and session is the endpoint
+        (cnx may be the headers dictionary as well)"""
+        vals = vg7_json_get(cnx, session, self.counterpart_name,
+                            ext_id=ext_id, mode=mode,
+                            timeout=self.synchro_channel_id.timeout or None)
+        if vals and isinstance(vals, (dict, list, tuple)):
+            return self.select_by_domain(vals, domain)
+        return vals
+
+    def get_vg7_json_fetcher(self, cnx, session):
+        timeout = self.synchro_channel_id.timeout or None
         ext_model = self.counterpart_name
-        headers = cnx
-        endpoint = session
-        if (ext_id and mode) or not ext_id:
-            url = os.path.join(endpoint, ext_model)
-        else:
-            url = os.path.join(endpoint, ext_model, str(ext_id))
-        try:
-            response = requests.get(url, headers=headers, verify=False)
-        except BaseException:
-            return getattr(response, 'status_code', 'N/A')
-        if response:
-            return self.select_by_domain(response.json(), domain)
-        return False
 
-    def browse_odoo_rec(self, cnx, ext_model, ext_id):
+        def fetch(ext_id, mode=None):
+            return vg7_json_get(cnx, session, ext_model,
+                                ext_id=ext_id, mode=mode, timeout=timeout)
 
-        def expand_many(rec, ext_field, vals):
-            try:
-                vals[ext_field] = [x.id for x in rec[ext_field]]
-            except BaseException:
-                if ext_field in vals:
-                    del vals[ext_field]
-            return vals
+        return fetch
 
-        try:
-            rec = cnx.browse(ext_model, ext_id)
-        except:
-            rec = False
+    def get_odoo_read_fields(self, cnx, ext_model):
+        """Return [(ext_field, ttype), ...] of fields to read from Odoo
+        counterpart; list is evaluated once per channel model"""
         cache = self.env['ir.model.synchro.cache']
+        channel_id = self.synchro_channel_id.id
+        read_fields = cache.get_model_attr(channel_id, ext_model, 'READ_FIELDS')
+        if read_fields is not None:
+            return read_fields
+        try:
+            ext_fields = cnx.execute(ext_model, 'fields_get')
+        except BaseException:
+            # Not cached: a transient error must not hide the fields
+            ext_fields = None
         actual_model = self.name
-        vals = {}
-        if rec:
-            for ext_field in cache.get_model_attr(
-                    self.synchro_channel_id.id, ext_model, 'EXT_FIELDS'):
-                if not hasattr(rec, ext_field):
-                    continue
-                loc_name = cache.get_model_field_attr(
-                    self.synchro_channel_id.id,
-                    ext_model,
-                    ext_field,
-                    'EXT_FIELDS',
-                    default=ext_field)
-                if loc_name.startswith('.'):
-                    loc_name = ''
-                if not loc_name:
-                    continue
-                if isinstance(rec[ext_field], (bool, int, long)):
-                    vals[ext_field] = rec[ext_field]
-                elif cache.get_struct_model_field_attr(
-                        actual_model, loc_name, 'ttype') == 'many2one':
-                    try:
-                        vals[ext_field] = rec[ext_field].id
-                    except BaseException:
-                        vals[ext_field] = rec[ext_field]
-                elif cache.get_struct_model_field_attr(
-                        actual_model, loc_name, 'ttype') in (
-                        'one2many', 'many2many'):
-                    vals = expand_many(rec, ext_field, vals)
-                elif isinstance(rec[ext_field], basestring):
-                    vals[ext_field] = rec[ext_field].encode(
-                        'utf-8').decode('utf-8')
-                else:
-                    vals[ext_field] = rec[ext_field]
+        read_fields = []
+        for ext_field in cache.get_model_attr(
+                channel_id, ext_model, 'EXT_FIELDS') or []:
+            if ext_field != 'id' and (
+                    not ext_fields or ext_field not in ext_fields):
+                continue
+            loc_name = cache.get_model_field_attr(
+                channel_id,
+                ext_model,
+                ext_field,
+                'EXT_FIELDS',
+                default=ext_field)
+            if loc_name.startswith('.'):
+                loc_name = ''
+            if not loc_name:
+                continue
+            read_fields.append((ext_field, cache.get_struct_model_field_attr(
+                actual_model, loc_name, 'ttype')))
+        if ext_fields is not None:
+            cache.set_model_attr(
+                channel_id, ext_model, 'READ_FIELDS', read_fields)
+        return read_fields
+
+    def read_odoo_recs(self, cnx, ext_model, ext_ids):
+        """Read records from Odoo counterpart by a unique read();
+        return {ext_id: vals}"""
+        read_fields = self.get_odoo_read_fields(cnx, ext_model)
+        try:
+            recs = cnx.execute(ext_model, 'read', list(ext_ids),
+                               [x[0] for x in read_fields])
+        except BaseException:
+            recs = []
+        res = {}
+        for rec in recs:
+            vals = {}
+            for ext_field, ttype in read_fields:
+                if ext_field in rec:
+                    vals[ext_field] = odoo_read_value(rec[ext_field], ttype)
             if vals:
-                vals['id'] = ext_id
-        return vals
+                vals['id'] = rec['id']
+            res[rec['id']] = vals
+        return res
+
+    def browse_odoo_rec(self, cnx, ext_model, ext_id):
+        return self.read_odoo_recs(cnx, ext_model, [ext_id]).get(ext_id, {})
+
+    def get_odoo_rpc_page_reader(self, cnx, session):
+        ext_model = self.counterpart_name
+
+        def read_page(ext_ids):
+            return self.read_odoo_recs(cnx, ext_model, ext_ids)
+
+        return read_page
 
     def get_odoo_rpc_response(
             self, cnx, session, ext_id=False, domain=None, mode=None):
@@ -430,17 +638,59 @@ class SynchroChannelModel(models.Model):
                 'Model %s not managed by external partner!', model=self.name)
             return {}
         channel = self.synchro_channel_id
-        if channel.method == 'CSV':
-            endpoint = channel.exchange_path
-        elif channel.method in ('JSON', 'XML', 'PEC', 'FTP'):
-            endpoint = channel.counterpart_url
-        else:
-            endpoint = False
+        endpoint = self.get_counterpart_endpoint()
         if not endpoint:
             self.env['ir.model.synchro'].logmsg('error',
                 'Channel %(chid)s without connection parameters!',
                 ctx={'chid': channel.id})
             return {}
+        cnx, session = self.get_counterpart_session(endpoint)
+        method = channel.method.lower()
+        super_method = 'rpc' if channel.method in ('XML', 'JSON') else 'gen'
+        vals = None
+        prefetcher = cache.get_attr(channel.id, 'PREFETCH')
+        if prefetcher and not domain:
+            vals = prefetcher.pop(self.name, ext_id, mode)
+        if not isinstance(vals, (dict, list, tuple)):
+            vals = False
+            for fct in (
+                    'get_%s_%s_response' % (channel.identity, method),
+                    'get_%s_response' % method,
+                    'get_%s_%s_response' % (channel.identity, super_method),
+                    'get_%s_response' % super_method,
+            ):
+                if hasattr(self, fct):
+                    self.env['ir.model.synchro'].logmsg('debug',
+                        '>>> %(model)s.%(fct)s(cnx,session,%(xid)s):',
+                        model=self.name,
+                        ctx={'fct': fct, 'xid': ext_id})
+                    vals = getattr(self, fct)(
+                        cnx, session, ext_id=ext_id, domain=domain, mode=mode)
+                    break
+        if not isinstance(vals, dict) and not isinstance(vals, (list, tuple)):
+            self.env['ir.model.synchro'].logmsg('error',
+                'Response error %(sts)s (%(chid)s,%(url)s,%(pfx)s)',
+                model=self.name, ctx={
+                    'sts': vals,
+                    'url': channel.counterpart_url,
+                    'pfx': channel.prefix,
+                })
+            cache.clean_cache(channel_id=channel.id, model=channel.name)
+            vals = {} if (ext_id and not mode) else []
+        return sort_data(vals)
+
+    def get_counterpart_endpoint(self):
+        channel = self.synchro_channel_id
+        if channel.method == 'CSV':
+            return channel.exchange_path
+        elif channel.method in ('JSON', 'XML', 'PEC', 'FTP'):
+            return channel.counterpart_url
+        return False
+
+    def get_counterpart_session(self, endpoint):
+        """Return connection and session of channel, stored in cache"""
+        cache = self.env['ir.model.synchro.cache']
+        channel = self.synchro_channel_id
         cnx = cache.get_attr(channel.id, 'CNX')
         session = cache.get_attr(channel.id, 'SESSION')
         method = channel.method.lower()
@@ -461,32 +711,45 @@ class SynchroChannelModel(models.Model):
                     cache.set_attr(channel.id, 'CNX', cnx)
                     cache.set_attr(channel.id, 'SESSION', session)
                     break
-        vals = False
-        for fct in (
-                'get_%s_%s_response' % (channel.identity, method),
-                'get_%s_response' % method,
-                'get_%s_%s_response' % (channel.identity, super_method),
-                'get_%s_response' % super_method,
-        ):
+        return cnx, session
+
+    def get_counterpart_page_reader(self):
+        """Return a function read_page(ext_ids) which reads a page of records
+        from counterpart by a unique request, or None if not supported;
+        used by CounterpartPageReader"""
+        channel = self.synchro_channel_id
+        if not self.counterpart_name:
+            return None
+        endpoint = self.get_counterpart_endpoint()
+        if not endpoint:
+            return None
+        method = channel.method.lower()
+        super_method = 'rpc' if channel.method in ('XML', 'JSON') else 'gen'
+        for fct in ('get_%s_%s_page_reader' % (channel.identity, method),
+                    'get_%s_%s_page_reader' % (channel.identity,
+                                               super_method)):
             if hasattr(self, fct):
-                self.env['ir.model.synchro'].logmsg('debug',
-                    '>>> %(model)s.%(fct)s(cnx,session,%(xid)s):',
-                    model=self.name,
-                    ctx={'fct': fct, 'xid': ext_id})
-                vals = getattr(self, fct)(
-                    cnx, session, ext_id=ext_id, domain=domain, mode=mode)
-                break
-        if not isinstance(vals, dict) and not isinstance(vals, (list, tuple)):
-            self.env['ir.model.synchro'].logmsg('error',
-                'Response error %(sts)s (%(chid)s,%(url)s,%(pfx)s)',
-                model=self.name, ctx={
-                    'sts': vals,
-                    'url': channel.counterpart_url,
-                    'pfx': channel.prefix,
-                })
-            cache.clean_cache(channel_id=channel.id, model=channel.name)
-            vals = {} if (ext_id and not mode) else []
-        return sort_data(vals)
+                cnx, session = self.get_counterpart_session(endpoint)
+                if not cnx:
+                    return None
+                return getattr(self, fct)(cnx, session)
+        return None
+
+    def get_counterpart_fetcher(self):
+        """Return a function fetch(ext_id, mode=None) which reads raw data
+        from counterpart without using ORM, or None if transport is not
+        thread safe; used by CounterpartPrefetcher"""
+        channel = self.synchro_channel_id
+        if not self.counterpart_name:
+            return None
+        endpoint = self.get_counterpart_endpoint()
+        if not endpoint:
+            return None
+        fct = 'get_%s_%s_fetcher' % (channel.identity, channel.method.lower())
+        if not hasattr(self, fct):
+            return None
+        cnx, session = self.get_counterpart_session(endpoint)
+        return getattr(self, fct)(cnx, session)
 
     def build_odoo_synchro_model(self, channel_id, ext_model, model=None):
         cache = self.env['ir.model.synchro.cache']
@@ -543,10 +806,10 @@ class SynchroChannelModel(models.Model):
             try:
                 self.create(vals)
                 # commit table to avoid another I/O if next operation fails
-                self.env.cr.commit()  # pylint: disable=invalid-commit
+                ir_synchro_model.sync_commit()
                 return True
             except BaseException as e:
-                self.env.cr.rollback()  # pylint: disable=invalid-commit
+                ir_synchro_model.sync_rollback()
                 self.logmsg('warning',
                     'Error %(e) creating %(model)s',
                     model=self.__name__, ctx={'e': e})
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright 2019-20 - SHS-AV s.r.l. <https://www.zeroincombenze.it/>
+#
+# Contributions to development, thanks to:
+# * Antonio Maria Vigliotti <antoniomaria.vigliotti@gmail.com>
+#
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+#
+import collections
+import shutil
+import tempfile
+
+from odoo.tests import common
+
+
+class TestCsvResponse(common.TransactionCase):
+    """ Test streaming of CSV channel models """
+
+    def setUp(self):
+        super(TestCsvResponse, self).setUp()
+        self.exchange_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.exchange_path)
+        self.channel = self.env['synchro.channel'].create({
+            'name': 'Test CSV',
+            'prefix': 'csv',
+            'identity': 'generic',
+            'method': 'CSV',
+            'exchange_path': self.exchange_path,
+        })
+
+    def _create_channel_model(self, counterpart_name):
+        return self.env['synchro.channel.model'].create({
+            'name': 'res.partner',
+            'search_keys': "(['name'])",
+            'counterpart_name': counterpart_name,
+            'synchro_channel_id': self.channel.id,
+        })
+
+    def _assert_empty_iterator(self, datas):
+        self.assertIsInstance(datas, collections.Iterator)
+        self.assertIsNone(next(datas, None))
+
+    def test_iter_csv_response_no_counterpart_name(self):
+        channel_model = self._create_channel_model(False)
+        self._assert_empty_iterator(channel_model.iter_csv_response())
+
+    def test_iter_csv_response_no_file(self):
+        channel_model = self._create_channel_model('customers')
+        self._assert_empty_iterator(channel_model.iter_csv_response())
@@ -49,6 +49,13 @@ class WizardExportFatturapa(models.TransientModel):
              'i.e.  "4 10-12" declares records 4,10,11,12.\n'
              'Leave empty to import all IDs'
     )
+    batch_size = fields.Integer('Batch Size',
+        default=0,
+        help='Number of records committed together;\n'
+             'every record is written in its own savepoint so an error\n'
+             'discards just the wrong record.\n'
+             'Leave 0 to commit every single record'
+    )
 
     def pull_full_records(self):
         ir_model = self.env['ir.model']
@@ -71,7 +78,8 @@ class WizardExportFatturapa(models.TransientModel):
                 select=self.sel_rec,
                 only_minimal=only_minimal,
                 no_deep_fields=no_deep_fields,
-                remote_ids=self.remote_ids)
+                remote_ids=self.remote_ids,
+                batch_size=self.batch_size)
         return {
             'name': "Data imported",
             'view_type': 'form',
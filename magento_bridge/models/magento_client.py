@@ -0,0 +1,187 @@
+# flake8: noqa
+# -*- coding: utf-8 -*-
+##########################################################################
+#
+#   Copyright (c) 2015-Present Webkul Software Pvt. Ltd. (<https://webkul.com/>)
+#   See LICENSE file for full copyright and licensing details.
+#   License URL : <https://store.webkul.com/license.html/>
+#
+##########################################################################
+
+import logging
+import threading
+import time
+import xmlrpclib
+
+_logger = logging.getLogger(__name__)
+
+# Magento closes the api sessions after 3600 seconds by default
+SESSION_LIFETIME = 3000
+# Magento fault codes of an expired or unknown session
+SESSION_FAULT_CODES = (5, '5')
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+class MagentoClient(object):
+    """ XML-RPC client of one Magento api url, shared by all the calls.
+
+    It can be used in place of ``xmlrpclib.Server(url)``:
+
+    * each thread keeps its own server proxy, so the HTTP connection
+      is kept alive between the calls;
+    * ``login()`` returns the session of the previous login with the same
+      credentials while it is not expired, the sessions are kept per
+      credentials;
+    * ``call()`` uses the current session of the credentials when the
+      caller passes an older one, and logs in again and retries once
+      when Magento answers that the session is expired;
+    * the number and the duration of the calls are kept per method,
+      see ``metrics()``.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (user, pwd) -> (session, login time, previous session)
+        self._sessions = {}
+        # session -> (user, pwd) of the current and the previous session
+        # of the credentials, to retry the calls of expired sessions
+        self._session_credentials = {}
+        self._metrics = {'calls': 0, 'faults': 0, 'errors': 0,
+                         'logins': 0, 'relogins': 0, 'seconds': 0.0,
+                         'methods': {}}
+
+    @property
+    def server(self):
+        server = getattr(self._local, 'server', None)
+        if server is None:
+            server = self._local.server = xmlrpclib.Server(self.url)
+        return server
+
+    def _timed(self, method, func, *args):
+        start = time.time()
+        error = None
+        try:
+            return func(*args)
+        except xmlrpclib.Fault:
+            error = 'faults'
+            raise
+        except Exception:
+            # a broken connection is not reused
+            self._local.server = None
+            error = 'errors'
+            raise
+        finally:
+            self._count(method, time.time() - start, error)
+
+    def _count(self, method, duration, error=None):
+        with self._lock:
+            metrics = self._metrics
+            metrics['calls'] += 1
+            metrics['seconds'] += duration
+            if error:
+                metrics[error] += 1
+            stats = metrics['methods'].setdefault(
+                method, {'calls': 0, 'seconds': 0.0, 'max': 0.0})
+            stats['calls'] += 1
+            stats['seconds'] += duration
+            stats['max'] = max(stats['max'], duration)
+
+    def login(self, user, pwd, force=False):
+        """ Return a Magento session, the one of the previous login
+        is reused when the credentials are the same and it is not
+        expired """
+        if not force:
+            session = self._fresh_session((user, pwd))
+            if session:
+                return session
+        session = self._timed('login', self.server.login, user, pwd)
+        with self._lock:
+            previous = self._sessions.get((user, pwd))
+            if previous:
+                self._session_credentials.pop(previous[2], None)
+            self._sessions[(user, pwd)] = (
+                session, time.time(), previous and previous[0])
+            self._session_credentials[session] = (user, pwd)
+            self._metrics['logins'] += 1
+        return session
+
+    def _fresh_session(self, credentials):
+        """ Return the session of credentials if it is not expired """
+        with self._lock:
+            session, sessionTime, __ = self._sessions.get(
+                credentials, (None, 0, None))
+        if session and time.time() - sessionTime < SESSION_LIFETIME:
+            return session
+        return None
+
+    def _session_call(self, method, name, session, *args):
+        with self._lock:
+            credentials = self._session_credentials.get(session)
+        if credentials:
+            # the caller may keep the session replaced by a new login
+            session = self._fresh_session(credentials) or session
+        try:
+            return self._timed(method, getattr(self.server, name), session,
+                               *args)
+        except xmlrpclib.Fault as e:
+            if e.faultCode not in SESSION_FAULT_CODES or not credentials:
+                raise
+            newSession = self._fresh_session(credentials)
+            if not newSession or newSession == session:
+                _logger.info('MOB: Magento session expired on %s, '
+                             'login again', self.url)
+                with self._lock:
+                    self._metrics['relogins'] += 1
+                newSession = self.login(*credentials, force=True)
+            return self._timed(method, getattr(self.server, name),
+                               newSession, *args)
+
+    def call(self, session, method, *args):
+        """ Call a method of the Magento api, as ``server.call()``.
+
+        When the session is expired and the credentials are known, a new
+        session is opened and the call is retried once.
+        """
+        return self._session_call(method, 'call', session, method, *args)
+
+    def multi_call(self, session, calls):
+        """ Call several methods of the Magento api in one request with
+        ``multiCall``.
+
+        :param calls: list of ``[method, params]``
+        :return: list of the results, the result of a failed call is a
+                 dict with ``isFault``, ``faultCode`` and ``faultMessage``
+        """
+        return self._session_call('multiCall', 'multiCall', session, calls)
+
+    def metrics(self):
+        """ Return the counters of the calls: number of calls, faults,
+        errors, logins, relogins and total duration, and per method the
+        number of calls, the total and the maximal duration """
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['methods'] = {
+                method: dict(stats)
+                for method, stats in self._metrics['methods'].iteritems()}
+        return metrics
+
+    def reset(self):
+        """ Forget the sessions """
+        with self._lock:
+            self._sessions = {}
+            self._session_credentials = {}
+
+
+def get_client(url):
+    """ Return the shared ``MagentoClient`` of a Magento api url """
+    client = _CLIENTS.get(url)
+    if client is None:
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.get(url)
+            if client is None:
+                client = _CLIENTS[url] = MagentoClient(url)
+    return client
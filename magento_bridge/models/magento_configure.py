@@ -14,6 +14,7 @@ import xmlrpclib
 from odoo import _, api, fields, models
 from odoo.addons.base.res.res_partner import _lang_get
 from odoo.exceptions import UserError
+from magento_client import get_client
 
 XMLRPC_API = '/index.php/api/xmlrpc'
 
@@ -44,7 +45,7 @@ class MagentoConfigure(models.Model):
         storeInfo = {}
         storeViewModel = self.env['magento.store.view']
         try:
-            server = xmlrpclib.Server(url)
+            server = get_client(url)
             stores = server.call(session, 'store.list')
         except xmlrpclib.Fault as e:
             raise UserError(
@@ -215,8 +216,8 @@ class MagentoConfigure(models.Model):
         pwd = self.pwd
         checkMapping = self.correct_mapping
         try:
-            server = xmlrpclib.Server(url)
-            session = server.login(user, pwd)
+            server = get_client(url)
+            session = server.login(user, pwd, force=True)
         except xmlrpclib.Fault as e:
             text = "Error, %s Invalid Login Credentials!!!" % (e.faultString)
         except IOError as e:
@@ -268,7 +269,7 @@ class MagentoConfigure(models.Model):
                     lang=instanceObj.language
                 )
             try:
-                server = xmlrpclib.Server(url)
+                server = get_client(url)
                 session = server.login(user, pwd)
             except xmlrpclib.Fault as e:
                 raise UserError(
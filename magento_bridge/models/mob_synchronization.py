@@ -11,6 +11,7 @@
 import xmlrpclib
 
 from odoo import api, models
+from magento_client import get_client
 
 
 class MagentoSynchronization(models.TransientModel):
@@ -85,7 +86,7 @@ class MagentoSynchronization(models.TransientModel):
     @api.model
     def server_call(self, session, url, method, params=None):
         if session:
-            server = xmlrpclib.Server(url)
+            server = get_client(url)
             mageId = 0
             try:
                 if params is None:
@@ -97,6 +98,37 @@ class MagentoSynchronization(models.TransientModel):
                 return [0, '\nError in create (Code: %s).%s' % (name, str(e))]
             return [1, mageId]
 
+    @api.model
+    def server_multi_call(self, session, url, calls, batchSize=50):
+        """ Call several methods of the Magento api, in ``multiCall``
+        batches of ``batchSize`` calls.
+
+        :param calls: list of ``[method, params]``
+        :return: for each call, ``[1, result]`` or ``[0, error]`` as
+                 ``server_call()``
+        """
+        results = []
+        if not session:
+            return [[0, '\nError, no Magento session.']] * len(calls)
+        server = get_client(url)
+        for start in range(0, len(calls), batchSize):
+            batch = calls[start:start + batchSize]
+            try:
+                responses = server.multi_call(session, batch)
+            except xmlrpclib.Fault as e:
+                results.extend(
+                    [[0, '\nError in create (Code: %s).%s' % ('', str(e))]] *
+                    len(batch))
+                continue
+            for response in responses:
+                if isinstance(response, dict) and response.get('isFault'):
+                    results.append([0, '\nError in create (Code: %s).%s' % (
+                        response.get('faultCode', ''),
+                        response.get('faultMessage'))])
+                else:
+                    results.append([1, response])
+        return results
+
     def get_mage_region_id(self, url, session, region, countryCode):
         """
         @return magneto region id
@@ -10,11 +10,11 @@
 
 import binascii
 import logging
-import xmlrpclib
 
 import requests
 
 from odoo import _, api, fields, models
+from magento_client import get_client
 from res_partner import _unescape
 _logger = logging.getLogger(__name__)
 
@@ -174,7 +174,7 @@ class ProductCategory(models.Model):
             if activeConnection:
                 url = activeConnection[0]
                 session = activeConnection[1]
-                server = xmlrpclib.Server(url)
+                server = get_client(url)
             for categObj in self:
                 categDomain = domain + [('oe_category_id', '=', categObj.id)]
                 mapCategObjs = mapCategModel.search(categDomain)
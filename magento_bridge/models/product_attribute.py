@@ -9,9 +9,9 @@
 ##########################################################################
 
 import re
-import xmlrpclib
 
 from odoo import api, models
+from magento_client import get_client
 
 
 class ProductAttributeLine(models.Model):
@@ -60,7 +60,7 @@ class ProductAttribute(models.Model):
             if activeConnection:
                 url = activeConnection[0]
                 session = activeConnection[1]
-                server = xmlrpclib.Server(url)
+                server = get_client(url)
             for attrObj in self:
                 attrDomain = domain + [('erp_id', '=', attrObj.id)]
                 mapAttrObjs = mapAttrModel.search(attrDomain)
@@ -117,7 +117,7 @@ class ProductAttributeValue(models.Model):
                     if activeConnection:
                         url = activeConnection[0]
                         session = activeConnection[1]
-                        server = xmlrpclib.Server(url)
+                        server = get_client(url)
                         try:
                             server.call(
                                 session, 'magerpsync.attribute_value_map_delete', [
@@ -18,6 +18,10 @@ _logger = logging.getLogger(__name__)
 class MagentoSynchronization(models.TransientModel):
     _inherit = "magento.synchronization"
 
+    # number of templates exported together, their products are created
+    # with multiCall batches of this size
+    _export_batch_size = 50
+
     @api.model
     def get_sync_template_ids(self, templateIds):
         ctx = dict(self._context or {})
@@ -138,18 +142,22 @@ class MagentoSynchronization(models.TransientModel):
                     'magento.configure'].browse(instanceId)
                 warehouse_id = connectionObj.warehouse_id.id
                 ctx['warehouse'] = warehouse_id
-                for templateObj in templateModel.with_context(
-                        ctx).browse(notMappedTemplateIds):
-                    prodType = templateObj.type
-                    if prodType == 'service':
-                        errorIds.append(templateObj.id)
-                        continue
-                    expProduct = self.with_context(
-                        ctx)._export_specific_template(templateObj, url, session)
-                    if expProduct[0] > 0:
-                        successExpIds.append(templateObj.id)
-                    else:
-                        errorIds.append(expProduct[1])
+                templateObjs = templateModel.with_context(
+                    ctx).browse(notMappedTemplateIds)
+                errorIds.extend(templateObjs.filtered(
+                    lambda obj: obj.type == 'service').ids)
+                templateObjs = templateObjs.filtered(
+                    lambda obj: obj.type != 'service')
+                for start in range(0, len(templateObjs), self._export_batch_size):
+                    chunkObjs = templateObjs[start:start + self._export_batch_size]
+                    expProducts = self.with_context(ctx)._export_templates(
+                        chunkObjs, url, session)
+                    for templateObj in chunkObjs:
+                        expProduct = expProducts[templateObj.id]
+                        if expProduct[0] > 0:
+                            successExpIds.append(templateObj.id)
+                        else:
+                            errorIds.append(expProduct[1])
             if ctx.get('sync_opr') == 'update':
                 updtMappedTemplateObjs = self.with_context(
                     ctx).get_sync_template_ids(templateIds)
@@ -187,148 +195,198 @@ class MagentoSynchronization(models.TransientModel):
 
     def _export_specific_template(self, templateObj, url, session):
         if templateObj:
-            mageSetId = 0
-            ctx = dict(self._context or {})
-            instanceId = ctx.get('instance_id')
-            getProductData = {}
-            magePriceChanges = {}
-            mageAttributeIds = []
-            mapTmplModel = self.env['magento.product.template']
-            attrPriceModel = self.env['product.attribute.price']
-            templateId = templateObj.id
-            templateSku = templateObj.default_code or 'Template Ref %s' % templateId
-            if not templateObj.product_variant_ids:
-                return [-2, str(templateId) + ' No Variant Ids Found!!!']
-            else:
-                if not templateObj.attribute_set_id.id:
-                    res = self.assign_attribute_Set([templateObj])
-                    if not res:
-                        return [-1, str(templateId) +
-                                ' Attribute Set Name not matched with attributes!!!']
-
-                attrSetObj = templateObj.attribute_set_id
-                attrSetObj = self.with_context(
-                    ctx)._check_valid_attribute_set(attrSetObj, templateId)
-                wkAttrLineObjs = templateObj.attribute_line_ids
-                if not wkAttrLineObjs:
-                    templateSku = 'single_variant'
-                    magProdId = self.with_context(ctx)._sync_template_variants(
-                        templateObj, templateSku, url, session)
-                    name = templateObj.name
-                    price = templateObj.list_price or 0.0
-                    if magProdId:
-                        odooMapData = {
-                            'template_name' : templateId,
-                            'erp_template_id' : templateId,
-                            'mage_product_id' : magProdId[0],
-                            'base_price' : price,
-                            'is_variants' : False,
-                            'instance_id' : instanceId
-                        }
-                        mapTmplModel.with_context(ctx).create(odooMapData)
-                        return [1, magProdId[0]]
-                    else:
-                        return [0, templateId]
-                else:
-                    checkAttribute = self.with_context(
-                        ctx)._check_attribute_with_set(attrSetObj, wkAttrLineObjs)
-                    if checkAttribute[0] == -1:
-                        return checkAttribute
-                    mageSetId = templateObj.attribute_set_id.set_id
-                    if not mageSetId:
-                        return [-3, str(templateId) +
-                                ' Attribute Set Name not found!!!']
-                    else:
-                        for attrLineObj in wkAttrLineObjs:
-                            mageAttrIds = self.with_context(
-                                ctx)._check_attribute_sync(attrLineObj)
-                            if not mageAttrIds:
-                                return [-1, str(templateId) +
-                                        ' Attribute not syned at magento!!!']
-                            mageAttributeIds.append(mageAttrIds[0])
-                            getProductData[
-                                'configurable_attributes'] = mageAttributeIds
-                            attrName = attrLineObj.attribute_id.name.lower(
-                            ).replace(" ", "_").replace("-", "_")[:29]
-                            attrMappingObj = self.env['magento.product.attribute'].search(
-                                [('name', '=', attrLineObj.attribute_id.id)])
-                            if attrMappingObj:
-                                attrName = attrMappingObj.mage_attribute_code
-                            valDict = self.with_context(ctx)._search_single_values(
-                                templateId, attrLineObj.attribute_id.id)
-                            if valDict:
-                                ctx.update(valDict)
-                            domain = [('product_tmpl_id', '=', templateId)]
-                            for valueObj in attrLineObj.value_ids:
-                                priceExtra = 0.0
-                                ##### product template and value extra price ##
-                                searchDomain = domain + \
-                                    [('value_id', '=', valueObj.id)]
-                                attrPriceObjs = attrPriceModel.with_context(
-                                    ctx).search(searchDomain)
-                                if attrPriceObjs:
-                                    priceExtra = attrPriceObjs[0].price_extra
-                                valueName = valueObj.name
-                                if attrName in magePriceChanges:
-                                    magePriceChanges[attrName].update(
-                                        {valueName: priceExtra})
-                                else:
-                                    magePriceChanges[attrName] = {
-                                        valueName: priceExtra}
-                        mageProdIds = self.with_context(ctx)._sync_template_variants(
-                            templateObj, templateSku, url, session)
-                        getProductData.update({
-                            'associated_product_ids' : mageProdIds,
-                            'price_changes' : magePriceChanges,
-                            'visibility' : 4,
-                            'price' : templateObj.list_price or 0.00,
-                            'tax_class_id' : '0'
-                        })
-                        getProductData = self.with_context(ctx)._get_product_array(
-                            url, session, templateObj, getProductData)
-                        stockData = self._get_product_qty(templateObj)
-                        stockData.pop('qty', 0)
-                        getProductData.update(stock_data=stockData)
-                        getProductData['websites'] = [1]
-                        templateSku = 'Template sku %s' % templateId
-                        templateObj.write({'prod_type': 'configurable'})
-                        newProdData = [
-                            'configurable',
-                            mageSetId,
-                            templateSku,
-                            getProductData,
-                            templateId]
-                        try:
-                            magProdId = self.server_call(
-                                session, url, 'magerpsync.product_create', newProdData)
-                        except xmlrpclib.Fault as e:
-                            return [0, str(templateId) + ': ' + str(e)]
-                        if magProdId[0] > 0:
-                            odooMapData = {
-                                'template_name' : templateId,
-                                'erp_template_id' : templateId,
-                                'mage_product_id' : magProdId[1],
-                                'base_price' : getProductData['price'],
-                                'is_variants' : True,
-                                'instance_id' : instanceId
-                            }
-                            mapTmplModel.with_context(ctx).create(odooMapData)
-                            try:
-                                attributeLineData = self.get_attribute_price_list(
-                                    templateObj.attribute_line_ids, templateId)
-                                if attributeLineData:
-                                    self.server_call(
-                                        session, url, 'magerpsync.product_super_attribute', [
-                                            magProdId[1], attributeLineData])
-                            except xmlrpclib.Fault as e:
-                                _logger.debug('super attribute did not updated')
-                            return magProdId
-                        else:
-                            return [
-                                0, str(templateId) + "Not Created at magento"]
+            return self._export_templates(
+                templateObj, url, session)[templateObj.id]
         else:
             return [0, 'Not Template']
 
+    def _prepare_template_export(self, templateObj, url, session):
+        """ Check a template and build the data of its product on Magento.
+
+        :return: the error as ``[code, message]``, or a dict with the
+                 ``template``, the ``sku`` of its variants and, for a
+                 configurable product, the ``params`` of
+                 ``magerpsync.product_create``
+        """
+        mageSetId = 0
+        ctx = dict(self._context or {})
+        getProductData = {}
+        magePriceChanges = {}
+        mageAttributeIds = []
+        attrPriceModel = self.env['product.attribute.price']
+        templateId = templateObj.id
+        templateSku = templateObj.default_code or 'Template Ref %s' % templateId
+        if not templateObj.product_variant_ids:
+            return [-2, str(templateId) + ' No Variant Ids Found!!!']
+        if not templateObj.attribute_set_id.id:
+            res = self.assign_attribute_Set([templateObj])
+            if not res:
+                return [-1, str(templateId) +
+                        ' Attribute Set Name not matched with attributes!!!']
+
+        attrSetObj = templateObj.attribute_set_id
+        attrSetObj = self.with_context(
+            ctx)._check_valid_attribute_set(attrSetObj, templateId)
+        wkAttrLineObjs = templateObj.attribute_line_ids
+        if not wkAttrLineObjs:
+            return {'template': templateObj, 'sku': 'single_variant'}
+        checkAttribute = self.with_context(
+            ctx)._check_attribute_with_set(attrSetObj, wkAttrLineObjs)
+        if checkAttribute[0] == -1:
+            return checkAttribute
+        mageSetId = templateObj.attribute_set_id.set_id
+        if not mageSetId:
+            return [-3, str(templateId) +
+                    ' Attribute Set Name not found!!!']
+        for attrLineObj in wkAttrLineObjs:
+            mageAttrIds = self.with_context(
+                ctx)._check_attribute_sync(attrLineObj)
+            if not mageAttrIds:
+                return [-1, str(templateId) +
+                        ' Attribute not syned at magento!!!']
+            mageAttributeIds.append(mageAttrIds[0])
+            getProductData[
+                'configurable_attributes'] = mageAttributeIds
+            attrName = attrLineObj.attribute_id.name.lower(
+            ).replace(" ", "_").replace("-", "_")[:29]
+            attrMappingObj = self.env['magento.product.attribute'].search(
+                [('name', '=', attrLineObj.attribute_id.id)])
+            if attrMappingObj:
+                attrName = attrMappingObj.mage_attribute_code
+            valDict = self.with_context(ctx)._search_single_values(
+                templateId, attrLineObj.attribute_id.id)
+            if valDict:
+                ctx.update(valDict)
+            domain = [('product_tmpl_id', '=', templateId)]
+            for valueObj in attrLineObj.value_ids:
+                priceExtra = 0.0
+                ##### product template and value extra price ##
+                searchDomain = domain + \
+                    [('value_id', '=', valueObj.id)]
+                attrPriceObjs = attrPriceModel.with_context(
+                    ctx).search(searchDomain)
+                if attrPriceObjs:
+                    priceExtra = attrPriceObjs[0].price_extra
+                valueName = valueObj.name
+                if attrName in magePriceChanges:
+                    magePriceChanges[attrName].update(
+                        {valueName: priceExtra})
+                else:
+                    magePriceChanges[attrName] = {
+                        valueName: priceExtra}
+        getProductData.update({
+            'price_changes' : magePriceChanges,
+            'visibility' : 4,
+            'price' : templateObj.list_price or 0.00,
+            'tax_class_id' : '0'
+        })
+        getProductData = self.with_context(ctx)._get_product_array(
+            url, session, templateObj, getProductData)
+        stockData = self._get_product_qty(templateObj)
+        stockData.pop('qty', 0)
+        getProductData.update(stock_data=stockData)
+        getProductData['websites'] = [1]
+        templateObj.write({'prod_type': 'configurable'})
+        newProdData = [
+            'configurable',
+            mageSetId,
+            'Template sku %s' % templateId,
+            getProductData,
+            templateId]
+        return {'template': templateObj, 'sku': templateSku,
+                'params': newProdData}
+
+    def _export_templates(self, templateObjs, url, session):
+        """ Export templates to Magento.
+
+        The calls are sent with ``multiCall`` batches: first the creation
+        of the variants of all the templates, then the one of the
+        configurable products, then their super attributes.
+
+        :return: ``{template id: result}``, the result is the one of
+                 ``_export_specific_template``
+        """
+        ctx = dict(self._context or {})
+        instanceId = ctx.get('instance_id')
+        mapTmplModel = self.env['magento.product.template']
+        results, jobs = {}, []
+        for templateObj in templateObjs:
+            job = self.with_context(ctx)._prepare_template_export(
+                templateObj, url, session)
+            if isinstance(job, dict):
+                jobs.append(job)
+            else:
+                results[templateObj.id] = job
+        variantSkus = {}
+        for job in jobs:
+            for vrntObj in job['template'].product_variant_ids:
+                variantSkus[vrntObj.id] = job['sku']
+        mageVariantIds = self.with_context(ctx)._export_variants(
+            self.env['product.product'].browse(list(variantSkus)),
+            variantSkus, url, session)
+
+        configurableJobs = []
+        for job in jobs:
+            templateObj = job['template']
+            templateId = templateObj.id
+            mageProdIds = [
+                mageVariantIds[vrntObj.id]
+                for vrntObj in templateObj.product_variant_ids
+                if mageVariantIds.get(vrntObj.id)]
+            if 'params' in job:
+                job['params'][3]['associated_product_ids'] = mageProdIds
+                configurableJobs.append(job)
+            elif mageProdIds:
+                odooMapData = {
+                    'template_name' : templateId,
+                    'erp_template_id' : templateId,
+                    'mage_product_id' : mageProdIds[0],
+                    'base_price' : templateObj.list_price or 0.0,
+                    'is_variants' : False,
+                    'instance_id' : instanceId
+                }
+                mapTmplModel.with_context(ctx).create(odooMapData)
+                results[templateId] = [1, mageProdIds[0]]
+            else:
+                results[templateId] = [0, templateId]
+
+        magProdIds = self.server_multi_call(
+            session, url,
+            [['magerpsync.product_create', job['params']]
+             for job in configurableJobs],
+            self._export_batch_size)
+        superAttributeCalls = []
+        for job, magProdId in zip(configurableJobs, magProdIds):
+            templateObj = job['template']
+            templateId = templateObj.id
+            if magProdId[0] > 0:
+                odooMapData = {
+                    'template_name' : templateId,
+                    'erp_template_id' : templateId,
+                    'mage_product_id' : magProdId[1],
+                    'base_price' : job['params'][3]['price'],
+                    'is_variants' : True,
+                    'instance_id' : instanceId
+                }
+                mapTmplModel.with_context(ctx).create(odooMapData)
+                attributeLineData = self.get_attribute_price_list(
+                    templateObj.attribute_line_ids, templateId)
+                if attributeLineData:
+                    superAttributeCalls.append([
+                        'magerpsync.product_super_attribute', [
+                            magProdId[1], attributeLineData]])
+                results[templateId] = magProdId
+            else:
+                results[templateId] = [
+                    0, str(templateId) + "Not Created at magento"]
+        if superAttributeCalls:
+            for response in self.server_multi_call(
+                    session, url, superAttributeCalls,
+                    self._export_batch_size):
+                if response[0] == 0:
+                    _logger.debug('super attribute did not updated')
+        return results
+
     def _check_valid_attribute_set(self, attrSetObj, templateId):
         ctx = dict(self._context or {})
         instanceId = ctx.get('instance_id')
@@ -339,22 +397,44 @@ class MagentoSynchronization(models.TransientModel):
     ############# sync template variants ########
     def _sync_template_variants(self, templateObj, templateSku, url, session):
         mageVariantIds = []
-        mapProdModel = self.env['magento.product']
-        ctx = dict(self._context or {})
-        instanceId = ctx.get('instance_id')
-        domain = [('instance_id', '=', instanceId)]
-        for vrntObj in templateObj.product_variant_ids:
-            searchDomain = domain + [('pro_name', '=', vrntObj.id)]
-            existMapObjs = mapProdModel.search(searchDomain)
-            if existMapObjs:
-                mageVariantIds.append(existMapObjs[0].mag_product_id)
-            else:
-                mageVrntId = self._export_specific_product(
-                    vrntObj, templateSku, url, session)
-                if mageVrntId[0] > 0 and mageVrntId[1]:
-                    mageVariantIds.append(mageVrntId[1])
+        vrntObjs = templateObj.product_variant_ids
+        mageIds = self._export_variants(
+            vrntObjs, dict.fromkeys(vrntObjs.ids, templateSku), url, session)
+        for vrntObj in vrntObjs:
+            if mageIds.get(vrntObj.id):
+                mageVariantIds.append(mageIds[vrntObj.id])
         return mageVariantIds
 
+    def _export_variants(self, vrntObjs, templateSkus, url, session):
+        """ Export the variants which are not mapped yet, with
+        ``multiCall`` batches.
+
+        :param templateSkus: ``{variant id: template sku}``
+        :return: ``{variant id: Magento product id}``, the id is False
+                 for the variants which could not be created
+        """
+        ctx = dict(self._context or {})
+        mapProdModel = self.env['magento.product']
+        mageIds = {}
+        for existMapObj in mapProdModel.search(
+                [('instance_id', '=', ctx.get('instance_id')),
+                 ('pro_name', 'in', vrntObjs.ids)]):
+            mageIds.setdefault(
+                existMapObj.pro_name.id, existMapObj.mag_product_id)
+        newVrntObjs = vrntObjs.filtered(lambda obj: obj.id not in mageIds)
+        calls = []
+        for vrntObj in newVrntObjs:
+            prodtype, sku, getProductData = self._get_variant_data(
+                vrntObj, templateSkus[vrntObj.id], url, session)
+            calls.append(['magerpsync.product_create', self._get_create_params(
+                url, session, vrntObj, prodtype, sku, getProductData)])
+        magProds = self.server_multi_call(
+            session, url, calls, self._export_batch_size)
+        for vrntObj, magProd in zip(newVrntObjs, magProds):
+            self._create_product_mapping(vrntObj, magProd)
+            mageIds[vrntObj.id] = magProd[0] > 0 and magProd[1]
+        return mageIds
+
     ############# check single attribute lines ########
     def _search_single_values(self, templId, attrId):
         dic = {}
@@ -454,51 +534,57 @@ class MagentoSynchronization(models.TransientModel):
         @param context: A standard dictionary
         @return: list
         """
+        if vrntObj:
+            prodtype, sku, getProductData = self._get_variant_data(
+                vrntObj, templateSku, url, session)
+            magProd = self.prodcreate(url, session, vrntObj,
+                                      prodtype, sku, getProductData)
+            return magProd
+
+    def _get_variant_data(self, vrntObj, templateSku, url, session):
+        """ Return the type, the sku and the data of a variant on Magento """
         getProductData = {}
         priceExtra = 0
         prodAttrPriceModel = self.env['product.attribute.price']
         magProdAttrModel = self.env['magento.product.attribute']
         domain = [('product_tmpl_id', '=', vrntObj.product_tmpl_id.id)]
-        if vrntObj:
-            sku = vrntObj.default_code or 'Ref %s' % vrntObj.id
-            prodVisibility = 1
-            if templateSku == "single_variant":
-                prodVisibility = 4
-            crrntSetName = vrntObj.product_tmpl_id.attribute_set_id.name
-            getProductData = {
-                'currentsetname' : crrntSetName,
-                'visibility' : prodVisibility
-            }
-            if vrntObj.attribute_value_ids:
-                for valueObj in vrntObj.attribute_value_ids:
-                    attrDomain = [('name', '=', valueObj.attribute_id.id)]
-                    attrName = magProdAttrModel.search(
-                        attrDomain, limit=1).mage_attribute_code or False
-                    valueName = valueObj.name
-                    getProductData[attrName] = valueName
-                    searchDomain = domain + [('value_id', '=', valueObj.id)]
-                    attrValPriceObj = prodAttrPriceModel.search(searchDomain)
-                    if attrValPriceObj:
-                        priceExtra += attrValPriceObj[0].price_extra
-
-            getProductData['price'] = vrntObj.list_price + \
-                priceExtra or 0.00
-            getProductData = self._get_product_array(
-                url, session, vrntObj, getProductData)
-            stockData = self._get_product_qty(vrntObj)
-            getProductData.update({'stock_data' : stockData})
-            getProductData.update({
-                'websites' : [1],
-                'tax_class_id' : '0'
-            })
-            if vrntObj.type in ['product', 'consu']:
-                prodtype = 'simple'
-            else:
-                prodtype = 'virtual'
-            vrntObj.write({'prod_type': prodtype, 'default_code': sku})
-            magProd = self.prodcreate(url, session, vrntObj,
-                                      prodtype, sku, getProductData)
-            return magProd
+        sku = vrntObj.default_code or 'Ref %s' % vrntObj.id
+        prodVisibility = 1
+        if templateSku == "single_variant":
+            prodVisibility = 4
+        crrntSetName = vrntObj.product_tmpl_id.attribute_set_id.name
+        getProductData = {
+            'currentsetname' : crrntSetName,
+            'visibility' : prodVisibility
+        }
+        if vrntObj.attribute_value_ids:
+            for valueObj in vrntObj.attribute_value_ids:
+                attrDomain = [('name', '=', valueObj.attribute_id.id)]
+                attrName = magProdAttrModel.search(
+                    attrDomain, limit=1).mage_attribute_code or False
+                valueName = valueObj.name
+                getProductData[attrName] = valueName
+                searchDomain = domain + [('value_id', '=', valueObj.id)]
+                attrValPriceObj = prodAttrPriceModel.search(searchDomain)
+                if attrValPriceObj:
+                    priceExtra += attrValPriceObj[0].price_extra
+
+        getProductData['price'] = vrntObj.list_price + \
+            priceExtra or 0.00
+        getProductData = self._get_product_array(
+            url, session, vrntObj, getProductData)
+        stockData = self._get_product_qty(vrntObj)
+        getProductData.update({'stock_data' : stockData})
+        getProductData.update({
+            'websites' : [1],
+            'tax_class_id' : '0'
+        })
+        if vrntObj.type in ['product', 'consu']:
+            prodtype = 'simple'
+        else:
+            prodtype = 'virtual'
+        vrntObj.write({'prod_type': prodtype, 'default_code': sku})
+        return prodtype, sku, getProductData
 
     #############################################
     ##          single products create         ##
@@ -512,10 +598,25 @@ class MagentoSynchronization(models.TransientModel):
             prodtype,
             prodsku,
             getProductData):
-        ctx = dict(self._context or {})
-        stock = 0
-        quantity = 0
-        odooProdId = vrntObj.id
+        expProdData = self._get_create_params(
+            url, session, vrntObj, prodtype, prodsku, getProductData)
+        try:
+            magProd = self.server_call(
+                session, url, 'magerpsync.product_create', expProdData)
+        except xmlrpclib.Fault as e:
+            return [0, str(vrntObj.id) + ':' + str(e)]
+        self._create_product_mapping(vrntObj, magProd)
+        return magProd
+
+    def _get_create_params(
+            self,
+            url,
+            session,
+            vrntObj,
+            prodtype,
+            prodsku,
+            getProductData):
+        """ Return the parameters of magerpsync.product_create """
         if getProductData['currentsetname']:
             currentSet = getProductData['currentsetname']
         else:
@@ -524,26 +625,23 @@ class MagentoSynchronization(models.TransientModel):
             currentSet = ""
             if currset[0] > 0:
                 currentSet = currset[1].get('set_id')
-        expProdData = [
+        return [
             prodtype,
             currentSet,
             prodsku,
             getProductData,
-            odooProdId]
-        try:
-            magProd = self.server_call(
-                session, url, 'magerpsync.product_create', expProdData)
-        except xmlrpclib.Fault as e:
-            return [0, str(odooProdId) + ':' + str(e)]
+            vrntObj.id]
+
+    def _create_product_mapping(self, vrntObj, magProd):
+        ctx = dict(self._context or {})
         if magProd[0] > 0 and magProd[1]:
             odooMapData = {
-                'pro_name' : odooProdId,
-                'oe_product_id' : odooProdId,
+                'pro_name' : vrntObj.id,
+                'oe_product_id' : vrntObj.id,
                 'mag_product_id' : magProd[1],
                 'instance_id' : ctx.get('instance_id')
             }
             self.env['magento.product'].create(odooMapData)
-        return magProd
 
     #############################################
     ##      update specific product template   ##
@@ -9,11 +9,11 @@
 ##########################################################################
 
 import binascii
-import xmlrpclib
 
 import requests
 
 from odoo import api, fields, models
+from magento_client import get_client
 from res_partner import _unescape
 
 XMLRPC_API = '/index.php/api/xmlrpc'
@@ -114,7 +114,7 @@ class ProductTemplate(models.Model):
             if activeConnection:
                 url = activeConnection[0]
                 session = activeConnection[1]
-                server = xmlrpclib.Server(url)
+                server = get_client(url)
             for tempObj in self:
                 tempDomain = domain + [('erp_template_id', '=', tempObj.id)]
                 mapTempObjs = mapTempModel.search(tempDomain)
@@ -11,6 +11,7 @@
 import xmlrpclib
 
 from odoo import api, models
+from magento_client import get_client
 
 XMLRPC_API = '/index.php/api/xmlrpc'
 
@@ -54,7 +55,7 @@ class SaleOrder(models.Model):
                     pwd = connectionObj.pwd
                     email = connectionObj.notify
                     try:
-                        server = xmlrpclib.Server(url)
+                        server = get_client(url)
                         session = server.login(user, pwd)
                     except xmlrpclib.Fault as e:
                         text = 'Error, %s Magento details are Invalid.' % e
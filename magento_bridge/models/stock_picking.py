@@ -12,6 +12,7 @@ import xmlrpclib
 
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError
+from magento_client import get_client
 
 XMLRPC_API = '/index.php/api/xmlrpc'
 
@@ -78,7 +79,7 @@ class StockPicking(models.Model):
                 pwd = obj.pwd
                 email = obj.notify
                 try:
-                    server = xmlrpclib.Server(url)
+                    server = get_client(url)
                     session = server.login(user, pwd)
                 except xmlrpclib.Fault as e:
                     text = 'Error, %s Magento details are Invalid.' % e
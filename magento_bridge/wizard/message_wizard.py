@@ -12,6 +12,7 @@ import xmlrpclib
 
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError
+from odoo.addons.magento_bridge.models.magento_client import get_client
 
 
 class MessageWizard(models.TransientModel):
@@ -29,7 +30,7 @@ class RegionWizard(models.TransientModel):
     def _sync_mage_region(self, url, session, country_code):
         region_data = {}
         state_data = {}
-        server = xmlrpclib.Server(url)
+        server = get_client(url)
         try:
             regions = server.call(session, 'region.list', [country_code])
         except xmlrpclib.Fault as e:
@@ -68,7 +69,7 @@ class RegionWizard(models.TransientModel):
             user = config_obj.user
             pwd = config_obj.pwd
             try:
-                server = xmlrpclib.Server(url)
+                server = get_client(url)
                 session = server.login(user, pwd)
             except xmlrpclib.Fault as e:
                 raise UserError(_('Error\n %s, Invalid Information') % e)
@@ -38,7 +38,9 @@ MOB Stock Extesnion
     """,
     'depends': ['magento_bridge'],
     'data': [
+            'security/ir.model.access.csv',
             'views/res_config_view.xml',
+            'data/stock_queue_cron.xml',
     ],
     'application': True,
     'installable': False,
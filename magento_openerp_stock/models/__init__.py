@@ -9,3 +9,5 @@
 
 from . import magento_openerp_stock
 from . import res_config
+from . import magento_product
+from . import magento_stock_queue
@@ -10,11 +10,71 @@
 
 import xmlrpclib
 
-from odoo import api, models
+from odoo import api, models, tools
+from odoo.addons.magento_bridge.models.magento_client import get_client
 
 XMLRPC_API = '/index.php/api/xmlrpc'
 
 
+class StockWarehouse(models.Model):
+    _inherit = "stock.warehouse"
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _magento_location_warehouse_map(self, company_id):
+        """ Return ``{stock location id: warehouse id}`` of a company """
+        warehouseMap = {}
+        for warehouse in self.sudo().search([('company_id', '=', company_id)]):
+            warehouseMap.setdefault(warehouse.lot_stock_id.id, warehouse.id)
+        return warehouseMap
+
+    @api.model
+    def create(self, vals):
+        self.clear_caches()
+        return super(StockWarehouse, self).create(vals)
+
+    @api.multi
+    def write(self, vals):
+        if 'lot_stock_id' in vals or 'company_id' in vals or 'active' in vals:
+            self.clear_caches()
+        return super(StockWarehouse, self).write(vals)
+
+    @api.multi
+    def unlink(self):
+        self.clear_caches()
+        return super(StockWarehouse, self).unlink()
+
+
+class ProductProduct(models.Model):
+    _inherit = "product.product"
+
+    # number of products whose quantities are computed at once
+    _magento_stock_chunk = 1000
+
+    @api.multi
+    def _magento_stock_snapshot(self, warehouse_ids):
+        """ Return the quantities sent to Magento of the products in
+        several warehouses, as
+        ``{warehouse id: {product id: (qoh quantity, forecast quantity)}}``
+
+        The quantities are computed with one ``_compute_quantities_dict``
+        per warehouse and chunk of products, the qoh quantity is the
+        quantity on hand minus the outgoing quantity.
+        """
+        snapshot = {}
+        for warehouseId in set(warehouse_ids):
+            quantities = snapshot[warehouseId] = {}
+            products = self.with_context(warehouse=warehouseId)
+            for start in range(0, len(products), self._magento_stock_chunk):
+                chunk = products[start:start + self._magento_stock_chunk]
+                res = chunk._compute_quantities_dict(False, False, False)
+                for productId, qty in res.iteritems():
+                    quantities[productId] = (
+                        qty['qty_available'] - qty['outgoing_qty'],
+                        qty['virtual_available'])
+        return snapshot
+
+
 class StockMove(models.Model):
     _inherit = "stock.move"
 
@@ -90,38 +150,39 @@ class StockMove(models.Model):
                 if flag == 1:
                     warehouseId = data.warehouse_id.id
                 if flag == 2:
-                    locationId = data.location_dest_id.id
                     companyId = data.company_id.id
-                    checkIn = self.env['stock.warehouse'].search(
-                        [('lot_stock_id', '=', locationId), ('company_id', '=', companyId)])
-                    if not checkIn:
-                        checkIn = data.check_warehouse_location(
-                            data.location_dest_id, companyId)
+                    checkIn = data._get_location_warehouse(
+                        data.location_dest_id, companyId)
                     if checkIn:
-                        warehouseId = checkIn[0].id
-                    checkOut = self.env['stock.warehouse'].search(
-                        [('lot_stock_id', '=', data.location_id.id), ('company_id', '=', companyId)], limit=1)
-                    if not checkOut:
-                        checkOut = data.check_warehouse_location(
-                            data.location_id, companyId)
+                        warehouseId = checkIn
+                    checkOut = data._get_location_warehouse(
+                        data.location_id, companyId)
                     if checkOut:
                         # Sending Goods.
-                        warehouseId = checkOut[0].id
+                        warehouseId = checkOut
                 data.check_warehouse(
                     odooProductId, warehouseId, productQuantity)
         return True
 
+    @api.model
+    def _get_location_warehouse(self, locationObj, company_id, parent=False):
+        """ Return the id of the warehouse whose stock location is
+        ``locationObj`` or its closest parent, 0 if there is none """
+        warehouseMap = self.env['stock.warehouse']._magento_location_warehouse_map(
+            company_id)
+        if parent:
+            locationObj = locationObj.location_id
+        while locationObj:
+            if locationObj.id in warehouseMap:
+                return warehouseMap[locationObj.id]
+            locationObj = locationObj.location_id
+        return 0
+
     @api.one
     def check_warehouse_location(self, locationObj, company_id):
-        flag = True
-        checkIn = []
-        while flag and locationObj:
-            locationObj = locationObj.location_id
-            checkIn = self.env['stock.warehouse'].search(
-                [('lot_stock_id', '=', locationObj.id), ('company_id', '=', company_id)], limit=1)
-            if checkIn:
-                flag = False
-        return checkIn
+        warehouseId = self._get_location_warehouse(
+            locationObj, company_id, parent=True)
+        return self.env['stock.warehouse'].browse(warehouseId or [])
 
     @api.one
     def check_warehouse(self, odooProductId, warehouseId, productQuantity):
@@ -130,18 +191,12 @@ class StockMove(models.Model):
             [('pro_name', '=', odooProductId)])
         if mappingObjs:
             mappingObj = mappingObjs[0]
-            instanceObj = mappingObj.instance_id
-            mageProductId = mappingObj.mag_product_id
             if mappingObj.instance_id.warehouse_id.id == warehouseId:
-                ctx['warehouse'] = mappingObj.instance_id.warehouse_id.id
-                product_obj = self.env['product.product'].with_context(
-                    ctx).browse(odooProductId)
-                if ctx.get('mob_stock_action_val') == "qoh":
-                    productQuantity = product_obj.qty_available - product_obj.outgoing_qty
-                else:
-                    productQuantity = product_obj.virtual_available
-                self.synch_quantity(
-                    mageProductId, productQuantity, instanceObj)
+                # sent to Magento by the scheduled action, see
+                # magento.stock.queue
+                self.env['magento.stock.queue'].add_product(
+                    odooProductId, mappingObj.instance_id.id,
+                    ctx.get('mob_stock_action_val'))
 
     @api.one
     def synch_quantity(self, mageProductId, productQuantity, instanceObj):
@@ -168,7 +223,7 @@ class StockMove(models.Model):
                 user = instanceObj.user
                 pwd = instanceObj.pwd
                 try:
-                    server = xmlrpclib.Server(url)
+                    server = get_client(url)
                     session = server.login(user, pwd)
                 except xmlrpclib.Fault as e:
                     text = 'Error, %s Magento details are Invalid.' % e
@@ -0,0 +1,23 @@
+# flake8: noqa
+# -*- coding: utf-8 -*-
+##########################################################################
+#
+#   Copyright (c) 2015-Present Webkul Software Pvt. Ltd. (<https://webkul.com/>)
+#   See LICENSE file for full copyright and licensing details.
+#   License URL : <https://store.webkul.com/license.html/>
+#
+##########################################################################
+
+from odoo import fields, models
+from odoo.addons import decimal_precision as dp
+
+
+class MagentoProduct(models.Model):
+    _inherit = "magento.product"
+
+    stock_qty_synced = fields.Float(
+        string='Last Synced Quantity',
+        digits=dp.get_precision('Product Unit of Measure'),
+        readonly=True)
+    stock_sync_date = fields.Datetime(
+        string='Last Stock Sync', readonly=True)
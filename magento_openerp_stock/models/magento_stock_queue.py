@@ -0,0 +1,309 @@
+# flake8: noqa
+# -*- coding: utf-8 -*-
+##########################################################################
+#
+#   Copyright (c) 2015-Present Webkul Software Pvt. Ltd. (<https://webkul.com/>)
+#   See LICENSE file for full copyright and licensing details.
+#   License URL : <https://store.webkul.com/license.html/>
+#
+##########################################################################
+
+import logging
+import time
+import xmlrpclib
+from datetime import datetime, timedelta
+
+from odoo import api, fields, models
+from odoo.tools import float_compare
+from odoo.addons.magento_bridge.models.magento_client import get_client
+
+_logger = logging.getLogger(__name__)
+
+XMLRPC_API = '/index.php/api/xmlrpc'
+
+
+class MagentoStockQueue(models.Model):
+    """ Products whose stock has to be sent to Magento.
+
+    The stock moves only add a line per (product, instance), the lines
+    of the same pair are coalesced by the scheduled action which computes
+    the quantities of all the products at once and sends them to Magento
+    in batches with ``multiCall``.
+    """
+    _name = "magento.stock.queue"
+    _order = 'id'
+    _description = "Magento Stock Update Queue"
+
+    # a pair is sent when it was not changed for this delay...
+    _debounce_seconds = 30
+    # ... or when its first change is older than this delay
+    _max_wait_seconds = 300
+    # number of stock updates sent in one multiCall
+    _batch_size = 100
+    # number of stock updates sent in one multiCall by reconcile_stock()
+    _reconcile_batch_size = 500
+
+    product_id = fields.Many2one(
+        'product.product', string='Product', required=True,
+        ondelete='cascade')
+    instance_id = fields.Many2one(
+        'magento.configure', string='Magento Instance', required=True,
+        ondelete='cascade')
+    stock_action = fields.Selection([
+        ('qoh', 'Quantity on hand'),
+        ('fq', 'Forecast Quantity')
+    ], string='Stock Management', default='fq')
+    create_date = fields.Datetime(string='Created Date')
+
+    @api.model
+    def add_product(self, productId, instanceId, stockAction):
+        return self.sudo().create({
+            'product_id': productId,
+            'instance_id': instanceId,
+            'stock_action': 'qoh' if stockAction == 'qoh' else 'fq',
+        })
+
+    @api.model
+    def _get_ready_pairs(self):
+        """ Return ``{instance_id: {product_id: (stock_action, line_ids)}}``
+        of the pairs to send, the stock action is the one of the last line
+        """
+        now = datetime.utcnow()
+        debounce = now - timedelta(seconds=self._debounce_seconds)
+        maxWait = now - timedelta(seconds=self._max_wait_seconds)
+        self._cr.execute("""
+            SELECT instance_id, product_id,
+                   (array_agg(stock_action ORDER BY id DESC))[1],
+                   array_agg(id)
+            FROM magento_stock_queue
+            GROUP BY instance_id, product_id
+            HAVING max(create_date) <= %s OR min(create_date) <= %s
+        """, (fields.Datetime.to_string(debounce),
+              fields.Datetime.to_string(maxWait)))
+        pairs = {}
+        for instanceId, productId, stockAction, lineIds in self._cr.fetchall():
+            pairs.setdefault(instanceId, {})[productId] = (
+                stockAction, lineIds)
+        return pairs
+
+    @api.model
+    def _log_stock_error(self, message):
+        self.env['magento.sync.history'].create(
+            {'status': 'no', 'action_on': 'product', 'action': 'c', 'error_message': message})
+
+    @api.model
+    def _magento_login(self, instanceObj):
+        """ Return the client and the session of an instance, raise when
+        Magento can not be reached """
+        server = get_client(instanceObj.name + XMLRPC_API)
+        return server, server.login(instanceObj.user, instanceObj.pwd)
+
+    @api.model
+    def _send_stock_batch(self, server, session, batch, raise_fault=False):
+        """ Send one batch of stock updates with ``multiCall``.
+
+        :param batch: list of ``(mapping id, Magento product id, quantity)``
+        :param raise_fault: raise the fault of the whole request instead
+                            of logging it
+        :return: number of updated and of failed products
+        """
+        calls = [[
+            'product_stock.update', [
+                mageProductId, {
+                    'manage_stock': 1, 'qty': productQuantity,
+                    'is_in_stock': 1 if productQuantity > 0 else 0}]]
+            for __, mageProductId, productQuantity in batch]
+        try:
+            results = server.multi_call(session, calls)
+        except xmlrpclib.Fault as e:
+            if raise_fault:
+                raise
+            self._log_stock_error(
+                'Error in Updating Quantity of %d Magento Products: %s' %
+                (len(batch), e.faultString))
+            return 0, len(batch)
+        synced = []
+        for update, result in zip(batch, results):
+            if isinstance(result, dict) and result.get('isFault'):
+                self._log_stock_error(
+                    ' Error in Updating Quantity for Magneto Product Id %s: %s' %
+                    (update[1], result.get('faultMessage')))
+            else:
+                synced.append((update[0], update[2]))
+        if synced:
+            # keep the quantities known by Magento, see reconcile_stock()
+            self._cr.execute("""
+                UPDATE magento_product AS mp
+                SET stock_qty_synced = v.qty, stock_sync_date = %%s
+                FROM (VALUES %s) AS v(id, qty)
+                WHERE mp.id = v.id
+            """ % ', '.join(['(%s, %s::float)'] * len(synced)),
+                [fields.Datetime.now()] +
+                [value for pair in synced for value in pair])
+            self.env['magento.product'].invalidate_cache(
+                ['stock_qty_synced', 'stock_sync_date'])
+        return len(synced), len(batch) - len(synced)
+
+    @api.model
+    def _push_instance_stock(self, instanceObj, pairs):
+        """ Send the stock of the products of ``pairs`` to an instance.
+
+        Return the ids of the products whose lines are done: the products
+        sent to Magento and the ones without Magento product. The lines of
+        the other products, i.e. when Magento can not be reached or
+        rejects a whole batch, are kept to be sent by the next run.
+        """
+        if not instanceObj.active:
+            self._log_stock_error(
+                ' Connection needs one Active Configuration setting.')
+            return list(pairs)
+        products = self.env['product.product'].browse(list(pairs))
+        mappingObjs = self.env['magento.product'].search(
+            [('pro_name', 'in', products.ids),
+             ('instance_id', '=', instanceObj.id),
+             ('mag_product_id', '>', 0)])
+        mappings = {}
+        for mappingObj in mappingObjs:
+            mappings.setdefault(mappingObj.pro_name.id, mappingObj)
+        doneIds = [productId for productId in pairs
+                   if productId not in mappings]
+        if not mappings:
+            return doneIds
+        warehouseId = instanceObj.warehouse_id.id
+        quantities = products.browse(
+            list(mappings))._magento_stock_snapshot([warehouseId])[warehouseId]
+        productIds = []
+        updates = []
+        for productId, mappingObj in mappings.iteritems():
+            qoh, forecast = quantities[productId]
+            productQuantity = qoh if pairs[productId][0] == 'qoh' else forecast
+            productIds.append(productId)
+            updates.append(
+                (mappingObj.id, mappingObj.mag_product_id, productQuantity))
+        try:
+            server, session = self._magento_login(instanceObj)
+            for start in range(0, len(updates), self._batch_size):
+                end = start + self._batch_size
+                self._send_stock_batch(
+                    server, session, updates[start:end], raise_fault=True)
+                doneIds += productIds[start:end]
+        except Exception as e:
+            _logger.warning('MOB: stock update failed on %s, the lines of '
+                            'the unsent products are kept: %s',
+                            instanceObj.name, e)
+        return doneIds
+
+    @api.model
+    def _cron_push_stock(self):
+        readyPairs = self._get_ready_pairs()
+        instanceModel = self.env['magento.configure'].with_context(
+            active_test=False)
+        for instanceId, pairs in readyPairs.iteritems():
+            instanceObj = instanceModel.browse(instanceId)
+            doneIds = self._push_instance_stock(instanceObj, pairs)
+            lineIds = [lineId for productId in doneIds
+                       for lineId in pairs[productId][1]]
+            if lineIds:
+                self.browse(lineIds).unlink()
+            self._cr.commit()
+        return True
+
+    @api.model
+    def reconcile_stock(self, instance_ids=None, force=False):
+        """ Send to Magento the stock of all the mapped products whose
+        quantity is not the last one sent.
+
+        The quantities are computed in bulk and compared with the
+        quantities kept on ``magento.product`` by the previous updates,
+        only the changed ones are sent, in batches of
+        ``_reconcile_batch_size`` products. With ``force``, all the
+        quantities are sent.
+
+        :return: ``{instance id: statistics}``
+        """
+        stockAction = self.env['ir.values'].sudo().get_default(
+            'mob.config.settings', 'mob_stock_action', False)
+        instanceModel = self.env['magento.configure']
+        if instance_ids:
+            instanceObjs = instanceModel.browse(instance_ids)
+        else:
+            instanceObjs = instanceModel.search([])
+        precision = self.env['decimal.precision'].precision_get(
+            'Product Unit of Measure')
+        stats = {}
+        for instanceObj in instanceObjs:
+            startTime = time.time()
+            self._cr.execute("""
+                SELECT id, pro_name, mag_product_id, stock_qty_synced,
+                       stock_sync_date
+                FROM magento_product
+                WHERE instance_id = %s AND pro_name IS NOT NULL
+                  AND mag_product_id > 0
+            """, (instanceObj.id,))
+            rows = self._cr.fetchall()
+            warehouseId = instanceObj.warehouse_id.id
+            products = self.env['product.product'].browse(
+                list(set(row[1] for row in rows)))
+            quantities = products._magento_stock_snapshot(
+                [warehouseId])[warehouseId]
+            updates = []
+            for mappingId, productId, mageProductId, syncedQty, syncDate in rows:
+                qoh, forecast = quantities.get(productId, (0.0, 0.0))
+                productQuantity = qoh if stockAction == 'qoh' else forecast
+                if (force or not syncDate or float_compare(
+                        productQuantity, syncedQty or 0.0,
+                        precision_digits=precision)):
+                    updates.append((mappingId, mageProductId, productQuantity))
+            instanceStats = stats[instanceObj.id] = {
+                'mapped': len(rows), 'changed': len(updates),
+                'updated': 0, 'failed': 0, 'seconds': 0.0}
+            _logger.info('MOB: stock reconciliation of %s, %d of %d mapped '
+                         'products changed, computed in %.1fs',
+                         instanceObj.name, len(updates), len(rows),
+                         time.time() - startTime)
+            if updates:
+                try:
+                    server, session = self._magento_login(instanceObj)
+                except Exception as e:
+                    self._log_stock_error(
+                        'Error in Stock Reconciliation, Magento Connection '
+                        'failed: %s' % e)
+                    continue
+                batchSize = self._reconcile_batch_size
+                for start in range(0, len(updates), batchSize):
+                    try:
+                        updated, failed = self._send_stock_batch(
+                            server, session, updates[start:start + batchSize])
+                    except Exception as e:
+                        self._log_stock_error(
+                            'Error in Stock Reconciliation, Magento '
+                            'Connection failed: %s' % e)
+                        break
+                    self._cr.commit()
+                    instanceStats['updated'] += updated
+                    instanceStats['failed'] += failed
+                    done = instanceStats['updated'] + instanceStats['failed']
+                    elapsed = time.time() - startTime
+                    _logger.info('MOB: stock reconciliation of %s, %d/%d '
+                                 'products sent, %.1f products/s',
+                                 instanceObj.name, done, len(updates),
+                                 done / elapsed if elapsed else 0.0)
+            instanceStats['seconds'] = round(time.time() - startTime, 3)
+            self.env['magento.sync.history'].create({
+                'status': 'yes' if not instanceStats['failed'] else 'no',
+                'action_on': 'product',
+                'action': 'c',
+                'error_message': 'Stock Reconciliation of %s: %d mapped '
+                                 'products, %d changed, %d updated, %d failed '
+                                 'in %.1f seconds.' % (
+                                     instanceObj.name, len(rows), len(updates),
+                                     instanceStats['updated'],
+                                     instanceStats['failed'],
+                                     instanceStats['seconds'])})
+            self._cr.commit()
+        return stats
+
+    @api.model
+    def _cron_reconcile_stock(self):
+        self.reconcile_stock()
+        return True
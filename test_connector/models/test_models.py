@@ -62,6 +62,7 @@ class ConnectorTestBinder(Binder):
     _model_name = [
         'connector.test.binding',
     ]
+    _reusable = True
 
 
 class NoInheritsBinding(models.Model):
@@ -94,6 +95,7 @@ class NoInheritsBinder(Binder):
     _model_name = [
         'no.inherits.binding',
     ]
+    _reusable = True
 
     def unwrap_binding(self, binding):
         raise ValueError('Not an inherits')
@@ -2,8 +2,11 @@
 # Copyright 2013-2017 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html)
 
+import mock
+
 from odoo.tests.common import TransactionCase
-from odoo.addons.connector.connector import ConnectorEnvironment, Binder
+from odoo.addons.connector.connector import (ConnectorEnvironment, Binder,
+                                             _BINDER_CACHE)
 
 
 class TestDefaultBinder(TransactionCase):
@@ -45,3 +48,51 @@ class TestDefaultBinder(TransactionCase):
         self.assertEqual(self.binder.unwrap_model(), 'connector.test.record')
         # unwrapping the binding should give the same binding
         self.assertEqual(self.binder.unwrap_binding(test_binding), test_record)
+
+    def test_default_binder_many(self):
+        """ Bind and find several records at once """
+        test_records = self.env['connector.test.record']
+        test_bindings = self.env['connector.test.binding']
+        for __ in range(3):
+            test_record = self.env['connector.test.record'].create({})
+            test_records |= test_record
+            test_bindings |= self.env['connector.test.binding'].create({
+                'backend_id': self.backend_record.id,
+                'odoo_id': test_record.id,
+            })
+
+        self.binder.bind_many(zip([101, 102, 103], test_bindings))
+        bindings = self.binder.to_internal_many([101, 102, 103, 104])
+        self.assertEqual(bindings[101], test_bindings[0])
+        self.assertEqual(bindings[103], test_bindings[2])
+        self.assertFalse(bindings[104])
+        records = self.binder.to_internal_many([102, 104], unwrap=True)
+        self.assertEqual(records[102], test_records[1])
+        self.assertFalse(records[104])
+        self.assertEqual(self.binder.to_external_many(test_bindings),
+                         {test_bindings[0].id: 101,
+                          test_bindings[1].id: 102,
+                          test_bindings[2].id: 103})
+        self.assertEqual(
+            self.binder.to_external_many(test_records[1:], wrap=True),
+            {test_records[1].id: 102, test_records[2].id: 103})
+
+    def test_default_binder_cache(self):
+        """ The binder cache returns the bindings found previously """
+        test_record = self.env['connector.test.record'].create({})
+        test_binding = self.env['connector.test.binding'].create({
+            'backend_id': self.backend_record.id,
+            'odoo_id': test_record.id,
+        })
+        self.binder._cache_bindings = True
+        self.binder.bind(99, test_binding)
+        model_class = type(self.env['connector.test.binding'])
+        with mock.patch.object(model_class, 'search') as search:
+            self.assertEqual(self.binder.to_internal(99), test_binding)
+            self.assertFalse(search.called)
+        self.assertEqual(self.binder.to_external_many([test_binding.id]),
+                         {test_binding.id: 99})
+        # the bindings are forgotten at the end of the transaction
+        self.assertIn(self.env.cr, _BINDER_CACHE)
+        self.env.cr.rollback()
+        self.assertNotIn(self.env.cr, _BINDER_CACHE)